@@ -45,21 +45,42 @@ class ActionEngine(base.EngineBase):
     tasks in the execution graph fail, which will cause the process of
     reversion to commence. See the valid states in the states module to learn
     more about what other states the tasks & flow being ran can go through.
+
+    By default every task that ran is reverted when a task fails; when the
+    'revert_mode' option is set to 'affected' only the tasks affected by
+    the failure are (see graph_analyzer.REVERT_MODES), and running the flow
+    again only runs the tasks that were reverted (or did not run).
+
+    When the 'flatten_cache' option is set to a flow_utils.FlattenCache
+    (which can be shared by many engines) flows of the same structure as
+    a flow flattened before are compiled without being flattened again (the
+    compact graph of that flow is reused with their tasks as its nodes).
     """
     _graph_action_cls = graph_action.FutureGraphAction
     _graph_analyzer_cls = graph_analyzer.GraphAnalyzer
     _task_action_cls = task_action.TaskAction
-    _task_executor_cls = executor.SerialTaskExecutor
 
     def __init__(self, flow, flow_detail, backend, conf):
         super(ActionEngine, self).__init__(flow, flow_detail, backend, conf)
         self._analyzer = None
+        self._execution_graph = None
         self._root = None
         self._compiled = False
         self._lock = threading.RLock()
         self._state_lock = threading.RLock()
         self._task_executor = None
         self._task_action = None
+        if self._conf.get('vectorized', False):
+            if not graph_analyzer.NUMPY_AVAILABLE:
+                raise ImportError("numpy is needed to use the 'vectorized'"
+                                  " option")
+            self._graph_analyzer_cls = graph_analyzer.VectorizedGraphAnalyzer
+        self._profiler = self._conf.get('profiler', None)
+        self._revert_mode = self._conf.get('revert_mode',
+                                           graph_analyzer.REVERT_ALL)
+
+    def _task_executor_cls(self):
+        return executor.SerialTaskExecutor(self._profiler)
 
     def _revert(self, current_failure=None):
         self._change_state(states.REVERTING)
@@ -89,7 +110,11 @@ class ActionEngine(base.EngineBase):
     @property
     def execution_graph(self):
         self.compile()
-        return self._analyzer.execution_graph
+        # NOTE: the (frozen) networkx graph is only built when asked for, and
+        # then kept until the flow is compiled again.
+        if self._execution_graph is None:
+            self._execution_graph = self._analyzer.execution_graph.to_digraph()
+        return self._execution_graph
 
     @lock_utils.locked
     def run(self):
@@ -109,6 +134,10 @@ class ActionEngine(base.EngineBase):
                 self._run()
         finally:
             self._task_executor.stop()
+            # NOTE: make sure listeners have seen every transition by the
+            # time the engine returns (when they are notified asynchronously).
+            self.task_notifier.flush()
+            self.notifier.flush()
 
     def _run(self):
         self._change_state(states.RUNNING)
@@ -142,7 +171,12 @@ class ActionEngine(base.EngineBase):
         self.notifier.notify(state, details)
 
     def _reset(self):
-        for name, uuid in self.storage.reset_tasks():
+        keep_states = ()
+        if self._revert_mode == graph_analyzer.REVERT_AFFECTED:
+            # NOTE: tasks that were not affected by the failure were not
+            # reverted, their results are still valid.
+            keep_states = (states.SUCCESS,)
+        for name, uuid in self.storage.reset_tasks(keep_states):
             details = dict(engine=self,
                            task_name=name,
                            task_uuid=uuid,
@@ -164,17 +198,22 @@ class ActionEngine(base.EngineBase):
     def compile(self):
         if self._compiled:
             return
-        task_graph = flow_utils.flatten(self._flow)
+        # NOTE: at runtime only the compact form of the graph is kept, a
+        # networkx graph is only needed to build (and validate) it.
+        task_graph = flow_utils.flatten_compact(
+            self._flow, cache=self._conf.get('flatten_cache'))
         if task_graph.number_of_nodes() == 0:
             raise exc.EmptyFlow("Flow %s is empty." % self._flow.name)
-        self._analyzer = self._graph_analyzer_cls(task_graph,
-                                                  self.storage)
+        self._analyzer = self._graph_analyzer_cls(
+            task_graph, self.storage, revert_mode=self._revert_mode)
+        self._execution_graph = None
         if self._task_executor is None:
             self._task_executor = self._task_executor_cls()
         if self._task_action is None:
-            self._task_action = self._task_action_cls(self.storage,
-                                                      self._task_executor,
-                                                      self.task_notifier)
+            self._task_action = self._task_action_cls(
+                self.storage, self._task_executor, self.task_notifier,
+                progress_interval=self._conf.get('progress_interval'),
+                progress_delta=self._conf.get('progress_delta'))
         self._root = self._graph_action_cls(self._analyzer,
                                             self.storage,
                                             self._task_action)
@@ -197,9 +236,53 @@ class MultiThreadedActionEngine(ActionEngine):
     _storage_cls = t_storage.MultiThreadedStorage
 
     def _task_executor_cls(self):
-        return executor.ParallelTaskExecutor(self._executor)
+        return executor.ParallelTaskExecutor(self._executor,
+                                             self._resource_limits,
+                                             self._profiler)
 
     def __init__(self, flow, flow_detail, backend, conf):
         super(MultiThreadedActionEngine, self).__init__(
             flow, flow_detail, backend, conf)
         self._executor = conf.get('executor', None)
+        self._resource_limits = conf.get('resource_limits', None)
+
+
+class MultiProcessActionEngine(MultiThreadedActionEngine):
+    """Engine that runs tasks in parallel in separate processes.
+
+    Tasks ran in other processes can not be profiled, so the 'profiler'
+    option is not supported.
+    """
+
+    def _task_executor_cls(self):
+        return executor.ParallelProcessTaskExecutor(self._executor,
+                                                    self._resource_limits)
+
+    def __init__(self, flow, flow_detail, backend, conf):
+        super(MultiProcessActionEngine, self).__init__(
+            flow, flow_detail, backend, conf)
+        if self._profiler is not None:
+            raise ValueError("Tasks ran in other processes can not be"
+                             " profiled")
+
+
+class AsyncActionEngine(ActionEngine):
+    """Engine that runs tasks (and coroutine tasks) on an asyncio loop.
+
+    A loop may be given using the 'loop' option, it must be running (in some
+    other thread) when the engine is ran. Task methods only start the work
+    that is later finished on the loop, so the 'profiler' option is not
+    supported.
+    """
+    _storage_cls = t_storage.MultiThreadedStorage
+
+    def _task_executor_cls(self):
+        return executor.AsyncTaskExecutor(self._loop)
+
+    def __init__(self, flow, flow_detail, backend, conf):
+        super(AsyncActionEngine, self).__init__(
+            flow, flow_detail, backend, conf)
+        if self._profiler is not None:
+            raise ValueError("Tasks ran on an asyncio loop can not be"
+                             " profiled")
+        self._loop = conf.get('loop', None)
@@ -15,23 +15,45 @@
 #    under the License.
 
 import abc
+import collections
+import functools
+import heapq
+import itertools
+import logging
+import multiprocessing
+import threading
 
 from concurrent import futures
 import six
 
 from taskflow.utils import async_utils
+from taskflow.utils import asyncio_utils
+from taskflow.utils import eventlet_utils
 from taskflow.utils import misc
 from taskflow.utils import threading_utils
 
+LOG = logging.getLogger(__name__)
+
 # Execution and reversion events.
 EXECUTED = 'executed'
 REVERTED = 'reverted'
 
+# Kinds of messages sent back from the process pool (see
+# ParallelProcessTaskExecutor).
+_PROGRESS = 'progress'
+_DONE = 'done'
+_STOP = 'stop'
+
 
-def _execute_task(task, arguments, progress_callback):
+def _execute_task(task, arguments, progress_callback, profiler=None):
+    task._trigger('started')
     with task.autobind('update_progress', progress_callback):
         try:
-            result = task.execute(**arguments)
+            if profiler is None:
+                result = task.execute(**arguments)
+            else:
+                result = profiler.profile(task.name, task.execute,
+                                          **arguments)
         except Exception:
             # NOTE(imelnikov): wrap current exception with Failure
             # object and return it.
@@ -39,13 +61,18 @@ def _execute_task(task, arguments, progress_callback):
     return (task, EXECUTED, result)
 
 
-def _revert_task(task, arguments, result, failures, progress_callback):
+def _revert_task(task, arguments, result, failures, progress_callback,
+                 profiler=None):
     kwargs = arguments.copy()
     kwargs['result'] = result
     kwargs['flow_failures'] = failures
+    task._trigger('started')
     with task.autobind('update_progress', progress_callback):
         try:
-            result = task.revert(**kwargs)
+            if profiler is None:
+                result = task.revert(**kwargs)
+            else:
+                result = profiler.profile(task.name, task.revert, **kwargs)
         except Exception:
             # NOTE(imelnikov): wrap current exception with Failure
             # object and return it.
@@ -63,18 +90,19 @@ class TaskExecutorBase(object):
     """
 
     @abc.abstractmethod
-    def execute_task(self, task, task_uuid, arguments, progress_callback=None):
-        """Schedules task execution."""
+    def execute_task(self, task, task_uuid, arguments, progress_callback=None,
+                     priority=None):
+        """Schedules task execution.
+
+        Executors that can not run all scheduled tasks at once should run
+        the tasks with higher priority first.
+        """
 
     @abc.abstractmethod
     def revert_task(self, task, task_uuid, arguments, result, failures,
                     progress_callback=None):
         """Schedules task reversion."""
 
-    @abc.abstractmethod
-    def wait_for_any(self, fs, timeout=None):
-        """Wait for futures returned by this executor to complete."""
-
     def start(self):
         """Prepare to execute tasks."""
         pass
@@ -85,21 +113,26 @@ class TaskExecutorBase(object):
 
 
 class SerialTaskExecutor(TaskExecutorBase):
-    """Execute task one after another."""
+    """Execute task one after another.
 
-    def execute_task(self, task, task_uuid, arguments, progress_callback=None):
+    When a profiler (see `taskflow.utils.profile_utils`) is given each task
+    execution and reversion is profiled with it.
+    """
+
+    def __init__(self, profiler=None):
+        self._profiler = profiler
+
+    def execute_task(self, task, task_uuid, arguments, progress_callback=None,
+                     priority=None):
         return async_utils.make_completed_future(
-            _execute_task(task, arguments, progress_callback))
+            _execute_task(task, arguments, progress_callback,
+                          self._profiler))
 
     def revert_task(self, task, task_uuid, arguments, result, failures,
                     progress_callback=None):
         return async_utils.make_completed_future(
             _revert_task(task, arguments, result,
-                         failures, progress_callback))
-
-    def wait_for_any(self, fs, timeout=None):
-        # NOTE(imelnikov): this executor returns only done futures.
-        return fs, []
+                         failures, progress_callback, self._profiler))
 
 
 class ParallelTaskExecutor(TaskExecutorBase):
@@ -107,31 +140,396 @@ class ParallelTaskExecutor(TaskExecutorBase):
 
     Submits tasks to executor which should provide interface similar
     to concurrent.Futures.Executor.
+
+    When no executor is provided one is created (with a thread per cpu) and
+    tasks which do not fit into it are queued here and submitted in order of
+    their priority as its threads become free. Tasks given to a provided
+    executor are submitted to it right away (since its capacity, and what
+    else it runs, is unknown).
+
+    Tasks may also name the `resources` they use; when `resource_limits`
+    (a dictionary of resource name => maximum number of tasks using that
+    resource at once) is given tasks whose resources are saturated are kept
+    queued (while other tasks are submitted) until a task using the same
+    resource finishes.
+
+    When a profiler (see `taskflow.utils.profile_utils`) is given each task
+    execution and reversion is profiled with it.
     """
 
-    def __init__(self, executor=None):
+    def __init__(self, executor=None, resource_limits=None, profiler=None):
         self._executor = executor
+        self._profiler = profiler
         self._own_executor = executor is None
+        # Maximum number of tasks submitted to the executor at once (if
+        # unlimited tasks are submitted as soon as they are scheduled).
+        self._max_workers = None
+        self._in_flight = 0
+        self._resource_limits = dict(resource_limits or {})
+        # Resource name => number of submitted tasks using that resource.
+        self._resources_in_use = collections.defaultdict(int)
+        # Heap of (-priority, sequence number, future, resources, func, args)
+        # tuples.
+        self._queued = []
+        self._queued_counter = itertools.count()
+        self._queued_lock = threading.Lock()
+
+    def _get_limited_resources(self, task):
+        return tuple(r for r in getattr(task, 'resources', ())
+                     if r in self._resource_limits)
+
+    def _is_saturated(self, resources):
+        for r in resources:
+            if self._resources_in_use[r] >= self._resource_limits[r]:
+                return True
+        return False
+
+    def _submit(self, priority, task, func, *args):
+        resources = self._get_limited_resources(task)
+        if self._max_workers is None and not resources:
+            return self._executor.submit(func, *args)
+        future = self._make_future()
+        with self._queued_lock:
+            heapq.heappush(self._queued, (-(priority or 0),
+                                          next(self._queued_counter),
+                                          future, resources, func, args))
+        self._submit_queued()
+        return future
+
+    def _make_future(self):
+        # NOTE: queued tasks are waited on (and waited for) like the ones
+        # submitted to the executor, so their futures must be of the same
+        # kind as the executor makes (waiting on a plain future blocks all
+        # the greenthreads of a green executor).
+        if (eventlet_utils.EVENTLET_AVAILABLE and
+                isinstance(self._executor, eventlet_utils.GreenExecutor)):
+            return eventlet_utils.GreenFuture()
+        return futures.Future()
+
+    def _pop_submittable(self):
+        """Pops the queued task with highest priority that can be submitted.
+
+        Must be called with the queue lock held; returns None if there is no
+        such task.
+        """
+        if (self._max_workers is not None and
+                self._in_flight >= self._max_workers):
+            return None
+        skipped = []
+        item = None
+        while self._queued:
+            candidate = heapq.heappop(self._queued)
+            if self._is_saturated(candidate[3]):
+                skipped.append(candidate)
+            else:
+                item = candidate
+                break
+        for candidate in skipped:
+            heapq.heappush(self._queued, candidate)
+        if item is not None:
+            self._acquire(item[3])
+        return item
+
+    def _acquire(self, resources):
+        self._in_flight += 1
+        for r in resources:
+            self._resources_in_use[r] += 1
+
+    def _release(self, resources):
+        self._in_flight -= 1
+        for r in resources:
+            self._resources_in_use[r] -= 1
+
+    def _submit_queued(self):
+        while True:
+            with self._queued_lock:
+                item = self._pop_submittable()
+                if item is None:
+                    return
+            _priority, _seq, future, resources, func, args = item
+            if not future.set_running_or_notify_cancel():
+                with self._queued_lock:
+                    self._release(resources)
+                continue
+            try:
+                executor_future = self._executor.submit(func, *args)
+            except Exception as e:
+                with self._queued_lock:
+                    self._release(resources)
+                future.set_exception(e)
+            else:
+                executor_future.add_done_callback(
+                    functools.partial(self._on_submitted_done, future,
+                                      resources))
 
-    def execute_task(self, task, task_uuid, arguments, progress_callback=None):
-        return self._executor.submit(
-            _execute_task, task, arguments, progress_callback)
+    def _on_submitted_done(self, future, resources, executor_future):
+        with self._queued_lock:
+            self._release(resources)
+        try:
+            future.set_result(executor_future.result())
+        except Exception as e:
+            future.set_exception(e)
+        self._submit_queued()
+
+    def execute_task(self, task, task_uuid, arguments, progress_callback=None,
+                     priority=None):
+        return self._submit(priority, task, _execute_task, task, arguments,
+                            progress_callback, self._profiler)
 
     def revert_task(self, task, task_uuid, arguments, result, failures,
                     progress_callback=None):
-        return self._executor.submit(
-            _revert_task, task,
-            arguments, result, failures, progress_callback)
-
-    def wait_for_any(self, fs, timeout=None):
-        return async_utils.wait_for_any(fs, timeout)
+        return self._submit(None, task, _revert_task, task, arguments,
+                            result, failures, progress_callback,
+                            self._profiler)
 
     def start(self):
         if self._own_executor:
             thread_count = threading_utils.get_optimal_thread_count()
             self._executor = futures.ThreadPoolExecutor(thread_count)
+            self._max_workers = thread_count
 
     def stop(self):
         if self._own_executor:
             self._executor.shutdown(wait=True)
             self._executor = None
+            self._max_workers = None
+
+
+def _run_in_process(func, task, *args):
+    # The task that was ran is a copy of the original task (it was pickled
+    # into this process), so there is no need to send it back.
+    _task, event, result = func(task, *args)
+    return (event, result)
+
+
+class _ProgressSender(object):
+    """Progress callback that sends task progress to the parent process.
+
+    Instances of this class are sent (pickled) along with the task to the
+    process that will run it and are bound there as the tasks progress
+    callback.
+    """
+
+    def __init__(self, queue, task_uuid):
+        self._queue = queue
+        self._task_uuid = task_uuid
+
+    def __call__(self, task, event_data, progress, **kwargs):
+        self._queue.put((_PROGRESS, self._task_uuid, (progress, kwargs)))
+
+
+class _PendingTask(object):
+    def __init__(self, task, event, progress_callback):
+        self.task = task
+        self.event = event
+        self.progress_callback = progress_callback
+        self.future = futures.Future()
+        self.process_future = None
+
+
+class ParallelProcessTaskExecutor(ParallelTaskExecutor):
+    """Executes tasks in parallel in a pool of processes.
+
+    Submits tasks to executor which should provide interface similar
+    to concurrent.futures.ProcessPoolExecutor (if no executor is provided
+    one is created with one process per cpu). Tasks, their arguments and
+    their results must be picklable.
+
+    Progress updates are sent back from the processes running tasks over a
+    queue and are delivered to the tasks in this process, so progress
+    callbacks (and other task listeners) work as if task were ran locally.
+
+    Priorities and resource limits are handled as in ParallelTaskExecutor
+    (tasks which do not fit into a created pool, or whose resources are
+    saturated, are kept queued in this process).
+    """
+
+    def __init__(self, executor=None, resource_limits=None):
+        super(ParallelProcessTaskExecutor, self).__init__(
+            executor, resource_limits=resource_limits)
+        self._manager = None
+        self._queue = None
+        self._dispatcher = None
+        # Task uuid => pending task (until its completion is dispatched).
+        self._pending = {}
+
+    def _submit_task(self, func, task, task_uuid, event, args,
+                     progress_callback, priority=None):
+        pending = _PendingTask(task, event, progress_callback)
+        if progress_callback is not None:
+            task.bind('update_progress', progress_callback)
+        self._pending[task_uuid] = pending
+        try:
+            pending.process_future = self._submit(
+                priority, task, _run_in_process, func, task,
+                *(args + (_ProgressSender(self._queue, task_uuid),)))
+        except Exception:
+            self._finish(task_uuid)
+            raise
+
+        def on_done(process_future):
+            # All progress sent by the task is already in the queue, so the
+            # completion is sent over that queue as well (and not handled
+            # directly) so that no progress update can be delivered after
+            # the task has finished.
+            self._queue.put((_DONE, task_uuid, None))
+
+        pending.process_future.add_done_callback(on_done)
+        return pending.future
+
+    def execute_task(self, task, task_uuid, arguments, progress_callback=None,
+                     priority=None):
+        return self._submit_task(_execute_task, task, task_uuid, EXECUTED,
+                                 (arguments,), progress_callback,
+                                 priority=priority)
+
+    def revert_task(self, task, task_uuid, arguments, result, failures,
+                    progress_callback=None):
+        return self._submit_task(_revert_task, task, task_uuid, REVERTED,
+                                 (arguments, result, failures),
+                                 progress_callback)
+
+    def _finish(self, task_uuid):
+        pending = self._pending.pop(task_uuid)
+        if pending.progress_callback is not None:
+            pending.task.unbind('update_progress', pending.progress_callback)
+        return pending
+
+    def _on_progress(self, task_uuid, progress, kwargs):
+        self._pending[task_uuid].task.update_progress(progress, **kwargs)
+
+    def _on_done(self, task_uuid):
+        pending = self._finish(task_uuid)
+        try:
+            event, result = pending.process_future.result()
+        except Exception:
+            # Task, its arguments or its results could not be sent between
+            # processes (or the process that was running it died).
+            event = pending.event
+            result = misc.Failure()
+        pending.future.set_result((pending.task, event, result))
+
+    def _dispatch(self):
+        while True:
+            kind, task_uuid, data = self._queue.get()
+            if kind == _STOP:
+                break
+            try:
+                if kind == _PROGRESS:
+                    self._on_progress(task_uuid, *data)
+                elif kind == _DONE:
+                    self._on_done(task_uuid)
+            except Exception:
+                LOG.exception("Failed dispatching %s message for task %s",
+                              kind, task_uuid)
+
+    def start(self):
+        if self._own_executor:
+            try:
+                process_count = multiprocessing.cpu_count()
+            except NotImplementedError:
+                process_count = 1
+            self._executor = futures.ProcessPoolExecutor(process_count)
+            self._max_workers = process_count
+        self._manager = multiprocessing.Manager()
+        self._queue = self._manager.Queue()
+        self._dispatcher = threading.Thread(target=self._dispatch)
+        self._dispatcher.daemon = True
+        self._dispatcher.start()
+
+    def stop(self):
+        super(ParallelProcessTaskExecutor, self).stop()
+        self._queue.put((_STOP, None, None))
+        self._dispatcher.join()
+        self._dispatcher = None
+        self._queue = None
+        self._manager.shutdown()
+        self._manager = None
+
+
+class AsyncTaskExecutor(TaskExecutorBase):
+    """Executes tasks on an asyncio event loop.
+
+    Task execute() and revert() methods may be coroutine functions (or
+    return any other awaitable); such awaitables are scheduled on the loop
+    and the task is finished when they are, so a single thread can keep
+    a large number of (I/O bound) tasks in flight. The loop is ran in its
+    own thread (if no loop is provided one is created and ran by this
+    executor) and task methods are called on it, so they should not block.
+    A provided loop must already be running (in some other thread) when
+    this executor is started.
+    """
+
+    def __init__(self, loop=None):
+        assert asyncio_utils.ASYNCIO_AVAILABLE, ("asyncio is needed to use"
+                                                 " this executor")
+        self._loop = loop
+        self._loop_thread = None
+        if loop is None:
+            self._loop_thread = asyncio_utils.LoopThread()
+
+    def _run_task(self, future, task, event, method, kwargs,
+                  progress_callback):
+        if not future.set_running_or_notify_cancel():
+            return
+        if progress_callback is not None:
+            task.bind('update_progress', progress_callback)
+
+        def finish(result):
+            if progress_callback is not None:
+                task.unbind('update_progress', progress_callback)
+            future.set_result((task, event, result))
+
+        def on_done(awaitable_future):
+            try:
+                result = awaitable_future.result()
+            except (Exception, asyncio_utils.asyncio.CancelledError):
+                # Cancelling the awaitable fails the task (instead of
+                # leaving the engine waiting for it forever).
+                result = misc.Failure()
+            finish(result)
+
+        task._trigger('started')
+        try:
+            result = method(**kwargs)
+            if asyncio_utils.is_awaitable(result):
+                awaitable_future = asyncio_utils.ensure_future(result,
+                                                               self._loop)
+                awaitable_future.add_done_callback(on_done)
+                return
+        except Exception:
+            result = misc.Failure()
+        finish(result)
+
+    def _submit(self, task, event, method, kwargs, progress_callback):
+        future = futures.Future()
+        self._loop.call_soon_threadsafe(self._run_task, future, task, event,
+                                        method, kwargs, progress_callback)
+        return future
+
+    def execute_task(self, task, task_uuid, arguments, progress_callback=None,
+                     priority=None):
+        return self._submit(task, EXECUTED, task.execute, arguments,
+                            progress_callback)
+
+    def revert_task(self, task, task_uuid, arguments, result, failures,
+                    progress_callback=None):
+        kwargs = arguments.copy()
+        kwargs['result'] = result
+        kwargs['flow_failures'] = failures
+        return self._submit(task, REVERTED, task.revert, kwargs,
+                            progress_callback)
+
+    def start(self):
+        if self._loop_thread is not None:
+            self._loop_thread.start()
+            self._loop = self._loop_thread.loop
+        elif not self._loop.is_running():
+            # Nothing would ever run the submitted tasks (and waiting for
+            # them would hang forever).
+            raise RuntimeError("The provided asyncio loop is not running")
+
+    def stop(self):
+        if self._loop_thread is not None:
+            self._loop_thread.stop()
+            self._loop = None
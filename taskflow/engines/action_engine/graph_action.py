@@ -14,10 +14,17 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import heapq
+import itertools
+import logging
+
 from taskflow import states as st
+from taskflow.utils import async_utils
 from taskflow.utils import misc
 
 
+LOG = logging.getLogger(__name__)
+
 _WAITING_TIMEOUT = 60  # in seconds
 
 
@@ -27,6 +34,11 @@ class FutureGraphAction(object):
     This graph action schedules all task it can for execution and than
     waits on returned futures. If task executor is able to execute tasks
     in parallel, this enables parallel flow run and reversion.
+
+    Tasks that fail and have a retry policy that allows it are scheduled
+    for execution again once their retry delay passed (in the meantime other
+    tasks are still scheduled and completed); the task stays in the RUNNING
+    state until then.
     """
 
     def __init__(self, analyzer, storage, task_action):
@@ -43,11 +55,22 @@ class FutureGraphAction(object):
     def execute(self):
         was_suspended = self._run(
             self.is_running,
-            self._task_action.schedule_execution,
+            self._schedule_execution,
             self._task_action.complete_execution,
-            self._analyzer.browse_nodes_for_execute)
+            self._analyzer.browse_nodes_for_execute,
+            get_retry_delay=self._get_retry_delay)
         return st.SUSPENDED if was_suspended else st.SUCCESS
 
+    @staticmethod
+    def _get_retry_delay(node, failure, attempt):
+        if node.retry is None:
+            return None
+        return node.retry.get_delay(failure, attempt)
+
+    def _schedule_execution(self, node):
+        return self._task_action.schedule_execution(
+            node, priority=self._analyzer.get_priority(node))
+
     def revert(self):
         was_suspended = self._run(
             self.is_reverting,
@@ -56,41 +79,93 @@ class FutureGraphAction(object):
             self._analyzer.browse_nodes_for_revert)
         return st.SUSPENDED if was_suspended else st.REVERTED
 
-    def _run(self, running, schedule_node, complete_node, get_next_nodes):
-
-        def schedule(nodes, not_done):
+    def _run(self, running, schedule_node, complete_node, get_next_nodes,
+             get_retry_delay=None):
+        completed = async_utils.CompletionQueue()
+        # Heap of (time to retry at, sequence number, node, failure) tuples of
+        # the nodes that failed and are waiting to be retried, and node name
+        # => how many times it was retried.
+        retries = []
+        sequence = itertools.count()
+        attempts = {}
+
+        def schedule(nodes):
+            scheduled = 0
             for node in nodes:
                 future = schedule_node(node)
                 if future is not None:
-                    not_done.append(future)
+                    completed.watch(future)
+                    scheduled += 1
                 else:
-                    schedule(get_next_nodes(node), not_done)
+                    scheduled += schedule(get_next_nodes(node))
+            return scheduled
 
         failures = []
-        not_done = []
-        schedule(get_next_nodes(), not_done)
+        not_done = schedule(get_next_nodes())
         was_suspended = False
-        while not_done:
+        while not_done or retries:
             # NOTE(imelnikov): if timeout occurs before any of futures
             # completes, done list will be empty and we'll just go
             # for next iteration.
-            done, not_done = self._task_action.wait_for_any(
-                not_done, _WAITING_TIMEOUT)
-
-            next_nodes = []
-            for future in done:
-                # NOTE(harlowja): event will be used in the future for smart
-                # reversion (ignoring it for now).
-                node, _event, result = future.result()
-                complete_node(node, result)
-                if isinstance(result, misc.Failure):
-                    failures.append(result)
-                else:
-                    next_nodes.extend(get_next_nodes(node))
+            timeout = _WAITING_TIMEOUT
+            if retries:
+                timeout = min(timeout,
+                              max(0.0, retries[0][0] - misc.wallclock()))
+            done = completed.get(timeout)
+            if not done and not retries:
+                continue
+            not_done -= len(done)
+
+            # NOTE: state changes made while handling a round of completed
+            # tasks are saved together when that round ends; scheduling is
+            # not batched, as executors may run the scheduled tasks right
+            # away (and completed tasks must be saved before others start).
+            with self._storage.batch():
+                next_nodes = []
+                for future in done:
+                    # NOTE(harlowja): event will be used in the future for
+                    # smart reversion (ignoring it for now).
+                    node, _event, result = future.result()
+                    if isinstance(result, misc.Failure):
+                        delay = None
+                        if (get_retry_delay is not None and running() and
+                                not failures):
+                            attempt = attempts.get(node.name, 0)
+                            delay = get_retry_delay(node, result, attempt)
+                        if delay is not None:
+                            LOG.warning("Task '%s' failed (%s), retrying it"
+                                        " in %0.3f seconds", node.name,
+                                        result, delay)
+                            attempts[node.name] = attempt + 1
+                            heapq.heappush(retries,
+                                           (misc.wallclock() + delay,
+                                            next(sequence), node, result))
+                            continue
+                    complete_node(node, result)
+                    if isinstance(result, misc.Failure):
+                        failures.append(result)
+                    else:
+                        next_nodes.extend(get_next_nodes(node))
+
+                if retries and (failures or not running()):
+                    if failures:
+                        # NOTE: the flow is going to be reverted, so tasks
+                        # waiting to be retried fail with their last failure.
+                        for _at, _seq, node, failure in retries:
+                            complete_node(node, failure)
+                            failures.append(failure)
+                    else:
+                        # NOTE: the tasks are left in the RUNNING state, so
+                        # that they are ran again when the flow is resumed.
+                        was_suspended = True
+                    retries = []
+                now = misc.wallclock()
+                while retries and retries[0][0] <= now:
+                    next_nodes.append(heapq.heappop(retries)[2])
 
             if next_nodes:
                 if running() and not failures:
-                    schedule(next_nodes, not_done)
+                    not_done += schedule(next_nodes)
                 else:
                     # NOTE(imelnikov): engine stopped while there were
                     # still some tasks to do, so we either failed
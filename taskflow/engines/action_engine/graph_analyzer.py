@@ -14,20 +14,74 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import six
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
 
+from taskflow import exceptions as exc
 from taskflow import states as st
 
+# Cost of a task that has neither a cost hint nor a recorded duration.
+_DEFAULT_COST = 1.0
+
+# Revert modes, which control which tasks are reverted when tasks fail:
+#
+# - all: every task that ran is reverted (the default).
+# - affected: only the tasks affected by the failed tasks are reverted, which
+#   are the tasks the failed tasks depend on (directly or not) and all the
+#   tasks that depend on those (or on the failed tasks). Tasks of other
+#   (independent) parts of the graph keep their results, and are not ran
+#   again when the flow is ran again.
+REVERT_ALL = 'all'
+REVERT_AFFECTED = 'affected'
+REVERT_MODES = (REVERT_ALL, REVERT_AFFECTED)
+
 
 class GraphAnalyzer(object):
     """Analyzes a execution graph to get the next nodes for execution or
     reversion by utilizing the graphs nodes and edge relations and comparing
     the node state against the states stored in storage.
+
+    To avoid re-reading the state of every predecessor (or successor) each
+    time a node finishes, the analyzer keeps a count of the dependencies that
+    are still outstanding for each node. These counters are seeded from
+    storage when the whole graph is browsed (which happens when the engine
+    starts, or resumes, executing or reverting) and are then decremented as
+    nodes complete, so that finding the next nodes only touches the direct
+    successors (or predecessors) of the node that has just finished.
+
+    Nodes that are ready to execute are returned ordered by their priority,
+    the length of the longest (most costly) path from them to the end of the
+    graph, so that the chains which determine how long the whole graph takes
+    to run are started first. The cost of a node is taken from the `cost`
+    hint of its task, or else from the `duration` that was recorded for it
+    in storage (for example by the timing listener in a previous run).
+
+    Which nodes are browsed for reversion depends on the revert mode (see
+    REVERT_MODES).
     """
 
-    def __init__(self, graph, storage):
+    def __init__(self, graph, storage, revert_mode=REVERT_ALL):
+        if revert_mode not in REVERT_MODES:
+            raise ValueError("Unknown revert mode: %s" % revert_mode)
+        # NOTE: the graph is a compact (array backed) graph, nodes are
+        # tracked by their index in it.
         self._graph = graph
         self._storage = storage
+        self._revert_mode = revert_mode
+        # Node index => number of predecessors that have not yet finished
+        # executing.
+        self._execute_waiting = []
+        # Node index => number of successors that have not yet finished
+        # reverting.
+        self._revert_waiting = []
+        # Node index => length of the critical path starting at that node.
+        self._priorities = []
+        # Node index => whether the node is to be reverted (or None when all
+        # nodes are).
+        self._revert_scope = None
 
     @property
     def execution_graph(self):
@@ -37,58 +91,288 @@ class GraphAnalyzer(object):
         """Browse next nodes to execute for given node if specified and
         for whole graph otherwise.
         """
-        if node:
-            nodes = self._graph.successors(node)
-        else:
-            nodes = self._graph.nodes_iter()
+        if node is None:
+            task_states = self._get_all_states()
+            self._execute_waiting = self._count_waiting(
+                task_states, False, (st.SUCCESS,))
+            self._priorities = self._compute_priorities()
+            return self._by_priority(
+                self._find_available(task_states, self._execute_waiting,
+                                     st.RUNNING))
+        i = self._graph.index_of(node)
+        if self._get_state(i) != st.SUCCESS:
+            return []
+        indexes = self._release(self._graph.successor_indexes(i),
+                                self._execute_waiting)
+        return self._by_priority(i for i in indexes
+                                 if self._is_ready(i, st.RUNNING))
 
-        available_nodes = []
-        for node in nodes:
-            if self._is_ready_for_execute(node):
-                available_nodes.append(node)
-        return available_nodes
+    def get_priority(self, node):
+        """Returns the length of the critical path starting at the node.
+
+        Nodes with higher priority should be executed before others when not
+        all ready nodes can be executed at once.
+        """
+        if not self._priorities:
+            return _DEFAULT_COST
+        return self._priorities[self._graph.index_of(node)]
 
     def browse_nodes_for_revert(self, node=None):
         """Browse next nodes to revert for given node if specified and
         for whole graph otherwise.
         """
-        if node:
-            nodes = self._graph.predecessors(node)
+        if node is None:
+            task_states = self._get_all_states()
+            self._revert_waiting = self._count_waiting(
+                task_states, True, (st.PENDING, st.REVERTED))
+            self._revert_scope = None
+            if self._revert_mode == REVERT_AFFECTED:
+                self._revert_scope = self._find_affected(task_states)
+            return self._to_nodes(
+                self._in_revert_scope(
+                    self._find_available(task_states, self._revert_waiting,
+                                         st.REVERTING)))
+        i = self._graph.index_of(node)
+        if self._get_state(i) not in (st.PENDING, st.REVERTED):
+            return []
+        indexes = self._release(self._graph.predecessor_indexes(i),
+                                self._revert_waiting)
+        return self._to_nodes(i for i in self._in_revert_scope(indexes)
+                              if self._is_ready(i, st.REVERTING))
+
+    def _in_revert_scope(self, indexes):
+        if self._revert_scope is None:
+            return indexes
+        return [i for i in indexes if self._revert_scope[i]]
+
+    def _find_failed(self, task_states):
+        """Finds the nodes that failed."""
+        return [i for i, task_state in enumerate(task_states)
+                if task_state == st.FAILURE]
+
+    def _find_affected(self, task_states):
+        """Finds the nodes affected by the failed nodes, returning a list of
+        node index => whether the node is affected (or None when no node
+        failed, and so all nodes are).
+
+        Since nodes that depend on a affected node are affected as well, the
+        successors of a affected node are always affected too (so reverting
+        affected nodes never waits on nodes that are not affected).
+        """
+        failed = self._find_failed(task_states)
+        if not failed:
+            return None
+        ancestors = self._walk(failed, self._graph.predecessor_indexes)
+        return self._walk([i for i, seen in enumerate(ancestors) if seen],
+                          self._graph.successor_indexes)
+
+    def _walk(self, indexes, get_next):
+        """Returns a list of node index => whether the node is one of the
+        given nodes or can be reached from them.
+        """
+        seen = [False] * len(self._graph)
+        stack = list(indexes)
+        for i in stack:
+            seen[i] = True
+        while stack:
+            for j in get_next(stack.pop()):
+                if not seen[j]:
+                    seen[j] = True
+                    stack.append(j)
+        return seen
+
+    def _get_all_states(self):
+        """Gets the states of all nodes (ordered by node index)."""
+        names = [n.name for n in self._graph.nodes_iter()]
+        task_states = self._storage.get_tasks_states(names)
+        return [task_states[name] for name in names]
+
+    def _get_state(self, i):
+        """Gets the state of the node with the given index."""
+        return self._storage.get_task_state(self._graph.node_at(i).name)
+
+    def _get_cost(self, node):
+        cost = getattr(node, 'cost', None)
+        if cost is None:
+            meta = self._storage.get_task_metadata(node.name)
+            cost = meta.get('duration', _DEFAULT_COST)
+        return cost
+
+    def _compute_priorities(self):
+        """Computes the critical path length of every node (its own cost
+        plus the largest critical path length of its successors).
+        """
+        priorities = [0] * len(self._graph)
+        for i in reversed(self._graph.topological_indexes()):
+            successors = [priorities[j]
+                          for j in self._graph.successor_indexes(i)]
+            priorities[i] = (self._get_cost(self._graph.node_at(i)) +
+                             max(successors or [0]))
+        return priorities
+
+    def _to_nodes(self, indexes):
+        return [self._graph.node_at(i) for i in indexes]
+
+    def _by_priority(self, indexes):
+        # NOTE: the sort is stable, so nodes with equal priorities stay in
+        # the order they were found in.
+        if not self._priorities:
+            return self._to_nodes(indexes)
+        return self._to_nodes(sorted(indexes,
+                                     key=self._priorities.__getitem__,
+                                     reverse=True))
+
+    def _count_waiting(self, task_states, reverse, finished_states):
+        """Counts the unfinished dependencies (the predecessors, or the
+        successors when reverse is true) of each node.
+        """
+        if reverse:
+            get_dependencies = self._graph.successor_indexes
         else:
-            nodes = self._graph.nodes_iter()
+            get_dependencies = self._graph.predecessor_indexes
+        return [sum(1 for j in get_dependencies(i)
+                    if task_states[j] not in finished_states)
+                for i in range(0, len(task_states))]
+
+    @staticmethod
+    def _find_available(task_states, waiting, state):
+        """Finds nodes with no unfinished dependencies that can be moved to
+        the given state.
+        """
+        return [i for i, task_state in enumerate(task_states)
+                if not waiting[i] and st.check_task_transition(task_state,
+                                                               state)]
+
+    @staticmethod
+    def _release(indexes, waiting):
+        """Marks a dependency of the given nodes as finished, returning the
+        nodes that no longer wait on any other dependency.
+        """
+        available = []
+        for i in indexes:
+            waiting[i] -= 1
+            if not waiting[i]:
+                available.append(i)
+        return available
+
+    def _is_ready(self, i, state):
+        """Checks if task in its current state can move to given state."""
+        return st.check_task_transition(self._get_state(i), state)
 
-        available_nodes = []
-        for node in nodes:
-            if self._is_ready_for_revert(node):
-                available_nodes.append(node)
-        return available_nodes
 
-    def _is_ready_for_execute(self, task):
-        """Checks if task is ready to be executed."""
+# Task states in the order of their codes in the state table of the
+# vectorized analyzer.
+_TASK_STATES = (st.PENDING, st.RUNNING, st.SUCCESS, st.FAILURE,
+                st.REVERTING, st.REVERTED)
 
-        state = self._storage.get_task_state(task.name)
-        if not st.check_task_transition(state, st.RUNNING):
-            return False
 
-        task_names = []
-        for prev_task in self._graph.predecessors(task):
-            task_names.append(prev_task.name)
+class VectorizedGraphAnalyzer(GraphAnalyzer):
+    """Graph analyzer that keeps the task states in a numpy table.
 
-        task_states = self._storage.get_tasks_states(task_names)
-        return all(state == st.SUCCESS
-                   for state in six.itervalues(task_states))
+    The table holds the state code of every node (indexed by node index); it
+    is loaded from storage (which stays the place where task states are
+    persisted) the first time the whole graph is browsed, and is then kept
+    in sync by watching the task state changes made in storage. The
+    unfinished dependencies of all nodes and the nodes that are ready are
+    computed with vectorized operations over that table and the adjacency
+    arrays of the graph, and single nodes are checked against it without
+    going through storage. This is only worth it for very large graphs.
 
-    def _is_ready_for_revert(self, task):
-        """Checks if task is ready to be reverted."""
+    Raises ImportError if numpy is not available.
+    """
+
+    def __init__(self, graph, storage, revert_mode=REVERT_ALL):
+        if not NUMPY_AVAILABLE:
+            raise ImportError("numpy is needed to use the vectorized graph"
+                              " analyzer")
+        super(VectorizedGraphAnalyzer, self).__init__(graph, storage,
+                                                      revert_mode=revert_mode)
+        self._codes = dict((state, code)
+                           for code, state in enumerate(_TASK_STATES))
+        self._name_index = dict((n.name, i)
+                                for i, n in enumerate(graph.nodes_iter()))
+        # Node index => state code (or None until it is loaded).
+        self._states = None
+        storage.add_state_watcher(self._on_state_change)
+        self._succ = self._to_numpy(graph.successor_arrays())
+        self._pred = self._to_numpy(graph.predecessor_arrays())
+        # Task state => (allowed, ignored) transitions tables.
+        self._transitions = {}
+
+    @staticmethod
+    def _to_numpy(arrays):
+        """Converts (offsets, targets) arrays to (owners, targets) numpy
+        arrays, where owners[k] is the index of the node that has the
+        dependency targets[k].
+        """
+        offsets, targets = arrays
+        offsets = np.array(offsets, dtype=np.intp)
+        owners = np.repeat(np.arange(len(offsets) - 1, dtype=np.intp),
+                           np.diff(offsets))
+        return owners, np.array(targets, dtype=np.intp)
+
+    def _lookup(self, states):
+        """Returns a table of state code => whether it is in the states."""
+        return np.array([state in states for state in _TASK_STATES],
+                        dtype=bool)
 
-        state = self._storage.get_task_state(task.name)
-        if not st.check_task_transition(state, st.REVERTING):
-            return False
+    def _on_state_change(self, task_name, state):
+        i = self._name_index.get(task_name)
+        if i is not None and self._states is not None:
+            self._states[i] = self._codes[state]
 
-        task_names = []
-        for prev_task in self._graph.successors(task):
-            task_names.append(prev_task.name)
+    def _get_all_states(self):
+        """Gets the state codes of all nodes (ordered by node index)."""
+        if self._states is None:
+            task_states = super(VectorizedGraphAnalyzer,
+                                self)._get_all_states()
+            self._states = np.array([self._codes[state]
+                                     for state in task_states],
+                                    dtype=np.int8)
+        return self._states
+
+    def _get_state(self, i):
+        if self._states is None:
+            return super(VectorizedGraphAnalyzer, self)._get_state(i)
+        return _TASK_STATES[self._states[i]]
+
+    def _find_failed(self, task_states):
+        return np.flatnonzero(
+            task_states == self._codes[st.FAILURE]).tolist()
+
+    def _count_waiting(self, task_states, reverse, finished_states):
+        owners, targets = self._succ if reverse else self._pred
+        unfinished = ~self._lookup(finished_states)[task_states[targets]]
+        return np.bincount(owners[unfinished],
+                           minlength=len(task_states)).tolist()
+
+    def _get_transitions(self, state):
+        """Returns (allowed, ignored) tables of state code => whether
+        a task in that state can (or should just not) move to the state.
+        """
+        try:
+            return self._transitions[state]
+        except KeyError:
+            allowed = []
+            ignored = []
+            for s in _TASK_STATES:
+                try:
+                    if st.check_task_transition(s, state):
+                        allowed.append(s)
+                    else:
+                        ignored.append(s)
+                except exc.InvalidState:
+                    pass
+            transitions = (self._lookup(allowed), self._lookup(ignored))
+            self._transitions[state] = transitions
+            return transitions
 
-        task_states = self._storage.get_tasks_states(task_names)
-        return all(state in (st.PENDING, st.REVERTED)
-                   for state in six.itervalues(task_states))
+    def _find_available(self, task_states, waiting, state):
+        candidates = np.flatnonzero(np.array(waiting) == 0)
+        codes = task_states[candidates]
+        allowed, ignored = self._get_transitions(state)
+        invalid = np.flatnonzero(~(allowed[codes] | ignored[codes]))
+        if len(invalid):
+            # Let the states module raise the appropriate error.
+            st.check_task_transition(_TASK_STATES[codes[invalid[0]]], state)
+        return candidates[allowed[codes]].tolist()
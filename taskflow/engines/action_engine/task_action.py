@@ -15,6 +15,7 @@
 #    under the License.
 
 import logging
+import threading
 
 from taskflow import states
 from taskflow.utils import misc
@@ -25,11 +26,29 @@ SAVE_RESULT_STATES = (states.SUCCESS, states.FAILURE)
 
 
 class TaskAction(object):
-
-    def __init__(self, storage, task_executor, notifier):
+    """Schedules and completes tasks, persisting their state changes.
+
+    Progress updates of tasks are saved to storage as they come, unless
+    a minimum progress interval (in seconds) or a minimum progress delta is
+    given; then an update is only saved when at least that much time passed,
+    or the progress changed by at least that much, since the last saved one
+    (other updates are kept in memory and the latest one is saved when the
+    task finishes). Callbacks bound to the tasks `update_progress` event are
+    still called on every update.
+    """
+
+    def __init__(self, storage, task_executor, notifier,
+                 progress_interval=None, progress_delta=None):
         self._storage = storage
         self._task_executor = task_executor
         self._notifier = notifier
+        self._progress_interval = progress_interval
+        self._progress_delta = progress_delta
+        # Task name => (progress, time) of the last saved progress update and
+        # task name => (progress, details) of the latest unsaved one.
+        self._progress_saved = {}
+        self._progress_pending = {}
+        self._progress_lock = threading.Lock()
 
     def _change_state(self, task, state, result=None, progress=None):
         old_state = self._storage.get_task_state(task.name)
@@ -40,7 +59,12 @@ class TaskAction(object):
         else:
             self._storage.set_task_state(task.name, state)
         if progress is not None:
+            with self._progress_lock:
+                self._progress_pending.pop(task.name, None)
+                self._progress_saved[task.name] = (progress, misc.wallclock())
             self._storage.set_task_progress(task.name, progress)
+        else:
+            self._flush_progress(task)
 
         task_uuid = self._storage.get_task_uuid(task.name)
         details = dict(task_name=task.name,
@@ -51,8 +75,41 @@ class TaskAction(object):
             task.update_progress(progress)
         return True
 
+    def _should_save_progress(self, task_name, progress):
+        if self._progress_interval is None and self._progress_delta is None:
+            return True
+        try:
+            saved_progress, saved_at = self._progress_saved[task_name]
+        except KeyError:
+            return True
+        if progress >= 1.0:
+            return True
+        if (self._progress_delta is not None and
+                abs(progress - saved_progress) >= self._progress_delta):
+            return True
+        if (self._progress_interval is not None and
+                misc.wallclock() - saved_at >= self._progress_interval):
+            return True
+        return False
+
+    def _flush_progress(self, task):
+        """Saves the latest progress update of the task (if not saved)."""
+        with self._progress_lock:
+            try:
+                progress, details = self._progress_pending.pop(task.name)
+            except KeyError:
+                return
+            self._progress_saved[task.name] = (progress, misc.wallclock())
+        self._storage.set_task_progress(task.name, progress, details)
+
     def _on_update_progress(self, task, event_data, progress, **kwargs):
         """Should be called when task updates its progress."""
+        with self._progress_lock:
+            if not self._should_save_progress(task.name, progress):
+                self._progress_pending[task.name] = (progress, kwargs)
+                return
+            self._progress_pending.pop(task.name, None)
+            self._progress_saved[task.name] = (progress, misc.wallclock())
         try:
             self._storage.set_task_progress(task.name, progress, kwargs)
         except Exception:
@@ -61,13 +118,14 @@ class TaskAction(object):
             LOG.exception("Failed setting task progress for %s to %0.3f",
                           task, progress)
 
-    def schedule_execution(self, task):
+    def schedule_execution(self, task, priority=None):
         if not self._change_state(task, states.RUNNING, progress=0.0):
             return
         kwargs = self._storage.fetch_mapped_args(task.rebind)
         task_uuid = self._storage.get_task_uuid(task.name)
         return self._task_executor.execute_task(task, task_uuid, kwargs,
-                                                self._on_update_progress)
+                                                self._on_update_progress,
+                                                priority=priority)
 
     def complete_execution(self, task, result):
         if isinstance(result, misc.Failure):
@@ -93,6 +151,3 @@ class TaskAction(object):
             self._change_state(task, states.FAILURE)
         else:
             self._change_state(task, states.REVERTED, progress=1.0)
-
-    def wait_for_any(self, fs, timeout):
-        return self._task_executor.wait_for_any(fs, timeout)
@@ -19,6 +19,7 @@ import abc
 
 import six
 
+from taskflow import storage as t_storage
 from taskflow.utils import misc
 
 
@@ -35,14 +36,30 @@ class EngineBase(object):
         else:
             self._conf = dict(conf)
         self._storage = None
-        self.notifier = misc.TransitionNotifier()
-        self.task_notifier = misc.TransitionNotifier()
+        self.notifier = self._make_notifier()
+        self.task_notifier = self._make_notifier()
+
+    def _make_notifier(self):
+        conf = self._conf
+        return misc.TransitionNotifier(
+            async_dispatch=misc.as_bool(conf.get('notify_async', False)),
+            queue_size=conf.get('notify_queue_size',
+                                misc.TransitionNotifier.DEFAULT_QUEUE_SIZE),
+            overflow=conf.get('notify_overflow',
+                              misc.TransitionNotifier.BLOCK),
+            sample_every=conf.get('notify_sample_every', 10))
 
     @property
     def storage(self):
         """The storage unit for this flow."""
         if self._storage is None:
-            self._storage = self._storage_cls(self._flow_detail, self._backend)
+            self._storage = self._storage_cls(
+                self._flow_detail, self._backend,
+                checkpoint=self._conf.get(
+                    'checkpoint', t_storage.CHECKPOINT_EVERY_TRANSITION),
+                blob_store=self._conf.get('blob_store'),
+                blob_threshold=self._conf.get(
+                    'blob_threshold', t_storage.DEFAULT_BLOB_THRESHOLD))
         return self._storage
 
     @abc.abstractproperty
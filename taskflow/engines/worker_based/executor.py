@@ -27,7 +27,6 @@ from taskflow.engines.worker_based import protocol as pr
 from taskflow.engines.worker_based import proxy
 from taskflow.engines.worker_based import remote_task as rt
 from taskflow import exceptions as exc
-from taskflow.utils import async_utils
 from taskflow.utils import misc
 from taskflow.utils import persistence_utils as pu
 
@@ -150,7 +149,7 @@ class WorkerTaskExecutor(executor.TaskExecutorBase):
         return remote_task.result
 
     def execute_task(self, task, task_uuid, arguments,
-                     progress_callback=None):
+                     progress_callback=None, priority=None):
         return self._submit_task(task, task_uuid, pr.EXECUTE, arguments,
                                  progress_callback)
 
@@ -160,10 +159,6 @@ class WorkerTaskExecutor(executor.TaskExecutorBase):
                                  progress_callback, result=result,
                                  failures=failures)
 
-    def wait_for_any(self, fs, timeout=None):
-        """Wait for futures returned by this executor to complete."""
-        return async_utils.wait_for_any(fs, timeout)
-
     def start(self):
         """Start proxy thread."""
         if self._proxy_thread is None:
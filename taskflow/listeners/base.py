@@ -23,6 +23,7 @@ import six
 
 from taskflow.openstack.common import excutils
 from taskflow import states
+from taskflow.utils import flow_utils
 from taskflow.utils import misc
 
 LOG = logging.getLogger(__name__)
@@ -38,11 +39,18 @@ class ListenerBase(object):
     transitions. It provides a useful context manager access to be able to
     register and unregister with a given engine automatically when a context
     is entered and when it is exited.
+
+    Listeners can also receive the events (see `BaseTask.TASK_EVENTS`) of the
+    tasks the engine runs by naming them in `task_events`; handlers for those
+    are bound to every task of the engines flow when registering (the flow is
+    walked as is, so registering does not compile the engine or touch its
+    storage).
     """
 
     def __init__(self, engine,
                  task_listen_for=(misc.TransitionNotifier.ANY,),
-                 flow_listen_for=(misc.TransitionNotifier.ANY,)):
+                 flow_listen_for=(misc.TransitionNotifier.ANY,),
+                 task_events=()):
         if not task_listen_for:
             task_listen_for = []
         if not flow_listen_for:
@@ -51,6 +59,8 @@ class ListenerBase(object):
             'task': list(task_listen_for),
             'flow': list(flow_listen_for),
         }
+        self._task_events = list(task_events)
+        self._bound_tasks = []
         self._engine = engine
         self._registered = False
 
@@ -60,6 +70,23 @@ class ListenerBase(object):
     def _task_receiver(self, state, details):
         pass
 
+    def _task_event_receiver(self, task, event_data, *args, **kwargs):
+        """Receives the task events (event_data['event_name'] is the event)."""
+
+    def _bind_task_events(self):
+        if not self._task_events:
+            return
+        for task in flow_utils.iter_tasks(self._engine._flow):
+            for event in self._task_events:
+                task.bind(event, self._task_event_receiver, event_name=event)
+            self._bound_tasks.append(task)
+
+    def _unbind_task_events(self):
+        while self._bound_tasks:
+            task = self._bound_tasks.pop()
+            for event in self._task_events:
+                task.unbind(event, self._task_event_receiver)
+
     def deregister(self):
         if not self._registered:
             return
@@ -72,6 +99,7 @@ class ListenerBase(object):
                     self._task_receiver)
         _deregister(self._listen_for['flow'], self._engine.notifier,
                     self._flow_receiver)
+        self._unbind_task_events()
 
         self._registered = False
 
@@ -95,6 +123,7 @@ class ListenerBase(object):
                   self._task_receiver)
         _register(self._listen_for['flow'], self._engine.notifier,
                   self._flow_receiver)
+        self._bind_task_events()
 
         self._registered = True
 
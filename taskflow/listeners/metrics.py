@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+#    Copyright (C) 2014 Yahoo! Inc. All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from __future__ import absolute_import
+
+import threading
+
+from taskflow.listeners import base
+from taskflow import states
+from taskflow.utils import metrics_utils
+from taskflow.utils import misc
+
+TRANSITIONS = 'taskflow_task_transitions_total'
+QUEUE_WAIT = 'taskflow_task_queue_wait_seconds'
+RUN_TIME = 'taskflow_task_run_seconds'
+REVERT_TIME = 'taskflow_task_revert_seconds'
+
+# Timed state => (histogram, states that end it).
+_TIMED_STATES = {
+    states.RUNNING: (RUN_TIME, (states.SUCCESS, states.FAILURE)),
+    states.REVERTING: (REVERT_TIME, (states.REVERTED, states.FAILURE)),
+}
+
+
+class MetricsListener(base.ListenerBase):
+    """Collects task metrics into a (in-process) metrics registry.
+
+    For each task (by name) the following metrics are kept:
+
+    * ``taskflow_task_transitions_total`` -- counter of the state
+      transitions of the task (labeled with the states it went from and to).
+    * ``taskflow_task_queue_wait_seconds`` -- histogram of the time between
+      the task being scheduled and it actually starting to execute (or
+      revert), which is spent waiting for a free executor.
+    * ``taskflow_task_run_seconds`` -- histogram of the time it took the
+      task to execute.
+    * ``taskflow_task_revert_seconds`` -- histogram of the time it took the
+      task to revert.
+
+    Nothing is written to storage; use the registry (see
+    :py:class:`~taskflow.utils.metrics_utils.MetricsRegistry`) to read the
+    metrics or to dump them in the prometheus text format. Metrics of
+    different engines (or runs) that use the same registry are aggregated.
+
+    NOTE: tasks ran in other processes (or on remote workers) do not report
+    when they actually start, for those no queue wait is recorded and their
+    run (and revert) time includes the time they were queued. Times are
+    taken when notifications are received, so engines should not be
+    configured to notify listeners asynchronously when using this listener.
+    """
+
+    def __init__(self, engine, registry=None):
+        super(MetricsListener, self).__init__(
+            engine, task_listen_for=(misc.TransitionNotifier.ANY,),
+            flow_listen_for=[], task_events=('started',))
+        if registry is None:
+            registry = metrics_utils.DEFAULT_REGISTRY
+        self.registry = registry
+        self._lock = threading.Lock()
+        # Task name => last seen state, and task name => (timed state,
+        # time it was scheduled, time it started or None).
+        self._states = {}
+        self._timers = {}
+
+    def deregister(self):
+        super(MetricsListener, self).deregister()
+        with self._lock:
+            self._states.clear()
+            self._timers.clear()
+
+    def _task_event_receiver(self, task, event_data, *args, **kwargs):
+        if event_data.get('event_name') != 'started':
+            return
+        now = misc.wallclock()
+        with self._lock:
+            try:
+                state, scheduled_at, started_at = self._timers[task.name]
+            except KeyError:
+                return
+            if started_at is not None:
+                return
+            self._timers[task.name] = (state, scheduled_at, now)
+        self.registry.observe(QUEUE_WAIT, now - scheduled_at,
+                              labels={'task': task.name},
+                              help="Time tasks waited for an executor")
+
+    def _task_receiver(self, state, details):
+        task_name = details['task_name']
+        now = misc.wallclock()
+        with self._lock:
+            old_state = self._states.get(task_name)
+            self._states[task_name] = state
+            timer = self._timers.pop(task_name, None)
+            if state in _TIMED_STATES:
+                self._timers[task_name] = (state, now, None)
+        labels = {'task': task_name, 'from': old_state or '', 'to': state}
+        self.registry.inc(TRANSITIONS, labels=labels,
+                          help="Task state transitions")
+        if timer is None:
+            return
+        timed_state, scheduled_at, started_at = timer
+        histogram, end_states = _TIMED_STATES[timed_state]
+        if state not in end_states:
+            return
+        if started_at is None:
+            started_at = scheduled_at
+        if histogram == RUN_TIME:
+            help_text = "Time tasks took to execute"
+        else:
+            help_text = "Time tasks took to revert"
+        self.registry.observe(histogram, now - started_at,
+                              labels={'task': task_name}, help=help_text)
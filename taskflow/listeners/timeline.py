@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+
+#    Copyright (C) 2014 Yahoo! Inc. All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from __future__ import absolute_import
+
+import collections
+import logging
+import os
+import threading
+
+from taskflow.listeners import base
+from taskflow.openstack.common import jsonutils
+from taskflow import states
+from taskflow.utils import misc
+from taskflow.utils import threading_utils as tu
+
+LOG = logging.getLogger(__name__)
+
+# Flow states after which the timeline is written out.
+FLOW_END_STATES = (states.SUCCESS, states.FAILURE, states.REVERTED,
+                   states.SUSPENDED)
+
+# Task states that start (and end) a task span.
+_SPAN_STATES = {
+    states.RUNNING: (states.SUCCESS, states.FAILURE),
+    states.REVERTING: (states.REVERTED, states.FAILURE),
+}
+
+DEFAULT_MAX_EVENTS = 100000
+
+
+class TimelineListener(base.ListenerBase):
+    """Records a timeline of a flow run in the chrome trace event format.
+
+    For every execution (and reversion) of a task a complete (``X``) event
+    is recorded on the thread that ran the task, spanning from the moment the
+    task started to when the engine was notified it finished (the time the
+    task waited to be started is kept in its ``queue_wait_ms`` argument).
+    Progress updates of tasks and state changes of the flow are recorded as
+    instant (``i``) events. The resulting json can be loaded in
+    ``chrome://tracing`` (or https://ui.perfetto.dev) to see how the tasks
+    were spread over the threads of the engine.
+
+    At most ``max_events`` events are kept (older events are dropped when
+    more are recorded). When a path is given the timeline is written to it
+    every time the flow reaches a final (or suspended) state, otherwise it
+    can be fetched with :py:meth:`get_trace` (or written with
+    :py:meth:`dump`).
+
+    NOTE: tasks ran in other processes (or on remote workers) do not report
+    when (and on which thread) they start, their events start when they were
+    scheduled and are placed on the engines thread.
+    """
+
+    def __init__(self, engine, path=None, max_events=DEFAULT_MAX_EVENTS):
+        super(TimelineListener, self).__init__(
+            engine, task_listen_for=(misc.TransitionNotifier.ANY,),
+            flow_listen_for=(misc.TransitionNotifier.ANY,),
+            task_events=('started', 'update_progress'))
+        self._path = path
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        # NOTE: deques of python 2.6 have no maxlen attribute, so the maximum
+        # size is kept separately.
+        self._max_events = max(1, int(max_events))
+        self._events = collections.deque(maxlen=self._max_events)
+        self._thread_names = {}
+        self._epoch = misc.wallclock()
+        # Task name => [span state, scheduled at, started at, thread id].
+        self._spans = {}
+        self.dropped = 0
+
+    def _now(self):
+        return (misc.wallclock() - self._epoch) * 1000000.0
+
+    def _current_thread(self):
+        tid = tu.get_ident()
+        if tid not in self._thread_names:
+            self._thread_names[tid] = threading.current_thread().name
+        return tid
+
+    def _record(self, event):
+        # NOTE: must be called with the lock held.
+        if len(self._events) == self._max_events:
+            self.dropped += 1
+        event['pid'] = self._pid
+        self._events.append(event)
+
+    def _task_event_receiver(self, task, event_data, *args, **kwargs):
+        now = self._now()
+        with self._lock:
+            tid = self._current_thread()
+            if event_data.get('event_name') == 'started':
+                span = self._spans.get(task.name)
+                if span is not None and span[2] is None:
+                    span[2] = now
+                    span[3] = tid
+            elif event_data.get('event_name') == 'update_progress':
+                self._record({
+                    'name': 'progress',
+                    'cat': 'task',
+                    'ph': 'i',
+                    's': 't',
+                    'ts': now,
+                    'tid': tid,
+                    'args': {'task': task.name, 'progress': args[0]},
+                })
+
+    def _task_receiver(self, state, details):
+        task_name = details['task_name']
+        now = self._now()
+        with self._lock:
+            tid = self._current_thread()
+            span = self._spans.pop(task_name, None)
+            if state in _SPAN_STATES:
+                self._spans[task_name] = [state, now, None, None]
+            if span is None or state not in _SPAN_STATES[span[0]]:
+                return
+            span_state, scheduled_at, started_at, started_tid = span
+            if started_at is None:
+                started_at = scheduled_at
+                started_tid = tid
+            if span_state == states.RUNNING:
+                category = 'execute'
+            else:
+                category = 'revert'
+            self._record({
+                'name': task_name,
+                'cat': category,
+                'ph': 'X',
+                'ts': started_at,
+                'dur': now - started_at,
+                'tid': started_tid,
+                'args': {
+                    'state': state,
+                    'queue_wait_ms': (started_at - scheduled_at) / 1000.0,
+                },
+            })
+
+    def _flow_receiver(self, state, details):
+        now = self._now()
+        with self._lock:
+            self._record({
+                'name': state,
+                'cat': 'flow',
+                'ph': 'i',
+                's': 'g',
+                'ts': now,
+                'tid': self._current_thread(),
+                'args': {'flow': details.get('flow_name'),
+                         'old_state': details.get('old_state')},
+            })
+        if self._path and state in FLOW_END_STATES:
+            try:
+                self.dump(self._path)
+            except (IOError, OSError):
+                LOG.exception("Failed writing timeline to %s", self._path)
+
+    def get_trace(self):
+        """Returns the recorded timeline (in the chrome trace event json
+        object format).
+        """
+        with self._lock:
+            events = list(self._events)
+            thread_names = dict(self._thread_names)
+            dropped = self.dropped
+        for tid, name in sorted(thread_names.items()):
+            events.append({
+                'name': 'thread_name',
+                'ph': 'M',
+                'pid': self._pid,
+                'tid': tid,
+                'args': {'name': name},
+            })
+        return {
+            'traceEvents': events,
+            'displayTimeUnit': 'ms',
+            'otherData': {'dropped_events': dropped},
+        }
+
+    def dump(self, path):
+        """Writes the recorded timeline (as json) to the given path."""
+        with open(path, 'w') as fh:
+            fh.write(jsonutils.dumps(self.get_trace()))
@@ -196,8 +196,10 @@ class Connection(base.Connection):
             return _get()
 
     def _save_tasks_and_link(self, task_details, local_task_path):
+        saved_task_details = []
         for task_detail in task_details:
-            self._save_task_details(task_detail, ignore_missing=True)
+            saved_task_details.append(
+                self._save_task_details(task_detail, ignore_missing=True))
             src_td_path = os.path.join(self._task_path, task_detail.uuid)
             target_td_path = os.path.join(local_task_path, task_detail.uuid)
             try:
@@ -205,8 +207,12 @@ class Connection(base.Connection):
             except EnvironmentError as e:
                 if e.errno != errno.EEXIST:
                     raise
+        return saved_task_details
 
     def _save_flow_details(self, flow_detail, ignore_missing):
+        # The task details provided (not the existing ones) are what needs
+        # to be saved.
+        task_details = list(flow_detail)
         # See if we have an existing flow detail to merge with.
         e_fd = None
         try:
@@ -226,12 +232,13 @@ class Connection(base.Connection):
         self._write_to(
             os.path.join(flow_path, 'metadata'),
             jsonutils.dumps(p_utils.format_flow_detail(flow_detail)))
-        if len(flow_detail):
+        if task_details:
             task_path = os.path.join(flow_path, 'tasks')
             misc.ensure_tree(task_path)
-            self._run_with_process_lock('task',
-                                        self._save_tasks_and_link,
-                                        list(flow_detail), task_path)
+            saved_task_details = self._run_with_process_lock(
+                'task', self._save_tasks_and_link, task_details, task_path)
+            for task_detail in saved_task_details:
+                flow_detail.add(task_detail)
         return flow_detail
 
     def update_flow_details(self, flow_detail):
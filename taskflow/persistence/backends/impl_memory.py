@@ -17,26 +17,78 @@
 
 """Implementation of in-memory backend."""
 
+import collections
+import itertools
 import logging
+import threading
 
 from taskflow import exceptions as exc
 from taskflow.openstack.common import timeutils
 from taskflow.persistence.backends import base
 from taskflow.persistence import logbook
+from taskflow import states
+from taskflow.utils import misc
 from taskflow.utils import persistence_utils as p_utils
 
 LOG = logging.getLogger(__name__)
 
+# Flow states after which flows are evicted (when evicting terminal flows).
+TERMINAL_STATES = (states.SUCCESS, states.REVERTED)
+
 
 class MemoryBackend(base.Backend):
     """A backend that writes logbooks, flow details, and task details to in
     memory dictionaries.
+
+    Everything saved is deep copied, unless the 'share_results' option is
+    set in the configuration; then task results are stored by reference
+    (which avoids copying large results on every save, but requires that
+    results are not modified in place after they are saved).
+
+    By default everything saved is kept until it is destroyed; to bound how
+    much is kept the following retention options can be set:
+
+    * 'max_logbooks' -- when more logbooks are saved, the least recently
+      used ones (saved, fetched, or that had a flow or task detail of them
+      updated) are evicted.
+    * 'max_age' -- logbooks that have not been used for that many seconds
+      are evicted.
+    * 'evict_terminal' -- flow details are evicted (with their task details)
+      once their flow has reached the SUCCESS or REVERTED state, and so are
+      logbooks left without flow details (updating such a flow detail, for
+      example to run the flow again, fails as it is no longer found).
     """
     def __init__(self, conf):
         super(MemoryBackend, self).__init__(conf)
         self._log_books = {}
         self._flow_details = {}
         self._task_details = {}
+        self._share_results = misc.as_bool(
+            self._conf.get('share_results', False))
+        self._max_logbooks = self._conf.get('max_logbooks')
+        if self._max_logbooks is not None:
+            self._max_logbooks = max(1, int(self._max_logbooks))
+        self._max_age = self._conf.get('max_age')
+        if self._max_age is not None:
+            self._max_age = float(self._max_age)
+        self._evict_terminal = misc.as_bool(
+            self._conf.get('evict_terminal', False))
+        # Flow detail uuid => uuid of its logbook and task detail uuid =>
+        # uuid of its flow detail.
+        self._flow_books = {}
+        self._task_flows = {}
+        # Logbook uuid => (number, time) of its last use, and (logbook uuid,
+        # use number) tuples of all uses in the order they happened; tuples
+        # of uses that were not the last use of their logbook are skipped
+        # (and dropped) when looking for the least recently used logbook.
+        self._last_uses = {}
+        self._uses = collections.deque()
+        self._use_counter = itertools.count()
+        self._lock = threading.RLock()
+
+    @property
+    def share_results(self):
+        return self._share_results
 
     @property
     def log_books(self):
@@ -50,6 +102,100 @@ class MemoryBackend(base.Backend):
     def task_details(self):
         return self._task_details
 
+    @property
+    def evict_terminal(self):
+        return self._evict_terminal
+
+    def index_flow(self, book_uuid, flow_uuid):
+        """Records which logbook the flow detail belongs to."""
+        self._flow_books[flow_uuid] = book_uuid
+
+    def index_task(self, flow_uuid, task_uuid):
+        """Records which flow detail the task detail belongs to."""
+        self._task_flows[task_uuid] = flow_uuid
+
+    def use_logbook(self, book_uuid):
+        """Marks the logbook as (most recently) used and evicts logbooks that
+        are no longer retained.
+        """
+        with self._lock:
+            if book_uuid in self._log_books:
+                use = next(self._use_counter)
+                self._last_uses[book_uuid] = (use, misc.wallclock())
+                self._uses.append((book_uuid, use))
+                if len(self._uses) > 2 * len(self._last_uses) + 16:
+                    # Drop the tuples of uses that are no longer needed.
+                    self._uses = collections.deque(
+                        u for u in self._uses if not self._is_stale(u))
+            self.evict()
+
+    def use_flow(self, flow_uuid):
+        """Marks the logbook of the flow detail as (most recently) used."""
+        self.use_logbook(self._flow_books.get(flow_uuid))
+
+    def use_task(self, task_uuid):
+        """Marks the logbook of the task detail as (most recently) used."""
+        self.use_flow(self._task_flows.get(task_uuid))
+
+    def _is_stale(self, use):
+        book_uuid, number = use
+        last_use = self._last_uses.get(book_uuid)
+        return last_use is None or last_use[0] != number
+
+    def evict(self):
+        """Evicts the logbooks that are no longer retained."""
+        if self._max_age is None and self._max_logbooks is None:
+            return
+        if self._max_age is not None:
+            too_old = misc.wallclock() - self._max_age
+        while self._uses:
+            use = self._uses[0]
+            if self._is_stale(use):
+                self._uses.popleft()
+                continue
+            book_uuid = use[0]
+            if ((self._max_age is not None and
+                    self._last_uses[book_uuid][1] < too_old) or
+                    (self._max_logbooks is not None and
+                     len(self._log_books) > self._max_logbooks)):
+                self._uses.popleft()
+                self.forget_logbook(book_uuid)
+            else:
+                break
+
+    def forget_logbook(self, book_uuid):
+        """Removes the logbook (and its flow and task details)."""
+        with self._lock:
+            lb = self._log_books.pop(book_uuid)
+            self._last_uses.pop(book_uuid, None)
+            for fd in lb:
+                self._forget_flow_detail(fd.uuid)
+            return lb
+
+    def _forget_flow_detail(self, flow_uuid):
+        """Removes the flow detail (and its task details)."""
+        with self._lock:
+            fd = self._flow_details.pop(flow_uuid, None)
+            self._flow_books.pop(flow_uuid, None)
+            if fd is not None:
+                for td in fd:
+                    self._task_details.pop(td.uuid, None)
+                    self._task_flows.pop(td.uuid, None)
+
+    def evict_flow_detail(self, flow_uuid):
+        """Evicts the flow detail, and its logbook if that has no other
+        flow details.
+        """
+        with self._lock:
+            book_uuid = self._flow_books.get(flow_uuid)
+            self._forget_flow_detail(flow_uuid)
+            lb = self._log_books.get(book_uuid)
+            if lb is None:
+                return
+            lb.remove(flow_uuid)
+            if not len(lb):
+                self.forget_logbook(book_uuid)
+
     def get_connection(self):
         return Connection(self)
 
@@ -84,11 +230,7 @@ class Connection(base.Connection):
     def destroy_logbook(self, book_uuid):
         try:
             # Do the same cascading delete that the sql layer does.
-            lb = self.backend.log_books.pop(book_uuid)
-            for fd in lb:
-                self.backend.flow_details.pop(fd.uuid, None)
-                for td in fd:
-                    self.backend.task_details.pop(td.uuid, None)
+            self.backend.forget_logbook(book_uuid)
         except KeyError:
             raise exc.NotFound("No logbook found with id: %s" % book_uuid)
 
@@ -98,7 +240,14 @@ class Connection(base.Connection):
         except KeyError:
             raise exc.NotFound("No task details found with id: %s"
                                % task_detail.uuid)
-        return p_utils.task_details_merge(e_td, task_detail, deep_copy=True)
+        e_td = self._merge_task_details(e_td, task_detail)
+        self.backend.use_task(task_detail.uuid)
+        return e_td
+
+    def _merge_task_details(self, e_td, task_detail):
+        return p_utils.task_details_merge(
+            e_td, task_detail, deep_copy=True,
+            share_results=self.backend.share_results)
 
     def _save_flowdetail_tasks(self, e_fd, flow_detail):
         for task_detail in flow_detail:
@@ -109,7 +258,12 @@ class Connection(base.Connection):
                 e_fd.add(e_td)
             if task_detail.uuid not in self.backend.task_details:
                 self.backend.task_details[task_detail.uuid] = e_td
-            p_utils.task_details_merge(e_td, task_detail, deep_copy=True)
+                self.backend.index_task(e_fd.uuid, task_detail.uuid)
+            self._merge_task_details(e_td, task_detail)
+
+    def _maybe_evict_flow_detail(self, e_fd):
+        if self.backend.evict_terminal and e_fd.state in TERMINAL_STATES:
+            self.backend.evict_flow_detail(e_fd.uuid)
 
     def update_flow_details(self, flow_detail):
         try:
@@ -119,6 +273,8 @@ class Connection(base.Connection):
                                % flow_detail.uuid)
         p_utils.flow_details_merge(e_fd, flow_detail, deep_copy=True)
         self._save_flowdetail_tasks(e_fd, flow_detail)
+        self.backend.use_flow(flow_detail.uuid)
+        self._maybe_evict_flow_detail(e_fd)
         return e_fd
 
     def save_logbook(self, book):
@@ -146,17 +302,26 @@ class Connection(base.Connection):
                                           uuid=flow_detail.uuid)
                 e_lb.add(flow_detail)
                 self.backend.flow_details[flow_detail.uuid] = e_fd
+                self.backend.index_flow(e_lb.uuid, flow_detail.uuid)
             p_utils.flow_details_merge(e_fd, flow_detail, deep_copy=True)
             self._save_flowdetail_tasks(e_fd, flow_detail)
+        self.backend.use_logbook(e_lb.uuid)
+        for flow_detail in book:
+            e_fd = self.backend.flow_details.get(flow_detail.uuid)
+            if e_fd is not None:
+                self._maybe_evict_flow_detail(e_fd)
         return e_lb
 
     def get_logbook(self, book_uuid):
         try:
-            return self.backend.log_books[book_uuid]
+            lb = self.backend.log_books[book_uuid]
         except KeyError:
             raise exc.NotFound("No logbook found with id: %s" % book_uuid)
+        self.backend.use_logbook(book_uuid)
+        return lb
 
     def _get_logbooks(self):
+        self.backend.evict()
         return list(self.backend.log_books.values())
 
     def get_logbooks(self):
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+#    Copyright (C) 2014 Yahoo! Inc. All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import abc
+import errno
+import mmap
+import os
+import threading
+
+import six
+
+from taskflow import exceptions as exc
+from taskflow.utils import misc
+
+# NOTE: python 2.6 has no memoryviews.
+try:
+    _memoryview = memoryview
+except NameError:
+    _memoryview = None
+
+
+@six.add_metaclass(abc.ABCMeta)
+class BlobStore(object):
+    """Stores (large) binary blobs outside of the persistence backend.
+
+    Storage writes task results that are larger than some threshold to a blob
+    store and keeps only a reference to them in the task details, so that
+    those results do not have to be encoded (and copied) every time the task
+    details are saved.
+    """
+
+    @abc.abstractmethod
+    def put(self, key, data):
+        """Stores the given binary data under the given key (replacing any
+        data already stored under that key).
+        """
+
+    @abc.abstractmethod
+    def get(self, key):
+        """Gets the binary (or buffer) data stored under the given key."""
+
+    @abc.abstractmethod
+    def delete(self, key):
+        """Deletes the data stored under the given key (if any)."""
+
+
+class MemoryBlobStore(BlobStore):
+    """Blob store that keeps blobs in a in-memory dictionary."""
+
+    def __init__(self):
+        self._blobs = {}
+        self._lock = threading.Lock()
+
+    def put(self, key, data):
+        with self._lock:
+            self._blobs[key] = bytes(data)
+
+    def get(self, key):
+        with self._lock:
+            try:
+                return self._blobs[key]
+            except KeyError:
+                raise exc.NotFound("No blob found with key: %s" % key)
+
+    def delete(self, key):
+        with self._lock:
+            self._blobs.pop(key, None)
+
+
+class FileBlobStore(BlobStore):
+    """Blob store that writes each blob to a file in the given directory."""
+
+    def __init__(self, path):
+        self._path = os.path.abspath(path)
+        misc.ensure_tree(self._path)
+
+    def _get_path(self, key):
+        return os.path.join(self._path, key)
+
+    def put(self, key, data):
+        path = self._get_path(key)
+        tmp_path = "%s.tmp" % path
+        with open(tmp_path, 'wb') as fh:
+            fh.write(data)
+        # NOTE: renaming makes the new blob visible at once (readers never
+        # see a partially written blob).
+        os.rename(tmp_path, path)
+
+    def _open(self, key):
+        try:
+            return open(self._get_path(key), 'rb')
+        except IOError as e:
+            if e.errno == errno.ENOENT:
+                raise exc.NotFound("No blob found with key: %s" % key)
+            raise
+
+    def get(self, key):
+        with self._open(key) as fh:
+            return fh.read()
+
+    def delete(self, key):
+        try:
+            os.unlink(self._get_path(key))
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+
+
+class MmapBlobStore(FileBlobStore):
+    """Blob store that writes each blob to a file in the given directory and
+    reads them by memory-mapping those files.
+
+    Blobs are returned as read-only memoryviews of their mapped files, so
+    reading them does not copy their data (pages are loaded from the file
+    as they are accessed); on pythons where mapped files do not support
+    memoryviews their data is copied instead.
+    """
+
+    def get(self, key):
+        with self._open(key) as fh:
+            if not os.fstat(fh.fileno()).st_size:
+                # NOTE: empty files can not be mapped.
+                return b''
+            mapped = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        if _memoryview is not None:
+            try:
+                return _memoryview(mapped)
+            except TypeError:
+                # NOTE: mmap objects do not support memoryviews on python 2,
+                # so fall back to copying their data.
+                pass
+        return mapped[:]
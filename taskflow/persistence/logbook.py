@@ -60,6 +60,14 @@ class LogBook(object):
         """
         self._flowdetails_by_id[fd.uuid] = fd
 
+    def remove(self, flow_uuid):
+        """Removes the entry with the given uuid from the logbook, returning
+        it (or None if there was no such entry).
+
+        Does not *guarantee* that the removal will be immediately saved.
+        """
+        return self._flowdetails_by_id.pop(flow_uuid, None)
+
     def find(self, flow_uuid):
         return self._flowdetails_by_id.get(flow_uuid, None)
 
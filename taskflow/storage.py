@@ -17,10 +17,12 @@
 import abc
 import contextlib
 import logging
+import threading
 
 import six
 
 from taskflow import exceptions
+from taskflow.openstack.common import jsonutils
 from taskflow.openstack.common import uuidutils
 from taskflow.persistence import logbook
 from taskflow import states
@@ -31,6 +33,39 @@ from taskflow.utils import reflection
 LOG = logging.getLogger(__name__)
 STATES_WITH_RESULTS = (states.SUCCESS, states.REVERTING, states.FAILURE)
 
+# Checkpoint policies, which control when changes to task details are saved:
+#
+# - every_transition: on every change (the default), a resumed flow
+#   continues from the last state (or progress) any task has reached.
+# - terminal_only: when a task finishes (succeeds, fails, is reverted) or is
+#   reset, a resumed flow runs (or reverts) again the tasks which were
+#   running (or reverting) and any progress they made is lost.
+# - flow_boundaries: only when the flow changes state, a resumed flow
+#   continues from the task states as they were at the last flow state
+#   change (so most of the tasks that ran since then will be ran again,
+#   which is only safe if they are idempotent).
+CHECKPOINT_EVERY_TRANSITION = 'every_transition'
+CHECKPOINT_TERMINAL_ONLY = 'terminal_only'
+CHECKPOINT_FLOW_BOUNDARIES = 'flow_boundaries'
+CHECKPOINT_POLICIES = (CHECKPOINT_EVERY_TRANSITION, CHECKPOINT_TERMINAL_ONLY,
+                       CHECKPOINT_FLOW_BOUNDARIES)
+
+# Results larger than this (in bytes, once encoded) are written to the blob
+# store (if any) instead of being kept in the task details.
+DEFAULT_BLOB_THRESHOLD = 64 * 1024
+
+# Key of the dictionary that refers to a result in the blob store; results
+# that are dictionaries with that key themselves are kept (inline) escaped in
+# a dictionary with that key set to None.
+_BLOB_KEY = '__taskflow_blob__'
+
+# Types of results that are always small enough to be kept inline.
+_SMALL_TYPES = (bool, float, type(None)) + six.integer_types
+
+# Task states that are saved with the terminal_only checkpoint policy.
+_CHECKPOINT_STATES = (states.SUCCESS, states.FAILURE, states.REVERTED,
+                      states.PENDING)
+
 
 @six.add_metaclass(abc.ABCMeta)
 class Storage(object):
@@ -40,11 +75,48 @@ class Storage(object):
     associated activity and results to persistence layer (logbook,
     task_details, flow_details) for use by engines, making it easier to
     interact with the underlying storage & backend mechanism.
+
+    How often changes to task details are saved is controlled by the given
+    checkpoint policy (see CHECKPOINT_POLICIES); the flow detail is always
+    saved when it changes (with all task details that changed but were not
+    saved yet).
+
+    If a blob store (see taskflow.persistence.blob_store) is given results
+    that are larger than the given threshold are written to it and only
+    a reference to them is kept in the task details. Binary results are
+    stored as is and are read back from the blob store whenever they are
+    fetched (and may be read back as memoryviews, depending on the blob
+    store); other results are stored JSON encoded and are read back as they
+    would be after being reloaded from a persistence backend. They are
+    decoded straight from what the blob store returns (without copying it)
+    and the decoded result is kept until the result changes, so that it is
+    not read and decoded again each time it is fetched. Note that on python
+    2.x mapped files can not be viewed, so blobs read from a memory mapping
+    blob store are copied.
+
+    Changes to a single task are made while holding the read lock and a lock
+    of that task only; changes to the structure of the storage (adding tasks,
+    injecting values, changing the flow state) hold the write lock instead.
+    A copy of what changed is taken while holding those locks, and the
+    copies are saved after they have been released (holding the save lock
+    only, as backends are not required to support concurrent writes), so
+    that reading from (and changing) storage never waits for any saving to
+    finish.
     """
 
     injector_name = '_TaskFlow_INJECTOR'
 
-    def __init__(self, flow_detail, backend=None):
+    def __init__(self, flow_detail, backend=None,
+                 checkpoint=CHECKPOINT_EVERY_TRANSITION, blob_store=None,
+                 blob_threshold=DEFAULT_BLOB_THRESHOLD):
+        if checkpoint not in CHECKPOINT_POLICIES:
+            raise ValueError("Unknown checkpoint policy: %s" % checkpoint)
+        self._checkpoint = checkpoint
+        self._blob_store = blob_store
+        self._blob_threshold = blob_threshold
+        # Blob key => (blob reference, decoded result) of the JSON encoded
+        # results that were read from the blob store.
+        self._blob_cache = {}
         self._result_mappings = {}
         self._reverse_mapping = {}
         self._backend = backend
@@ -60,13 +132,36 @@ class Storage(object):
 
         self._task_name_to_uuid = dict((td.name, td.uuid)
                                        for td in self._flowdetail)
+        # Task name => lock held while changing that task, the lock held
+        # while saving changes and the lock protecting the changes that are
+        # still to be saved.
+        self._task_locks = dict((td.name, self._task_lock_cls())
+                                for td in self._flowdetail)
+        self._save_lock = self._task_lock_cls()
+        self._changes_lock = self._task_lock_cls()
+
+        # Number of (nested) batches that are active, copies of the task
+        # details (by uuid) and of the flow detail (with the task details
+        # that were added to it) that changed and are still to be saved; task
+        # details that were changed but not saved (as the checkpoint policy
+        # did not require it) are saved with the flow detail. The flow detail
+        # as it was last copied is what changed task details are saved with
+        # when the flow detail itself did not change.
+        self._batch_depth = 0
+        self._batched_tasks = {}
+        self._batched_flow = None
+        self._unsaved_tasks = {}
+        self._flow_copy = self._copy_flow_detail(self._flowdetail)
+
+        # Callbacks called when the state of a task changes.
+        self._state_watchers = []
 
         try:
             injector_td = self._taskdetail_by_name(self.injector_name)
         except exceptions.NotFound:
             pass
         else:
-            names = six.iterkeys(injector_td.results)
+            names = six.iterkeys(self._unescape(injector_td.results))
             self._set_result_mapping(injector_td.name,
                                      dict((name, name) for name in names))
 
@@ -77,6 +172,24 @@ class Storage(object):
         mutating operations.
         """
 
+    @abc.abstractproperty
+    def _task_lock_cls(self):
+        """Lock class used to generate the (reentrant) locks protecting the
+        changes made to each task.
+        """
+
+    @contextlib.contextmanager
+    def _changing_task(self, task_name):
+        """Locks the given task for changing it, yielding its task detail.
+
+        The changes are saved once the locks have been released.
+        """
+        with self._lock.read_lock():
+            td = self._taskdetail_by_name(task_name)
+            with self._task_locks[task_name]:
+                yield td
+        self._flush()
+
     def _with_connection(self, functor, *args, **kwargs):
         # NOTE(harlowja): Activate the given function with a backend
         # connection, if a backend is provided in the first place, otherwise
@@ -88,6 +201,132 @@ class Storage(object):
         with contextlib.closing(self._backend.get_connection()) as conn:
             functor(conn, *args, **kwargs)
 
+    @contextlib.contextmanager
+    def batch(self):
+        """Context manager that coalesces the saving of changes.
+
+        While a batch is active changed task and flow details are not saved
+        to the backend right away; the ones that changed are all saved (in a
+        single backend call, so in a single backend transaction) when the
+        outermost batch ends.
+        """
+        with self._changes_lock:
+            self._batch_depth += 1
+        try:
+            yield
+        finally:
+            with self._changes_lock:
+                self._batch_depth -= 1
+            self._flush()
+
+    def _take_changes(self):
+        """Takes the flow detail to save (with the task details that
+        changed), unless a batch is active or nothing changed.
+        """
+        with self._changes_lock:
+            if self._batch_depth:
+                return None
+            if not self._batched_tasks and self._batched_flow is None:
+                return None
+            flow_detail = self._batched_flow
+            if flow_detail is None:
+                flow_detail = self._copy_flow_detail(self._flow_copy)
+            for td in six.itervalues(self._batched_tasks):
+                flow_detail.add(td)
+            self._batched_tasks = {}
+            self._batched_flow = None
+            return flow_detail
+
+    def _flush(self):
+        """Saves the changes made (unless a batch is active).
+
+        Must be called without holding the storage lock (or any task lock);
+        changes are saved in the order they were made, as they are taken
+        while holding the save lock.
+        """
+        with self._changes_lock:
+            if self._batch_depth:
+                return
+            if not self._batched_tasks and self._batched_flow is None:
+                return
+        with self._save_lock:
+            flow_detail = self._take_changes()
+            if flow_detail is not None:
+                self._with_connection(self._save_batch, flow_detail)
+
+    def _save_batch(self, conn, flow_detail):
+        # NOTE: the flow detail and the task details it has are copies (see
+        # _save_task and _save_flow), so what the backend returns is not
+        # merged back into the storage flow and task details.
+        conn.update_flow_details(flow_detail)
+
+    @staticmethod
+    def _copy_task_detail(task_detail):
+        """Copies the task detail, so that it can be saved while it changes.
+
+        Task results are replaced (never changed in place) so they are not
+        copied, the metadata is (as it is updated in place).
+        """
+        td = logbook.TaskDetail(task_detail.name, task_detail.uuid)
+        td.update(task_detail)
+        if td.meta:
+            td.meta = dict(td.meta)
+        return td
+
+    @staticmethod
+    def _copy_flow_detail(flow_detail):
+        """Copies the flow detail (without any of its task details)."""
+        fd = logbook.FlowDetail(flow_detail.name, flow_detail.uuid)
+        fd.state = flow_detail.state
+        fd.meta = flow_detail.meta
+        return fd
+
+    def _should_checkpoint(self, task_detail):
+        if self._checkpoint == CHECKPOINT_EVERY_TRANSITION:
+            return True
+        if task_detail.name == self.injector_name:
+            # NOTE: injected values are not recreated when the flow is
+            # resumed, so they are always saved.
+            return True
+        if self._checkpoint == CHECKPOINT_TERMINAL_ONLY:
+            return task_detail.state in _CHECKPOINT_STATES
+        return False
+
+    def _save_task(self, task_detail):
+        """Takes a copy of the changed task detail, for it to be saved.
+
+        Must be called while holding the lock of the task (or the write
+        lock), the copy is saved by the next call to _flush.
+        """
+        with self._changes_lock:
+            if not self._should_checkpoint(task_detail):
+                self._unsaved_tasks[task_detail.uuid] = task_detail
+                return
+            self._unsaved_tasks.pop(task_detail.uuid, None)
+            self._batched_tasks[task_detail.uuid] = \
+                self._copy_task_detail(task_detail)
+
+    def _save_flow(self, added_task=None):
+        """Takes a copy of the changed flow detail, for it to be saved.
+
+        Must be called while holding the write lock, the copy is saved (with
+        the task details that changed but were not saved yet, and the given
+        task detail that was added to the flow) by the next call to _flush.
+        """
+        with self._changes_lock:
+            self._flow_copy = self._copy_flow_detail(self._flowdetail)
+            flow_detail = self._copy_flow_detail(self._flow_copy)
+            if self._batched_flow is not None:
+                for td in self._batched_flow:
+                    flow_detail.add(td)
+            if added_task is not None:
+                flow_detail.add(self._copy_task_detail(added_task))
+            else:
+                for td in six.itervalues(self._unsaved_tasks):
+                    self._batched_tasks[td.uuid] = self._copy_task_detail(td)
+                self._unsaved_tasks = {}
+            self._batched_flow = flow_detail
+
     def ensure_task(self, task_name, task_version=None, result_mapping=None):
         """Ensure that there is taskdetail that correspond the task.
 
@@ -105,6 +344,7 @@ class Storage(object):
                 task_id = uuidutils.generate_uuid()
                 self._add_task(task_id, task_name, task_version)
             self._set_result_mapping(task_name, result_mapping)
+        self._flush()
         return task_id
 
     def _add_task(self, uuid, task_name, task_version=None):
@@ -113,19 +353,14 @@ class Storage(object):
         Task becomes known to storage by that name and uuid.
         Task state is set to PENDING.
         """
-
-        def save_both(conn, td):
-            """Saves the flow and the task detail with the same connection."""
-            self._save_flow_detail(conn)
-            self._save_task_detail(conn, td)
-
         # TODO(imelnikov): check that task with same uuid or
         # task name does not exist.
         td = logbook.TaskDetail(name=task_name, uuid=uuid)
         td.state = states.PENDING
         td.version = task_version
         self._flowdetail.add(td)
-        self._with_connection(save_both, td)
+        self._save_flow(added_task=td)
+        self._task_locks[task_name] = self._task_lock_cls()
         self._task_name_to_uuid[task_name] = uuid
 
     @property
@@ -138,23 +373,26 @@ class Storage(object):
         # This never changes (so no read locking needed).
         return self._flowdetail.uuid
 
-    def _save_flow_detail(self, conn):
-        # NOTE(harlowja): we need to update our contained flow detail if
-        # the result of the update actually added more (aka another process
-        # added item to the flow detail).
-        self._flowdetail.update(conn.update_flow_details(self._flowdetail))
-
     def _taskdetail_by_name(self, task_name):
         try:
             return self._flowdetail.find(self._task_name_to_uuid[task_name])
         except KeyError:
             raise exceptions.NotFound("Unknown task name: %s" % task_name)
 
-    def _save_task_detail(self, conn, task_detail):
-        # NOTE(harlowja): we need to update our contained task detail if
-        # the result of the update actually added more (aka another process
-        # is also modifying the task detail).
-        task_detail.update(conn.update_task_details(task_detail))
+    def add_state_watcher(self, callback):
+        """Registers a callback to be called with the task name and the new
+        state whenever the state of a task changes.
+
+        The callback is called while the storage (and the task) are locked,
+        so that it sees the changes of a task in the order they are made; it
+        should be quick and must not call back into storage.
+        """
+        with self._lock.write_lock():
+            self._state_watchers.append(callback)
+
+    def _notify_state_watchers(self, task_detail):
+        for callback in self._state_watchers:
+            callback(task_detail.name, task_detail.state)
 
     def get_task_uuid(self, task_name):
         """Get task uuid by given name."""
@@ -164,10 +402,10 @@ class Storage(object):
 
     def set_task_state(self, task_name, state):
         """Set task state."""
-        with self._lock.write_lock():
-            td = self._taskdetail_by_name(task_name)
+        with self._changing_task(task_name) as td:
             td.state = state
-            self._with_connection(self._save_task_detail, td)
+            self._notify_state_watchers(td)
+            self._save_task(td)
 
     def get_task_state(self, task_name):
         """Get state of task with given name."""
@@ -181,16 +419,21 @@ class Storage(object):
             return dict((name, self.get_task_state(name))
                         for name in task_names)
 
+    def get_task_metadata(self, task_name):
+        """Gets a copy of a tasks metadata."""
+        with self._lock.read_lock():
+            td = self._taskdetail_by_name(task_name)
+            return dict(td.meta or {})
+
     def update_task_metadata(self, task_name, update_with):
         """Updates a tasks metadata."""
         if not update_with:
             return
-        with self._lock.write_lock():
-            td = self._taskdetail_by_name(task_name)
+        with self._changing_task(task_name) as td:
             if not td.meta:
                 td.meta = {}
             td.meta.update(update_with)
-            self._with_connection(self._save_task_detail, td)
+            self._save_task(td)
 
     def set_task_progress(self, task_name, progress, details=None):
         """Set task progress.
@@ -259,18 +502,110 @@ class Storage(object):
 
     def save(self, task_name, data, state=states.SUCCESS):
         """Put result for task with id 'uuid' to storage."""
-        with self._lock.write_lock():
-            td = self._taskdetail_by_name(task_name)
-            td.state = state
+        with self._changing_task(task_name) as td:
+            # NOTE: the state is changed last, so that readers (which do not
+            # take the task lock) never see the new state with old results.
             if state == states.FAILURE and isinstance(data, misc.Failure):
+                self._delete_blob(td)
                 td.results = None
                 td.failure = data
                 self._failures[td.name] = data
             else:
-                td.results = data
-                td.failure = None
                 self._check_all_results_provided(td.name, data)
-            self._with_connection(self._save_task_detail, td)
+                self._delete_blob(td)
+                td.results = self._to_blob(td, data)
+                td.failure = None
+            td.state = state
+            self._notify_state_watchers(td)
+            self._save_task(td)
+
+    @staticmethod
+    def _get_blob_ref(results):
+        if (isinstance(results, dict) and
+                results.get(_BLOB_KEY) is not None):
+            return results
+        return None
+
+    def _is_small(self, data):
+        """Checks (without encoding it) if the data is obviously small."""
+        if isinstance(data, _SMALL_TYPES):
+            return True
+        if isinstance(data, six.text_type):
+            # NOTE: a JSON encoded character takes at most 12 bytes (a
+            # escaped surrogate pair).
+            return len(data) * 12 + 2 <= self._blob_threshold
+        return False
+
+    def _to_blob(self, td, data):
+        """Writes the data to the blob store if it is large enough, returning
+        the reference to it (or the data itself otherwise).
+        """
+        if self._blob_store is not None and not self._is_small(data):
+            if isinstance(data, (six.binary_type, bytearray)):
+                encoding = 'binary'
+                raw_data = data
+            else:
+                encoding = 'json'
+                try:
+                    raw_data = misc.binary_encode(jsonutils.dumps(data))
+                except (TypeError, ValueError):
+                    raw_data = None
+            if raw_data is not None and len(raw_data) > self._blob_threshold:
+                self._blob_store.put(td.uuid, raw_data)
+                return {_BLOB_KEY: td.uuid, 'encoding': encoding}
+        return self._escape(data)
+
+    @staticmethod
+    def _escape(data):
+        """Escapes data that would be mistaken for a blob reference."""
+        if isinstance(data, dict) and _BLOB_KEY in data:
+            return {_BLOB_KEY: None, 'value': data}
+        return data
+
+    @staticmethod
+    def _unescape(results):
+        """Unescapes results that are not a blob reference."""
+        if isinstance(results, dict) and _BLOB_KEY in results:
+            return results['value']
+        return results
+
+    def _from_blob(self, results):
+        ref = self._get_blob_ref(results)
+        if ref is None:
+            return self._unescape(results)
+        if self._blob_store is None:
+            raise exceptions.StorageError("Result is in a blob store but no"
+                                          " blob store was provided")
+        key = ref[_BLOB_KEY]
+        # NOTE: a new reference is made each time a result is written to the
+        # blob store, so a decoded result is only used while the task still
+        # refers to the blob it was read from.
+        cached = self._blob_cache.get(key)
+        if cached is not None and cached[0] is ref:
+            return cached[1]
+        raw_data = self._blob_store.get(key)
+        if ref['encoding'] == 'binary':
+            return raw_data
+        result = misc.decode_json(self._decode_text(raw_data), root_types=())
+        self._blob_cache[key] = (ref, result)
+        return result
+
+    @staticmethod
+    def _decode_text(raw_data):
+        """Decodes the UTF-8 encoded raw data, reading it straight from the
+        given buffer (like a memoryview) where possible.
+        """
+        try:
+            return six.text_type(raw_data, 'utf-8')
+        except TypeError:
+            # NOTE: memoryviews can not be decoded directly on python 2.x.
+            return raw_data.tobytes().decode('utf-8')
+
+    def _delete_blob(self, td):
+        ref = self._get_blob_ref(td.results)
+        if ref is not None and self._blob_store is not None:
+            self._blob_cache.pop(ref[_BLOB_KEY], None)
+            self._blob_store.delete(ref[_BLOB_KEY])
 
     def get(self, task_name):
         """Get result for task with name 'task_name' to storage."""
@@ -284,7 +619,7 @@ class Storage(object):
             if td.state not in STATES_WITH_RESULTS:
                 raise exceptions.NotFound("Result for task %s is not known"
                                           % task_name)
-            return td.results
+            return self._from_blob(td.results)
 
     def get_failures(self):
         """Get list of failures that happened with this flow.
@@ -304,35 +639,39 @@ class Storage(object):
             return False
         if td.state == state:
             return False
+        # NOTE: the state is changed first, so that readers (which may not
+        # take the task lock) never see the old state without its results.
+        td.state = state
+        self._delete_blob(td)
         td.results = None
         td.failure = None
-        td.state = state
         self._failures.pop(td.name, None)
         return True
 
     def reset(self, task_name, state=states.PENDING):
         """Remove result for task with id 'uuid' from storage."""
-        with self._lock.write_lock():
-            td = self._taskdetail_by_name(task_name)
+        with self._changing_task(task_name) as td:
             if self._reset_task(td, state):
-                self._with_connection(self._save_task_detail, td)
+                self._notify_state_watchers(td)
+                self._save_task(td)
 
-    def reset_tasks(self):
+    def reset_tasks(self, keep_states=()):
         """Reset all tasks to PENDING state, removing results.
 
+        Tasks that are in one of the given keep states are left as they are.
+
         Returns list of (name, uuid) tuples for all tasks that were reset.
         """
         reset_results = []
-
-        def do_reset_all(connection):
+        with self._lock.write_lock():
             for td in self._flowdetail:
+                if td.state in keep_states:
+                    continue
                 if self._reset_task(td, states.PENDING):
-                    self._save_task_detail(connection, td)
+                    self._notify_state_watchers(td)
+                    self._save_task(td)
                     reset_results.append((td.name, td.uuid))
-
-        with self._lock.write_lock():
-            self._with_connection(do_reset_all)
-
+        self._flush()
         return reset_results
 
     def inject(self, pairs):
@@ -347,14 +686,19 @@ class Storage(object):
             except exceptions.NotFound:
                 self._add_task(uuidutils.generate_uuid(), self.injector_name)
                 td = self._taskdetail_by_name(self.injector_name)
-                td.results = dict(pairs)
+                results = dict(pairs)
                 td.state = states.SUCCESS
             else:
-                td.results.update(pairs)
-            self._with_connection(self._save_task_detail, td)
-            names = six.iterkeys(td.results)
+                # NOTE: results are never changed in place (saved copies of
+                # the task detail and backends may share them).
+                results = dict(self._unescape(td.results))
+                results.update(pairs)
+            td.results = self._escape(results)
+            self._save_task(td)
+            names = six.iterkeys(results)
             self._set_result_mapping(self.injector_name,
                                      dict((name, name) for name in names))
+        self._flush()
 
     def _set_result_mapping(self, task_name, mapping):
         """Set mapping for naming task results.
@@ -426,7 +770,8 @@ class Storage(object):
         """Set flow details state and save it."""
         with self._lock.write_lock():
             self._flowdetail.state = state
-            self._with_connection(self._save_flow_detail)
+            self._save_flow()
+        self._flush()
 
     def get_flow_state(self):
         """Get state from flow details."""
@@ -440,8 +785,10 @@ class Storage(object):
 class MultiThreadedStorage(Storage):
     """Storage that uses locks to protect against concurrent access."""
     _lock_cls = lock_utils.ReaderWriterLock
+    _task_lock_cls = threading.RLock
 
 
 class SingleThreadedStorage(Storage):
     """Storage that uses dummy locks when you really don't need locks."""
     _lock_cls = lock_utils.DummyReaderWriterLock
+    _task_lock_cls = lock_utils.DummyLock
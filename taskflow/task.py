@@ -19,21 +19,82 @@ import abc
 import collections
 import contextlib
 import logging
+import math
 
 import six
 
 from taskflow import atom
+from taskflow.utils import misc
 from taskflow.utils import reflection
 
 LOG = logging.getLogger(__name__)
 
 
+class RetryPolicy(object):
+    """Policy for retrying a failed task (before the flow is reverted).
+
+    A task that fails with one of the retryable exception types (matched
+    using `Failure.check`, so types or type names can be given) is ran again
+    up to `count` times. Retries are delayed by a exponential backoff (see
+    `misc.ExponentialBackoff`) of `delay` seconds times `exponent` to the
+    power of the number of earlier retries, but never more than
+    `max_backoff` seconds; engines keep running the other tasks that are
+    ready while a task waits to be retried.
+    """
+
+    def __init__(self, count, retry_on=(Exception,), delay=1.0, exponent=2,
+                 max_backoff=3600):
+        self.count = max(0, int(count))
+        self.retry_on = tuple(retry_on)
+        self.delay = delay
+        self.exponent = exponent
+        self.max_backoff = max_backoff
+        self._delays = []
+        if self.count:
+            # NOTE: the backoff is scaled by the delay, so its own limit is
+            # scaled the other way (and the scaled delays are limited again).
+            limit = max_backoff
+            if delay > 0:
+                limit = math.ceil(float(max_backoff) / delay)
+            backoff = misc.ExponentialBackoff(self.count, exponent, limit)
+            self._delays = [min(b * delay, max_backoff) for b in backoff]
+
+    def get_delay(self, failure, attempt):
+        """Returns how long (in seconds) to wait before retrying the task
+        that failed with the given failure after the given number of
+        (earlier) retries, or None if it should not be retried.
+        """
+        if attempt >= len(self._delays):
+            return None
+        if not failure.check(*self.retry_on):
+            return None
+        return self._delays[attempt]
+
+
 @six.add_metaclass(abc.ABCMeta)
 class BaseTask(atom.Atom):
     """An abstraction that defines a potential piece of work that can be
     applied and can be reverted to undo the work as a single task.
     """
-    TASK_EVENTS = ('update_progress', )
+    # Events that handlers can be bound to; 'started' is triggered (by the
+    # engines that run tasks in the engines own process) right before the
+    # task starts executing or reverting.
+    TASK_EVENTS = ('update_progress', 'started')
+
+    # Estimated cost of running this task (for example its expected duration
+    # in seconds), used by engines to decide which ready tasks to run first.
+    # When not set the duration recorded for the task in a previous run is
+    # used (if any).
+    cost = None
+
+    # Names of (rate limited) resources this task uses, engines that are
+    # configured with resource limits will not run more tasks using the same
+    # resource at once than allowed by the limit for that resource.
+    resources = ()
+
+    # Retry policy (see `RetryPolicy`) of this task, when not set the flow is
+    # reverted as soon as this task fails.
+    retry = None
 
     def __init__(self, name, provides=None):
         if name is None:
@@ -42,6 +103,14 @@ class BaseTask(atom.Atom):
         # Map of events => lists of callbacks to invoke on task events.
         self._events_listeners = collections.defaultdict(list)
 
+    def __getstate__(self):
+        # Event listeners are only valid in the process that bound them, so
+        # they are not carried along when a task is pickled (for example to
+        # be ran in another process).
+        state = self.__dict__.copy()
+        state['_events_listeners'] = collections.defaultdict(list)
+        return state
+
     @abc.abstractmethod
     def execute(self, *args, **kwargs):
         """Activate a given task which will perform some operation and return.
@@ -19,6 +19,7 @@ import contextlib
 from taskflow import exceptions as exc
 from taskflow.openstack.common import uuidutils
 from taskflow.persistence import logbook
+from taskflow import states
 from taskflow.utils import misc
 
 
@@ -134,6 +135,30 @@ class PersistenceTestMixin(object):
         td2 = fd2.find(td.uuid)
         self.assertEqual(td2.meta.get('test'), 43)
 
+    def test_flow_detail_update_saves_task_details(self):
+        lb_id = uuidutils.generate_uuid()
+        lb_name = 'lb-%s' % (lb_id)
+        lb = logbook.LogBook(name=lb_name, uuid=lb_id)
+        fd = logbook.FlowDetail('test', uuid=uuidutils.generate_uuid())
+        lb.add(fd)
+        td = logbook.TaskDetail("detail-1", uuid=uuidutils.generate_uuid())
+        fd.add(td)
+
+        with contextlib.closing(self._get_connection()) as conn:
+            conn.save_logbook(lb)
+            conn.update_flow_details(fd)
+
+        td.state = states.RUNNING
+        with contextlib.closing(self._get_connection()) as conn:
+            fd.update(conn.update_flow_details(fd))
+        self.assertEqual(states.RUNNING, fd.find(td.uuid).state)
+
+        with contextlib.closing(self._get_connection()) as conn:
+            lb2 = conn.get_logbook(lb_id)
+        fd2 = lb2.find(fd.uuid)
+        td2 = fd2.find(td.uuid)
+        self.assertEqual(states.RUNNING, td2.state)
+
     def test_task_detail_with_failure(self):
         lb_id = uuidutils.generate_uuid()
         lb_name = 'lb-%s' % (lb_id)
@@ -164,6 +189,34 @@ class PersistenceTestMixin(object):
         self.assertIs(failure.check(RuntimeError), RuntimeError)
         self.assertEqual(failure.traceback_str, td.failure.traceback_str)
 
+    def test_task_detail_failure_cleared(self):
+        lb_id = uuidutils.generate_uuid()
+        lb_name = 'lb-%s' % (lb_id)
+        lb = logbook.LogBook(name=lb_name, uuid=lb_id)
+        fd = logbook.FlowDetail('test', uuid=uuidutils.generate_uuid())
+        lb.add(fd)
+        td = logbook.TaskDetail("detail-1", uuid=uuidutils.generate_uuid())
+
+        try:
+            raise RuntimeError('Woot!')
+        except Exception:
+            td.failure = misc.Failure()
+
+        fd.add(td)
+
+        with contextlib.closing(self._get_connection()) as conn:
+            conn.save_logbook(lb)
+            conn.update_flow_details(fd)
+            conn.update_task_details(td)
+
+        # Clear the failure using another (copied) task detail object.
+        td2 = logbook.TaskDetail("detail-1", uuid=td.uuid)
+        td2.state = states.REVERTED
+        with contextlib.closing(self._get_connection()) as conn:
+            td3 = conn.update_task_details(td2)
+        self.assertIsNone(td3.failure)
+        self.assertEqual(states.REVERTED, td3.state)
+
     def test_logbook_merge_flow_detail(self):
         lb_id = uuidutils.generate_uuid()
         lb_name = 'lb-%s' % (lb_id)
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+#    Copyright (C) 2014 Yahoo! Inc. All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import shutil
+import tempfile
+
+import mock
+
+from taskflow import exceptions as exc
+from taskflow.persistence import blob_store
+from taskflow import test
+
+
+class BlobStoreTestMixin(object):
+
+    def _get_blob_store(self):
+        raise NotImplementedError()
+
+    def test_put_get_delete(self):
+        store = self._get_blob_store()
+        store.put('a', b'abc')
+        self.assertEqual(b'abc', bytes(store.get('a')))
+        store.put('a', b'def')
+        self.assertEqual(b'def', bytes(store.get('a')))
+        store.delete('a')
+        self.assertRaises(exc.NotFound, store.get, 'a')
+
+    def test_delete_missing(self):
+        store = self._get_blob_store()
+        store.delete('a')
+        self.assertRaises(exc.NotFound, store.get, 'a')
+
+    def test_empty_blob(self):
+        store = self._get_blob_store()
+        store.put('a', b'')
+        self.assertEqual(b'', bytes(store.get('a')))
+
+
+class MemoryBlobStoreTest(test.TestCase, BlobStoreTestMixin):
+    def _get_blob_store(self):
+        return blob_store.MemoryBlobStore()
+
+
+class FileBlobStoreTest(test.TestCase, BlobStoreTestMixin):
+    _blob_store_cls = blob_store.FileBlobStore
+
+    def setUp(self):
+        super(FileBlobStoreTest, self).setUp()
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+
+    def _get_blob_store(self):
+        return self._blob_store_cls(self.path)
+
+
+class MmapBlobStoreTest(FileBlobStoreTest):
+    _blob_store_cls = blob_store.MmapBlobStore
+
+    def test_get_without_memoryview(self):
+        store = self._get_blob_store()
+        store.put('a', b'abc')
+        with mock.patch.object(blob_store, '_memoryview', None):
+            self.assertEqual(b'abc', store.get('a'))
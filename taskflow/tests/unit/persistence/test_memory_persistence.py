@@ -16,8 +16,14 @@
 
 import contextlib
 
+import mock
+
+from taskflow import exceptions as exc
+from taskflow.openstack.common import uuidutils
 from taskflow.persistence import backends
 from taskflow.persistence.backends import impl_memory
+from taskflow.persistence import logbook
+from taskflow import states
 from taskflow import test
 from taskflow.tests.unit.persistence import base
 
@@ -40,3 +46,109 @@ class MemoryPersistenceTest(test.TestCase, base.PersistenceTestMixin):
         conf = {'connection': 'memory:'}
         with contextlib.closing(backends.fetch(conf)) as be:
             self.assertIsInstance(be, impl_memory.MemoryBackend)
+
+    def _save_task_with_results(self, backend, results):
+        lb = logbook.LogBook(name='lb', uuid=uuidutils.generate_uuid())
+        fd = logbook.FlowDetail('test', uuid=uuidutils.generate_uuid())
+        lb.add(fd)
+        td = logbook.TaskDetail("detail-1", uuid=uuidutils.generate_uuid())
+        fd.add(td)
+        with contextlib.closing(backend.get_connection()) as conn:
+            conn.save_logbook(lb)
+            td.results = results
+            conn.update_task_details(td)
+        return backend.task_details[td.uuid]
+
+    def test_results_copied(self):
+        results = {'a': [1, 2, 3]}
+        td = self._save_task_with_results(self._backend, results)
+        self.assertEqual(results, td.results)
+        self.assertIsNot(results, td.results)
+
+    def test_results_shared(self):
+        backend = impl_memory.MemoryBackend({'share_results': 'true'})
+        results = {'a': [1, 2, 3]}
+        td = self._save_task_with_results(backend, results)
+        self.assertIs(results, td.results)
+
+    def _save_logbook(self, backend, flow_state=None):
+        lb = logbook.LogBook(name='lb', uuid=uuidutils.generate_uuid())
+        fd = logbook.FlowDetail('test', uuid=uuidutils.generate_uuid())
+        fd.state = flow_state
+        lb.add(fd)
+        td = logbook.TaskDetail("detail-1", uuid=uuidutils.generate_uuid())
+        fd.add(td)
+        with contextlib.closing(backend.get_connection()) as conn:
+            conn.save_logbook(lb)
+        return lb, fd, td
+
+    def _assert_forgotten(self, backend, lb, fd, td):
+        self.assertNotIn(lb.uuid, backend.log_books)
+        self.assertNotIn(fd.uuid, backend.flow_details)
+        self.assertNotIn(td.uuid, backend.task_details)
+
+    def test_max_logbooks(self):
+        backend = impl_memory.MemoryBackend({'max_logbooks': 2})
+        first = self._save_logbook(backend)
+        second = self._save_logbook(backend)
+        with contextlib.closing(backend.get_connection()) as conn:
+            # Makes the first logbook the most recently used one.
+            conn.get_logbook(first[0].uuid)
+        third = self._save_logbook(backend)
+        self._assert_forgotten(backend, *second)
+        for lb, fd, td in (first, third):
+            self.assertIn(lb.uuid, backend.log_books)
+            self.assertIn(fd.uuid, backend.flow_details)
+            self.assertIn(td.uuid, backend.task_details)
+
+    def test_max_logbooks_many_uses(self):
+        backend = impl_memory.MemoryBackend({'max_logbooks': 3})
+        books = [self._save_logbook(backend) for _i in range(0, 10)]
+        with contextlib.closing(backend.get_connection()) as conn:
+            for _i in range(0, 100):
+                conn.update_task_details(books[-1][2])
+        self.assertEqual(3, len(backend.log_books))
+        self.assertEqual(3, len(backend.flow_details))
+        self.assertEqual(3, len(backend.task_details))
+        # Uses that are no longer needed should have been dropped.
+        self.assertTrue(len(backend._uses) < 100)
+        for book in books[0:7]:
+            self._assert_forgotten(backend, *book)
+
+    def test_max_age(self):
+        backend = impl_memory.MemoryBackend({'max_age': 10})
+        with mock.patch('taskflow.utils.misc.wallclock', return_value=0):
+            old = self._save_logbook(backend)
+            used = self._save_logbook(backend)
+        with mock.patch('taskflow.utils.misc.wallclock', return_value=5):
+            with contextlib.closing(backend.get_connection()) as conn:
+                conn.update_task_details(used[2])
+        with mock.patch('taskflow.utils.misc.wallclock', return_value=11):
+            with contextlib.closing(backend.get_connection()) as conn:
+                self.assertEqual([used[0].uuid],
+                                 [lb.uuid for lb in conn.get_logbooks()])
+        self._assert_forgotten(backend, *old)
+
+    def test_evict_terminal(self):
+        backend = impl_memory.MemoryBackend({'evict_terminal': True})
+        lb, fd, td = self._save_logbook(backend, flow_state=states.RUNNING)
+        self.assertIn(fd.uuid, backend.flow_details)
+        fd.state = states.SUCCESS
+        with contextlib.closing(backend.get_connection()) as conn:
+            conn.update_flow_details(fd)
+            self._assert_forgotten(backend, lb, fd, td)
+            self.assertRaises(exc.NotFound, conn.update_flow_details, fd)
+            self.assertRaises(exc.NotFound, conn.update_task_details, td)
+
+    def test_evict_terminal_keeps_other_flows(self):
+        backend = impl_memory.MemoryBackend({'evict_terminal': True})
+        lb, fd, td = self._save_logbook(backend, flow_state=states.RUNNING)
+        fd2 = logbook.FlowDetail('test-2', uuid=uuidutils.generate_uuid())
+        fd2.state = states.REVERTED
+        lb.add(fd2)
+        with contextlib.closing(backend.get_connection()) as conn:
+            conn.save_logbook(lb)
+            self.assertNotIn(fd2.uuid, backend.flow_details)
+            self.assertEqual([fd.uuid],
+                             [f.uuid for f in conn.get_logbook(lb.uuid)])
+            self.assertIn(td.uuid, backend.task_details)
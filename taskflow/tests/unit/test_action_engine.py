@@ -16,6 +16,8 @@
 
 import contextlib
 import networkx
+import shutil
+import tempfile
 import testtools
 import threading
 
@@ -31,15 +33,19 @@ from taskflow.engines.action_engine import engine as eng
 from taskflow.engines.worker_based import engine as w_eng
 from taskflow.engines.worker_based import worker as wkr
 from taskflow import exceptions as exc
+from taskflow.persistence.backends import impl_dir
 from taskflow.persistence import logbook
 from taskflow import states
 from taskflow import task
 from taskflow import test
 from taskflow.tests import utils
 
+from taskflow.utils import asyncio_utils as au
 from taskflow.utils import eventlet_utils as eu
+from taskflow.utils import flow_utils
 from taskflow.utils import misc
 from taskflow.utils import persistence_utils as p_utils
+from taskflow.utils import profile_utils
 
 
 class EngineTaskTest(utils.EngineTestBase):
@@ -474,6 +480,24 @@ class EngineGraphFlowTest(utils.EngineTestBase):
         graph = engine.execution_graph
         self.assertIsInstance(graph, networkx.DiGraph)
 
+    def test_task_graph_property_is_cached(self):
+        flow = gf.Flow('test').add(
+            utils.TaskNoRequiresNoReturns(name='task1'),
+            utils.TaskNoRequiresNoReturns(name='task2'))
+
+        engine = self._make_engine(flow)
+        self.assertIs(engine.execution_graph, engine.execution_graph)
+
+    def test_task_graph_property_keeps_edge_reasons(self):
+        flow = gf.Flow('test').add(
+            utils.ProvidesRequiresTask('task1', provides=['a'], requires=[]),
+            utils.ProvidesRequiresTask('task2', provides=[], requires=['a']))
+
+        engine = self._make_engine(flow)
+        graph = engine.execution_graph
+        task1, task2 = sorted(graph.nodes_iter(), key=lambda t: t.name)
+        self.assertEqual(set(['a']), graph.adj[task1][task2]['reasons'])
+
     def test_task_graph_property_for_one_task(self):
         flow = utils.TaskNoRequiresNoReturns(name='task1')
 
@@ -504,12 +528,102 @@ class EngineCheckingTaskTest(utils.EngineTestBase):
         self.assertRaisesRegexp(RuntimeError, '^Woot', engine.run)
 
 
+class EngineSavingTest(utils.EngineTestBase):
+
+    def _use_dir_backend(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path, ignore_errors=True)
+        self.backend = impl_dir.DirBackend({'path': path})
+        with contextlib.closing(self.backend.get_connection()) as conn:
+            conn.upgrade()
+
+    def test_task_saved_before_next_one_runs(self):
+        self._use_dir_backend()
+        book, flow_detail = p_utils.temporary_flow_detail(self.backend)
+        saved = {}
+
+        def read_saved():
+            with contextlib.closing(self.backend.get_connection()) as conn:
+                fd = conn.get_logbook(book.uuid).find(flow_detail.uuid)
+                saved.update((td.name, td.state) for td in fd)
+
+        flow = lf.Flow('lf').add(
+            utils.SaveOrderTask(name='a'),
+            task.FunctorTask(read_saved, name='b'))
+        self._make_engine(flow, flow_detail=flow_detail).run()
+        self.assertEqual({'a': states.SUCCESS, 'b': states.RUNNING}, saved)
+
+
+class FlakyTask(utils.SaveOrderTask):
+    """Fails the given number of times, then succeeds."""
+
+    def __init__(self, name, failures, **kwargs):
+        super(FlakyTask, self).__init__(name=name, **kwargs)
+        self.failures = failures
+
+    def execute(self, **kwargs):
+        self.values.append(self.name)
+        if self.failures > 0:
+            self.failures -= 1
+            raise RuntimeError('Woot!')
+        return 5
+
+
+class EngineRetryTest(utils.EngineTestBase):
+
+    def test_retried_task_succeeds(self):
+        flaky = FlakyTask('flaky', 2)
+        flaky.retry = task.RetryPolicy(2, delay=0.01)
+        engine = self._make_engine(flaky)
+        engine.run()
+        self.assertEqual(['flaky', 'flaky', 'flaky'], self.values)
+        self.assertEqual(engine.storage.get_flow_state(), states.SUCCESS)
+        self.assertEqual(engine.storage.get('flaky'), 5)
+
+    def test_retries_exhausted(self):
+        flaky = FlakyTask('flaky', 3)
+        flaky.retry = task.RetryPolicy(2, delay=0.01)
+        engine = self._make_engine(flaky)
+        self.assertRaisesRegexp(RuntimeError, '^Woot', engine.run)
+        self.assertEqual(['flaky', 'flaky', 'flaky',
+                          'flaky reverted(Failure: RuntimeError: Woot!)'],
+                         self.values)
+        self.assertEqual(engine.storage.get_flow_state(), states.REVERTED)
+
+    def test_not_retryable_failure(self):
+        flaky = FlakyTask('flaky', 1)
+        flaky.retry = task.RetryPolicy(2, retry_on=[IOError], delay=0.01)
+        engine = self._make_engine(flaky)
+        self.assertRaisesRegexp(RuntimeError, '^Woot', engine.run)
+        self.assertEqual(['flaky',
+                          'flaky reverted(Failure: RuntimeError: Woot!)'],
+                         self.values)
+
+    def test_other_tasks_run_while_waiting_to_retry(self):
+        flaky = FlakyTask('flaky', 1)
+        flaky.retry = task.RetryPolicy(1, delay=0.5)
+        flow = uf.Flow('uf').add(
+            flaky,
+            lf.Flow('lf').add(
+                utils.SaveOrderTask(name='task1'),
+                utils.SaveOrderTask(name='task2')))
+        engine = self._make_engine(flow)
+        engine.run()
+        self.assertEqual(engine.storage.get_flow_state(), states.SUCCESS)
+        self.assertEqual(['flaky', 'flaky', 'task1', 'task2'],
+                         sorted(self.values))
+        # The second run of the flaky task is the last task ran.
+        self.assertEqual('flaky', self.values[-1])
+
+
 class SingleThreadedEngineTest(EngineTaskTest,
                                EngineLinearFlowTest,
                                EngineParallelFlowTest,
                                EngineLinearAndUnorderedExceptionsTest,
                                EngineGraphFlowTest,
                                EngineCheckingTaskTest,
+                               EngineRetryTest,
+                               EngineSavingTest,
                                test.TestCase):
     def _make_engine(self, flow, flow_detail=None):
         return taskflow.engines.load(flow,
@@ -525,6 +639,55 @@ class SingleThreadedEngineTest(EngineTaskTest,
         engine = taskflow.engines.load(utils.TaskNoRequiresNoReturns)
         self.assertIsInstance(engine, eng.SingleThreadedActionEngine)
 
+    def test_flatten_cache(self):
+        cache = flow_utils.FlattenCache()
+        for _i in range(0, 2):
+            flow = lf.Flow('lf').add(utils.SaveOrderTask(name='task1'),
+                                     utils.SaveOrderTask(name='task2'))
+            engine = taskflow.engines.load(
+                flow, engine_conf=dict(engine='serial', flatten_cache=cache),
+                backend=self.backend)
+            engine.run()
+        self.assertEqual(1, len(cache))
+        self.assertEqual(['task1', 'task2', 'task1', 'task2'], self.values)
+
+    def _make_revert_mode_engine(self, revert_mode):
+        flow = gf.Flow('g').add(
+            utils.SaveOrderTask(name='task1', provides='a'),
+            utils.FailingTask(name='fail', requires=['a']),
+            utils.SaveOrderTask(name='other'))
+        engine_conf = dict(engine='serial', revert_mode=revert_mode)
+        return taskflow.engines.load(flow, engine_conf=engine_conf,
+                                     backend=self.backend)
+
+    def test_revert_all(self):
+        engine = self._make_revert_mode_engine('all')
+        self.assertRaisesRegexp(RuntimeError, '^Woot', engine.run)
+        self.assertIn('task1 reverted(5)', self.values)
+        self.assertIn('other reverted(5)', self.values)
+        self.assertEqual(engine.storage.get_task_state('other'),
+                         states.REVERTED)
+
+    def test_revert_affected(self):
+        engine = self._make_revert_mode_engine('affected')
+        self.assertRaisesRegexp(RuntimeError, '^Woot', engine.run)
+        self.assertIn('task1 reverted(5)', self.values)
+        self.assertNotIn('other reverted(5)', self.values)
+        self.assertEqual(engine.storage.get_task_state('other'),
+                         states.SUCCESS)
+        self.assertEqual(engine.storage.get_flow_state(), states.REVERTED)
+
+        # Running it again only runs the tasks that were reverted.
+        del self.values[:]
+        self.assertRaisesRegexp(RuntimeError, '^Woot', engine.run)
+        self.assertIn('task1', self.values)
+        self.assertNotIn('other', self.values)
+        self.assertEqual(engine.storage.get('other'), 5)
+
+    def test_unknown_revert_mode(self):
+        engine = self._make_revert_mode_engine('some')
+        self.assertRaises(ValueError, engine.compile)
+
 
 class MultiThreadedEngineTest(EngineTaskTest,
                               EngineLinearFlowTest,
@@ -532,6 +695,8 @@ class MultiThreadedEngineTest(EngineTaskTest,
                               EngineLinearAndUnorderedExceptionsTest,
                               EngineGraphFlowTest,
                               EngineCheckingTaskTest,
+                              EngineRetryTest,
+                              EngineSavingTest,
                               test.TestCase):
     def _make_engine(self, flow, flow_detail=None, executor=None):
         engine_conf = dict(engine='parallel',
@@ -575,6 +740,174 @@ class ParallelEngineWithEventletTest(EngineTaskTest,
                                      backend=self.backend)
 
 
+def _sleep_then_return(value, delay=0.01):
+    return au.asyncio.sleep(delay, result=value)
+
+
+def _fail_later(delay=0.01):
+    loop = au.asyncio.get_event_loop()
+    future = loop.create_future()
+    loop.call_later(delay, future.set_exception, RuntimeError('Woot!'))
+    return future
+
+
+class AwaitingTask(task.Task):
+    # Returns an awaitable instead of a result, as coroutine functions do.
+
+    def execute(self, **kwargs):
+        self.update_progress(0.5)
+        return _sleep_then_return(5)
+
+    def revert(self, **kwargs):
+        utils.EngineTestBase.values.append(self.name + ' reverted')
+        return _sleep_then_return(None)
+
+
+@testtools.skipIf(not au.ASYNCIO_AVAILABLE, 'asyncio is not available')
+class AsyncEngineTest(EngineTaskTest,
+                      EngineLinearFlowTest,
+                      EngineParallelFlowTest,
+                      EngineLinearAndUnorderedExceptionsTest,
+                      EngineGraphFlowTest,
+                      EngineCheckingTaskTest,
+                      test.TestCase):
+
+    def _make_engine(self, flow, flow_detail=None, loop=None):
+        engine_conf = dict(engine='asyncio', loop=loop)
+        return taskflow.engines.load(flow, flow_detail=flow_detail,
+                                     engine_conf=engine_conf,
+                                     backend=self.backend)
+
+    def test_correct_load(self):
+        engine = self._make_engine(utils.TaskNoRequiresNoReturns)
+        self.assertIsInstance(engine, eng.AsyncActionEngine)
+
+    def test_awaitable_results(self):
+        flow = lf.Flow('root').add(
+            AwaitingTask('task1', provides='x'),
+            task.FunctorTask(_sleep_then_return, name='task2',
+                             rebind={'value': 'x'}, provides='y'))
+        engine = self._make_engine(flow)
+        engine.run()
+        self.assertEqual(engine.storage.fetch_all(), dict(x=5, y=5))
+        self.assertEqual(engine.storage.get_task_progress('task1'), 1.0)
+
+    def test_awaitable_failure_reverts_flow(self):
+        flow = lf.Flow('root').add(
+            AwaitingTask('task1'),
+            task.FunctorTask(_fail_later, name='task2'))
+        engine = self._make_engine(flow)
+        self.assertFailuresRegexp(RuntimeError, '^Woot', engine.run)
+        self.assertEqual(self.values, ['task1 reverted'])
+        self.assertEqual(engine.storage.get_task_state('task1'),
+                         states.REVERTED)
+
+    def test_awaitables_run_concurrently(self):
+        flow = uf.Flow('root')
+        for i in range(50):
+            flow.add(task.FunctorTask(_sleep_then_return, name='t%s' % i,
+                                      rebind=['x', 'delay']))
+        engine = self._make_engine(flow)
+        engine.storage.inject({'x': 1, 'delay': 0.2})
+        with misc.StopWatch() as watch:
+            engine.run()
+        self.assertLess(watch.elapsed(), 5)
+
+    def test_using_given_loop(self):
+        loop_thread = au.LoopThread()
+        loop_thread.start()
+        try:
+            flow = AwaitingTask('task1', provides='x')
+            engine = self._make_engine(flow, loop=loop_thread.loop)
+            engine.run()
+            self.assertEqual(engine.storage.fetch('x'), 5)
+            self.assertFalse(loop_thread.loop.is_closed())
+        finally:
+            loop_thread.stop()
+
+    def test_given_loop_not_running(self):
+        loop = au.asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        flow = AwaitingTask('task1', provides='x')
+        engine = self._make_engine(flow, loop=loop)
+        self.assertRaises(RuntimeError, engine.run)
+        self.assertEqual(engine.storage.get_flow_state(), states.PENDING)
+
+    def test_profiler_not_supported(self):
+        engine_conf = dict(engine='asyncio',
+                           profiler=profile_utils.CProfileTaskProfiler())
+        flow = utils.TaskNoRequiresNoReturns(name='task1')
+        self.assertRaises(ValueError, taskflow.engines.load, flow,
+                          engine_conf=engine_conf)
+
+
+class MultiProcessEngineTest(test.TestCase):
+    # The shared engine tests can not be used here as they record what
+    # happened in a list that tasks ran in another process can not modify.
+
+    def _make_engine(self, flow, executor=None):
+        engine_conf = dict(engine='process',
+                           executor=executor)
+        return taskflow.engines.load(flow, engine_conf=engine_conf)
+
+    def test_correct_load(self):
+        engine = self._make_engine(utils.TaskNoRequiresNoReturns)
+        self.assertIsInstance(engine, eng.MultiProcessActionEngine)
+
+    def test_results_passed_between_tasks(self):
+        flow = lf.Flow('root').add(
+            utils.TaskOneReturn('task1', provides='x'),
+            uf.Flow('inner').add(
+                utils.TaskMultiArgOneReturn('task2', provides='y',
+                                            rebind=['x', 'x', 'x']),
+                utils.TaskMultiReturn('task3', provides=('a', 'b', 'c'))))
+        engine = self._make_engine(flow)
+        engine.run()
+        self.assertEqual(engine.storage.fetch_all(),
+                         dict(x=1, y=3, a=1, b=3, c=5))
+
+    def test_progress_sent_back(self):
+        flow = utils.ProgressingTask(name='task1')
+        progress = []
+        flow.bind('update_progress',
+                  lambda task, event_data, value: progress.append(value))
+        engine = self._make_engine(flow)
+        engine.run()
+        # 0.0 and 1.0 are set by the engine (before and after running the
+        # task) and the task itself also reports them.
+        self.assertEqual(progress, [0.0, 0.0, 1.0, 1.0])
+        self.assertEqual(engine.storage.get_task_progress('task1'), 1.0)
+
+    def test_failure_reverts_flow(self):
+        flow = lf.Flow('root').add(
+            utils.TaskNoRequiresNoReturns('task1'),
+            utils.TaskWithFailure('task2'))
+        engine = self._make_engine(flow)
+        self.assertFailuresRegexp(RuntimeError, '^Woot', engine.run)
+        self.assertEqual(engine.storage.get_flow_state(), states.REVERTED)
+        self.assertEqual(engine.storage.get_task_state('task1'),
+                         states.REVERTED)
+
+    def test_profiler_not_supported(self):
+        engine_conf = dict(engine='process',
+                           profiler=profile_utils.CProfileTaskProfiler())
+        flow = utils.TaskNoRequiresNoReturns(name='task1')
+        self.assertRaises(ValueError, taskflow.engines.load, flow,
+                          engine_conf=engine_conf)
+
+    def test_using_common_executor(self):
+        flow = utils.TaskOneReturn(name='task1', provides='x')
+        executor = futures.ProcessPoolExecutor(2)
+        try:
+            e1 = self._make_engine(flow, executor=executor)
+            e2 = self._make_engine(flow, executor=executor)
+            e1.run()
+            e2.run()
+            self.assertEqual(e2.storage.fetch('x'), 1)
+        finally:
+            executor.shutdown(wait=True)
+
+
 class WorkerBasedEngineTest(EngineTaskTest,
                             EngineLinearFlowTest,
                             EngineParallelFlowTest,
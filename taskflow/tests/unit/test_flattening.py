@@ -16,6 +16,7 @@
 
 import string
 
+import mock
 import networkx as nx
 
 from taskflow import exceptions as exc
@@ -183,3 +184,175 @@ class FlattenTest(test.TestCase):
         self.assertRaisesRegexp(exc.InvariantViolation,
                                 '^Tasks with duplicate names',
                                 f_utils.flatten, flo)
+
+    def test_linear_flatten_empty_subflow(self):
+        a, b, c = _make_many(3)
+        flo = lf.Flow("test").add(a, lf.Flow("empty"), b, c)
+        g = f_utils.flatten(flo)
+        self.assertEqual(3, len(g))
+        self.assertEqual(2, g.number_of_edges())
+        self.assertTrue(g.has_edge(a, b))
+        self.assertTrue(g.has_edge(b, c))
+        self.assertEqual([a], list(g_utils.get_no_predecessors(g)))
+        self.assertEqual([c], list(g_utils.get_no_successors(g)))
+
+    def test_graph_flatten_nested_entries_exits(self):
+        a, b, c, d, e = _make_many(5)
+        flo = gf.Flow("test")
+        sub = uf.Flow("sub").add(b, c)
+        flo.add(a, sub, lf.Flow("sub2").add(d, e))
+        flo.link(a, sub)
+        g = f_utils.flatten(lf.Flow("root").add(flo))
+        self.assertEqual(5, len(g))
+        self.assertTrue(g.has_edge(a, b))
+        self.assertTrue(g.has_edge(a, c))
+        self.assertTrue(g.has_edge(d, e))
+        self.assertEqual(3, g.number_of_edges())
+
+    def test_flatten_long_linear_flow(self):
+        flo = lf.Flow("test")
+        for i in range(0, 1000):
+            flo.add(t_utils.DummyTask(name="t%s" % i))
+        g = f_utils.flatten(flo)
+        self.assertEqual(1000, len(g))
+        self.assertEqual(999, g.number_of_edges())
+        self.assertEqual("test", g.name)
+
+    def _make_graph_flow(self):
+        a, b, c, d = _make_many(4)
+        flo = gf.Flow("test")
+        flo.add(a, lf.Flow("sub-test").add(b, c), d)
+        flo.link(a, d)
+        return flo, [a, b, c, d]
+
+    def test_cached_flatten(self):
+        cache = f_utils.FlattenCache()
+        flo, _tasks = self._make_graph_flow()
+        g = f_utils.flatten(flo, cache=cache)
+        self.assertEqual(1, len(cache))
+
+        flo2, (a, b, c, d) = self._make_graph_flow()
+        g2 = f_utils.flatten(flo2, cache=cache)
+        self.assertEqual(1, len(cache))
+        self.assertEqual(set([a, b, c, d]), set(g2.nodes_iter()))
+        self.assertEqual(g.number_of_edges(), g2.number_of_edges())
+        self.assertTrue(g2.has_edge(a, d))
+        self.assertTrue(g2.has_edge(b, c))
+        self.assertTrue(nx.is_frozen(g2))
+
+    def test_cached_flatten_compact(self):
+        cache = f_utils.FlattenCache()
+        flo, _tasks = self._make_graph_flow()
+        g = f_utils.flatten_compact(flo, cache=cache)
+
+        flo2, (a, b, c, d) = self._make_graph_flow()
+        with mock.patch.object(f_utils.Flattener, 'flatten') as flatten:
+            g2 = f_utils.flatten_compact(flo2, cache=cache)
+        self.assertFalse(flatten.called)
+        self.assertEqual(set([a, b, c, d]), set(g2))
+        self.assertEqual([d], g2.successors(a))
+        self.assertEqual([c], g2.successors(b))
+        self.assertIs(g.successor_arrays()[1], g2.successor_arrays()[1])
+        expected = f_utils.flatten(flo)
+        digraph = g.to_digraph()
+        self.assertEqual(expected.number_of_edges(), digraph.number_of_edges())
+        for (u, v, attrs) in expected.edges_iter(data=True):
+            self.assertEqual(attrs, g_utils.get_edge_attrs(digraph, u, v))
+
+    def test_cached_flatten_different_structure(self):
+        cache = f_utils.FlattenCache()
+        f_utils.flatten(lf.Flow("test").add(*_make_many(2)), cache=cache)
+        a, b = _make_many(2)
+        g = f_utils.flatten(uf.Flow("test").add(a, b), cache=cache)
+        self.assertEqual(2, len(cache))
+        self.assertEqual(0, g.number_of_edges())
+
+    def test_cache_evicts_least_recently_used(self):
+        cache = f_utils.FlattenCache(max_size=2)
+        flows = [lf.Flow(name).add(*_make_many(2)) for name in 'xyz']
+        f_utils.flatten(flows[0], cache=cache)
+        f_utils.flatten(flows[1], cache=cache)
+        f_utils.flatten(flows[0], cache=cache)
+        f_utils.flatten(flows[2], cache=cache)
+        self.assertEqual(2, len(cache))
+        self.assertIsNone(cache.get(('linear', 'y', (('task', 'a'),
+                                                     ('task', 'b')), ())))
+
+    def test_cache_many_uses(self):
+        cache = f_utils.FlattenCache(max_size=2)
+        flows = [lf.Flow(name).add(*_make_many(2)) for name in 'xyz']
+        for _i in range(0, 100):
+            f_utils.flatten(flows[0], cache=cache)
+        f_utils.flatten(flows[1], cache=cache)
+        f_utils.flatten(flows[2], cache=cache)
+        self.assertEqual(2, len(cache))
+        self.assertIsNone(cache.get(('linear', 'x', (('task', 'a'),
+                                                     ('task', 'b')), ())))
+        self.assertTrue(len(cache._uses) <= 2 * len(cache) + 17)
+
+    def test_iter_tasks(self):
+        a, b, c, d = _make_many(4)
+        inner = uf.Flow('inner').add(b, c)
+        flo = gf.Flow('test').add(a, lf.Flow('nested').add(inner, d))
+        self.assertEqual(set([a, b, c, d]), set(f_utils.iter_tasks(flo)))
+        self.assertEqual([a], list(f_utils.iter_tasks(a)))
+
+    def test_cached_flatten_checks_for_dups(self):
+        cache = f_utils.FlattenCache()
+        for _i in range(2):
+            flo = lf.Flow("test").add(t_utils.DummyTask(name="a"),
+                                      t_utils.DummyTask(name="a"))
+            self.assertRaises(exc.InvariantViolation,
+                              f_utils.flatten, flo, cache=cache)
+        self.assertEqual(0, len(cache))
+
+
+class CompactGraphTest(test.TestCase):
+    def test_compact_graph(self):
+        a, b, c, d = _make_many(4)
+        flo = gf.Flow("test").add(a, b, c, d)
+        flo.link(a, b)
+        flo.link(a, c)
+        flo.link(b, d)
+        flo.link(c, d)
+        graph = f_utils.flatten(flo)
+        compact = g_utils.CompactGraph(graph)
+        self.assertEqual(4, len(compact))
+        self.assertEqual(4, compact.number_of_edges())
+        self.assertEqual(set([b, c]), set(compact.successors(a)))
+        self.assertEqual(set([b, c]), set(compact.predecessors(d)))
+        self.assertEqual([], compact.predecessors(a))
+        self.assertEqual(
+            set([compact.index_of(b), compact.index_of(c)]),
+            set(compact.successor_indexes(compact.index_of(a))))
+        self.assertEqual([], list(compact.successor_indexes(
+            compact.index_of(d))))
+        order = [compact.node_at(i) for i in compact.topological_indexes()]
+        self.assertEqual([a, d], [order[0], order[-1]])
+
+    def test_to_digraph(self):
+        a, b, c = _make_many(3)
+        graph = f_utils.flatten(lf.Flow("test").add(a, b, c))
+        compact = g_utils.CompactGraph(
+            graph, default_edge_attrs=f_utils.FLATTEN_EDGE_DATA)
+        # Edges with the default attributes do not keep their own copy.
+        self.assertEqual({}, compact._edge_attrs)
+        digraph = compact.to_digraph()
+        self.assertEqual("test", digraph.name)
+        self.assertEqual(set(graph.edges()), set(digraph.edges()))
+        self.assertEqual(f_utils.FLATTEN_EDGE_DATA,
+                         g_utils.get_edge_attrs(digraph, a, b))
+        self.assertTrue(nx.is_frozen(digraph))
+
+    def test_to_digraph_keeps_edge_attrs(self):
+        a, b, c = _make_many(3)
+        flo = gf.Flow("test").add(a, b, c)
+        flo.link(a, b)
+        flo.link(b, c)
+        graph = f_utils.flatten(flo)
+        digraph = g_utils.CompactGraph(
+            graph, default_edge_attrs=f_utils.FLATTEN_EDGE_DATA).to_digraph()
+        for (u, v) in [(a, b), (b, c)]:
+            attrs = g_utils.get_edge_attrs(digraph, u, v)
+            self.assertTrue(attrs['manual'])
+            self.assertEqual(g_utils.get_edge_attrs(graph, u, v), attrs)
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+
+#    Copyright (C) 2014 Yahoo! Inc. All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+import testtools
+
+import taskflow.engines
+from taskflow.engines.action_engine import graph_analyzer
+from taskflow.patterns import graph_flow as gf
+from taskflow.patterns import linear_flow as lf
+from taskflow.patterns import unordered_flow as uf
+from taskflow import states as st
+from taskflow import storage
+from taskflow import test
+from taskflow.tests import utils
+from taskflow.utils import flow_utils
+from taskflow.utils import graph_utils
+from taskflow.utils import misc
+from taskflow.utils import persistence_utils as p_utils
+
+
+class GraphAnalyzerTest(test.TestCase):
+    _analyzer_cls = graph_analyzer.GraphAnalyzer
+
+    def _make_analyzer(self, flow, revert_mode=graph_analyzer.REVERT_ALL):
+        graph = graph_utils.CompactGraph(flow_utils.flatten(flow))
+        _lb, flow_detail = p_utils.temporary_flow_detail()
+        s = storage.SingleThreadedStorage(flow_detail=flow_detail)
+        for task in graph.nodes_iter():
+            s.ensure_task(task.name)
+        return self._analyzer_cls(graph, s, revert_mode=revert_mode), s
+
+    @staticmethod
+    def _names(nodes):
+        return sorted(n.name for n in nodes)
+
+    def test_fan_in_waits_for_all_predecessors(self):
+        flow = gf.Flow('g').add(
+            utils.TaskOneReturn('a', provides='x'),
+            utils.TaskOneReturn('b', provides='y'),
+            utils.TaskMultiArg('c', rebind=['x', 'y', 'x']))
+        analyzer, s = self._make_analyzer(flow)
+        a, b, c = sorted(analyzer.execution_graph.nodes_iter(),
+                         key=lambda n: n.name)
+
+        self.assertEqual(['a', 'b'],
+                         self._names(analyzer.browse_nodes_for_execute()))
+        s.save('a', 1)
+        self.assertEqual([], analyzer.browse_nodes_for_execute(a))
+        s.save('b', 2)
+        self.assertEqual([c], analyzer.browse_nodes_for_execute(b))
+
+    def test_seeded_from_storage(self):
+        flow = lf.Flow('l').add(
+            utils.TaskNoRequiresNoReturns('a'),
+            utils.TaskNoRequiresNoReturns('b'),
+            utils.TaskNoRequiresNoReturns('c'))
+        analyzer, s = self._make_analyzer(flow)
+        s.save('a', None)
+        self.assertEqual(['b'],
+                         self._names(analyzer.browse_nodes_for_execute()))
+
+    def test_unsuccessful_node_releases_nothing(self):
+        flow = lf.Flow('l').add(
+            utils.TaskNoRequiresNoReturns('a'),
+            utils.TaskNoRequiresNoReturns('b'))
+        analyzer, s = self._make_analyzer(flow)
+        (a,) = analyzer.browse_nodes_for_execute()
+        s.set_task_state('a', st.FAILURE)
+        self.assertEqual([], analyzer.browse_nodes_for_execute(a))
+
+    def test_revert_waits_for_all_successors(self):
+        flow = uf.Flow('u').add(
+            utils.TaskNoRequiresNoReturns('a'),
+            utils.TaskNoRequiresNoReturns('b'))
+        flow = lf.Flow('l').add(utils.TaskNoRequiresNoReturns('root'), flow)
+        analyzer, s = self._make_analyzer(flow)
+        for name in ('root', 'a', 'b'):
+            s.save(name, None)
+        self.assertEqual(['a', 'b'],
+                         self._names(analyzer.browse_nodes_for_revert()))
+        a, b = sorted(analyzer.browse_nodes_for_revert(),
+                      key=lambda n: n.name)
+        s.set_task_state('a', st.REVERTED)
+        self.assertEqual([], analyzer.browse_nodes_for_revert(a))
+        s.set_task_state('b', st.REVERTED)
+        self.assertEqual(['root'],
+                         self._names(analyzer.browse_nodes_for_revert(b)))
+
+    def _make_failed_flow_analyzer(self, revert_mode):
+        # 'b' (which failed) and 'c' depend on 'a', 'e' depends on 'd'.
+        flow = gf.Flow('g').add(
+            utils.TaskOneReturn('a', provides='x'),
+            utils.TaskOneArg('b', rebind=['x']),
+            utils.TaskOneArg('c', rebind=['x']),
+            utils.TaskOneReturn('d', provides='y'),
+            utils.TaskOneArg('e', rebind=['y']))
+        analyzer, s = self._make_analyzer(flow, revert_mode=revert_mode)
+        for name in ('a', 'c', 'd', 'e'):
+            s.save(name, None)
+        s.save('b', misc.Failure.from_exception(RuntimeError('Woot!')),
+               st.FAILURE)
+        return analyzer, s
+
+    def test_revert_all(self):
+        analyzer, _s = self._make_failed_flow_analyzer(
+            graph_analyzer.REVERT_ALL)
+        self.assertEqual(['b', 'c', 'e'],
+                         self._names(analyzer.browse_nodes_for_revert()))
+
+    def test_revert_affected(self):
+        analyzer, s = self._make_failed_flow_analyzer(
+            graph_analyzer.REVERT_AFFECTED)
+        b, c = sorted(analyzer.browse_nodes_for_revert(),
+                      key=lambda n: n.name)
+        self.assertEqual(['b', 'c'], [b.name, c.name])
+        s.set_task_state('b', st.REVERTED)
+        self.assertEqual([], analyzer.browse_nodes_for_revert(b))
+        s.set_task_state('c', st.REVERTED)
+        self.assertEqual(['a'],
+                         self._names(analyzer.browse_nodes_for_revert(c)))
+
+    def test_revert_affected_without_failures(self):
+        flow = lf.Flow('l').add(
+            utils.TaskNoRequiresNoReturns('a'),
+            utils.TaskNoRequiresNoReturns('b'))
+        analyzer, s = self._make_analyzer(
+            flow, revert_mode=graph_analyzer.REVERT_AFFECTED)
+        s.save('a', None)
+        s.save('b', None)
+        self.assertEqual(['b'],
+                         self._names(analyzer.browse_nodes_for_revert()))
+
+    def test_unknown_revert_mode(self):
+        flow = utils.TaskNoRequiresNoReturns('a')
+        self.assertRaises(ValueError, self._make_analyzer, flow,
+                          revert_mode='some')
+
+    def test_ready_nodes_ordered_by_critical_path(self):
+        flow = uf.Flow('u').add(
+            utils.TaskNoRequiresNoReturns('single'),
+            lf.Flow('chain').add(
+                utils.TaskNoRequiresNoReturns('head'),
+                utils.TaskNoRequiresNoReturns('tail')))
+        analyzer, _s = self._make_analyzer(flow)
+        nodes = analyzer.browse_nodes_for_execute()
+        self.assertEqual(['head', 'single'], [n.name for n in nodes])
+        self.assertEqual([2.0, 1.0], [analyzer.get_priority(n)
+                                      for n in nodes])
+
+    def test_priority_uses_cost_hints_and_durations(self):
+        hinted = utils.TaskNoRequiresNoReturns('hinted')
+        hinted.cost = 10
+        flow = uf.Flow('u').add(
+            utils.TaskNoRequiresNoReturns('timed'),
+            hinted,
+            lf.Flow('chain').add(
+                utils.TaskNoRequiresNoReturns('head'),
+                utils.TaskNoRequiresNoReturns('tail')))
+        analyzer, s = self._make_analyzer(flow)
+        s.update_task_metadata('timed', {'duration': 5.0})
+        nodes = analyzer.browse_nodes_for_execute()
+        self.assertEqual(['hinted', 'timed', 'head'], [n.name for n in nodes])
+
+
+@testtools.skipIf(not graph_analyzer.NUMPY_AVAILABLE,
+                  'numpy is not available')
+class VectorizedGraphAnalyzerTest(GraphAnalyzerTest):
+    _analyzer_cls = graph_analyzer.VectorizedGraphAnalyzer
+
+    def test_state_table_follows_storage(self):
+        flow = lf.Flow('l').add(
+            utils.TaskNoRequiresNoReturns('a'),
+            utils.TaskNoRequiresNoReturns('b'),
+            utils.TaskNoRequiresNoReturns('c'))
+        analyzer, s = self._make_analyzer(flow)
+        (a,) = analyzer.browse_nodes_for_execute()
+        graph = analyzer.execution_graph
+        with mock.patch.object(s, 'get_tasks_states') as get_states:
+            with mock.patch.object(s, 'get_task_state') as get_state:
+                s.save('a', None)
+                (b,) = analyzer.browse_nodes_for_execute(a)
+                s.set_task_state('b', st.RUNNING)
+                self.assertEqual({'a': st.SUCCESS, 'b': st.RUNNING,
+                                  'c': st.PENDING},
+                                 dict((n.name,
+                                       analyzer._get_state(graph.index_of(n)))
+                                      for n in graph))
+                s.reset_tasks()
+                self.assertEqual([st.PENDING] * 3,
+                                 [analyzer._get_state(i)
+                                  for i in range(0, len(graph))])
+        self.assertEqual([], get_states.mock_calls)
+        self.assertEqual([], get_state.mock_calls)
+
+
+class NumpyNotAvailableTest(test.TestCase):
+    def setUp(self):
+        super(NumpyNotAvailableTest, self).setUp()
+        patcher = mock.patch.object(graph_analyzer, 'NUMPY_AVAILABLE', False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_vectorized_analyzer(self):
+        flow = lf.Flow('l').add(utils.TaskNoRequiresNoReturns('a'))
+        graph = graph_utils.CompactGraph(flow_utils.flatten(flow))
+        _lb, flow_detail = p_utils.temporary_flow_detail()
+        s = storage.SingleThreadedStorage(flow_detail=flow_detail)
+        self.assertRaises(ImportError,
+                          graph_analyzer.VectorizedGraphAnalyzer, graph, s)
+
+    def test_vectorized_engine(self):
+        flow = lf.Flow('l').add(utils.TaskNoRequiresNoReturns('a'))
+        self.assertRaises(ImportError, taskflow.engines.load, flow,
+                          engine_conf={'engine': 'serial',
+                                       'vectorized': True})
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+#    Copyright (C) 2014 Yahoo! Inc. All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import taskflow.engines
+from taskflow.listeners import metrics
+from taskflow.patterns import linear_flow as lf
+from taskflow import states
+from taskflow import test
+from taskflow.tests import utils
+from taskflow.utils import metrics_utils
+
+
+class MetricsRegistryTest(test.TestCase):
+    def test_counter(self):
+        registry = metrics_utils.MetricsRegistry()
+        registry.inc('calls', labels={'task': 'a'})
+        registry.inc('calls', labels={'task': 'a'}, amount=2)
+        registry.inc('calls', labels={'task': 'b'})
+        self.assertEqual(3, registry.get('calls', labels={'task': 'a'}))
+        self.assertEqual(1, registry.get('calls', labels={'task': 'b'}))
+        self.assertIsNone(registry.get('calls', labels={'task': 'c'}))
+        self.assertIsNone(registry.get('other'))
+
+    def test_histogram(self):
+        registry = metrics_utils.MetricsRegistry()
+        for value in (0.5, 1.0, 3.0):
+            registry.observe('latency', value, buckets=(1.0, 2.0))
+        histogram = registry.get('latency')
+        self.assertEqual(3, histogram.count)
+        self.assertEqual(4.5, histogram.sum)
+        self.assertEqual(3.0, histogram.max)
+        self.assertEqual(1.5, histogram.mean)
+        self.assertEqual([(1.0, 2), (2.0, 2), (float('inf'), 3)],
+                         histogram.cumulative_counts())
+
+    def test_kind_mismatch(self):
+        registry = metrics_utils.MetricsRegistry()
+        registry.inc('calls')
+        self.assertRaises(TypeError, registry.observe, 'calls', 1.0)
+
+    def test_to_prometheus(self):
+        registry = metrics_utils.MetricsRegistry()
+        registry.inc('calls', labels={'task': 'a"b'}, help='Calls')
+        registry.observe('latency', 0.5, labels={'task': 'a'},
+                         buckets=(1.0,), help='Latency')
+        expected = [
+            '# HELP calls Calls',
+            '# TYPE calls counter',
+            'calls{task="a\\"b"} 1.0',
+            '# HELP latency Latency',
+            '# TYPE latency histogram',
+            'latency_bucket{task="a",le="1.0"} 1',
+            'latency_bucket{task="a",le="+Inf"} 1',
+            'latency_sum{task="a"} 0.5',
+            'latency_count{task="a"} 1',
+        ]
+        self.assertEqual('\n'.join(expected) + '\n', registry.to_prometheus())
+
+
+class MetricsListenerTest(test.TestCase):
+    def _run(self, flow, engine_conf='serial'):
+        registry = metrics_utils.MetricsRegistry()
+        engine = taskflow.engines.load(flow, engine_conf=engine_conf)
+        with metrics.MetricsListener(engine, registry=registry):
+            try:
+                engine.run()
+            except RuntimeError:
+                pass
+        return registry
+
+    def test_run_times(self):
+        flow = lf.Flow('test').add(utils.ProgressingTask(name='a'),
+                                   utils.ProgressingTask(name='b'))
+        registry = self._run(flow)
+        for name in ('a', 'b'):
+            labels = {'task': name}
+            self.assertEqual(1, registry.get(metrics.RUN_TIME, labels).count)
+            self.assertEqual(1,
+                             registry.get(metrics.QUEUE_WAIT, labels).count)
+            self.assertIsNone(registry.get(metrics.REVERT_TIME, labels))
+            self.assertEqual(1, registry.get(metrics.TRANSITIONS,
+                                             {'task': name,
+                                              'from': states.RUNNING,
+                                              'to': states.SUCCESS}))
+
+    def test_revert_times(self):
+        flow = lf.Flow('test').add(utils.TaskNoRequiresNoReturns(name='a'),
+                                   utils.TaskWithFailure(name='b'))
+        registry = self._run(flow)
+        self.assertEqual(1, registry.get(metrics.REVERT_TIME,
+                                         {'task': 'a'}).count)
+        self.assertEqual(1, registry.get(metrics.RUN_TIME,
+                                         {'task': 'b'}).count)
+        self.assertEqual(1, registry.get(metrics.TRANSITIONS,
+                                         {'task': 'b',
+                                          'from': states.RUNNING,
+                                          'to': states.FAILURE}))
+
+    def test_parallel_run_times(self):
+        flow = lf.Flow('test').add(utils.ProgressingTask(name='a'))
+        registry = self._run(flow, engine_conf='parallel')
+        self.assertEqual(1, registry.get(metrics.QUEUE_WAIT,
+                                         {'task': 'a'}).count)
+        self.assertEqual(1, registry.get(metrics.RUN_TIME,
+                                         {'task': 'a'}).count)
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+#    Copyright (C) 2014 Yahoo! Inc. All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import pstats
+import shutil
+import tempfile
+import time
+
+import taskflow.engines
+from taskflow.patterns import linear_flow as lf
+from taskflow import task
+from taskflow import test
+from taskflow.tests import utils
+from taskflow.utils import profile_utils
+
+
+def _busy_wait(seconds):
+    end = time.time() + seconds
+    while time.time() < end:
+        pass
+
+
+class BusyTask(task.Task):
+    def execute(self):
+        _busy_wait(0.05)
+
+    def revert(self, **kwargs):
+        _busy_wait(0.05)
+
+
+class ProfilingTest(test.TestCase):
+    def _run(self, flow, profiler, engine='serial'):
+        engine = taskflow.engines.load(flow, engine_conf={
+            'engine': engine,
+            'profiler': profiler,
+        })
+        try:
+            engine.run()
+        except RuntimeError:
+            pass
+
+    def _make_dir(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        return tmp_dir
+
+    def test_cprofile(self):
+        profiler = profile_utils.CProfileTaskProfiler()
+        flow = lf.Flow('test').add(BusyTask('a'), BusyTask('b'))
+        self._run(flow, profiler)
+        self._run(flow, profiler)
+        self.assertEqual(['a', 'b'], profiler.task_names())
+        stats = profiler.get_stats('a')
+        functions = [func[2] for func in stats.stats]
+        self.assertIn('_busy_wait', functions)
+        self.assertIsNone(profiler.get_stats('c'))
+
+        path = os.path.join(self._make_dir(), 'stats')
+        profiler.dump_stats(path)
+        self.assertTrue(pstats.Stats(path).stats)
+
+    def test_cprofile_revert(self):
+        profiler = profile_utils.CProfileTaskProfiler()
+        flow = lf.Flow('test').add(BusyTask('a'),
+                                   utils.TaskWithFailure('b'))
+        self._run(flow, profiler)
+        self.assertEqual(['a', 'b'], profiler.task_names())
+
+    def test_sampling(self):
+        profiler = profile_utils.SamplingTaskProfiler(interval=0.001)
+        flow = lf.Flow('test').add(BusyTask('a'))
+        self._run(flow, profiler, engine='parallel')
+        self.assertEqual(['a'], profiler.task_names())
+        samples = profiler.get_samples('a')
+        self.assertTrue(samples)
+        for stack in samples:
+            self.assertTrue(stack[0].startswith('execute '))
+
+        lines = profiler.collapsed_stacks()
+        self.assertTrue(lines)
+        for line in lines:
+            self.assertTrue(line.startswith('a;execute '))
+
+        path = os.path.join(self._make_dir(), 'stacks')
+        profiler.dump_collapsed(path, name='a')
+        with open(path) as fh:
+            self.assertEqual(profiler.collapsed_stacks('a'),
+                             fh.read().splitlines())
@@ -16,6 +16,8 @@
 
 import contextlib
 
+import mock
+
 from taskflow import task
 from taskflow import test
 
@@ -44,10 +46,12 @@ class ProgressTaskWithDetails(task.Task):
 
 
 class TestProgress(test.TestCase):
-    def _make_engine(self, flow, flow_detail=None, backend=None):
+    def _make_engine(self, flow, flow_detail=None, backend=None,
+                     engine_conf=None):
         e = taskflow.engines.load(flow,
                                   flow_detail=flow_detail,
-                                  backend=backend)
+                                  backend=backend,
+                                  engine_conf=engine_conf)
         e.compile()
         return e
 
@@ -140,3 +144,21 @@ class TestProgress(test.TestCase):
             self.assertEqual(1.0, td.meta['progress'])
             self.assertFalse(td.meta['progress_details'])
             self.assertEqual(6, len(fired_events))
+
+    def test_coalesced_storage_progress(self):
+        fired_events = []
+
+        def notify_me(task, event_data, progress):
+            fired_events.append(progress)
+
+        t = ProgressTask("test", 10)
+        t.bind('update_progress', notify_me)
+        e = self._make_engine(t, engine_conf={'engine': 'serial',
+                                              'progress_delta': 0.5})
+        with mock.patch.object(e.storage, 'set_task_progress',
+                               wraps=e.storage.set_task_progress) as mocked:
+            e.run()
+        self.assertEqual([0.0, 0.5, 1.0],
+                         [c[1][1] for c in mocked.mock_calls])
+        self.assertEqual(11, len(fired_events))
+        self.assertEqual(1.0, e.storage.get_task_progress("test"))
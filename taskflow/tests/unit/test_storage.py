@@ -15,13 +15,20 @@
 #    under the License.
 
 import contextlib
+import functools
+import shutil
+import tempfile
 import threading
+import time
 
 import mock
+import testtools
 
 from taskflow import exceptions
 from taskflow.openstack.common import uuidutils
+from taskflow.persistence.backends import impl_dir
 from taskflow.persistence.backends import impl_memory
+from taskflow.persistence import blob_store
 from taskflow.persistence import logbook
 from taskflow import states
 from taskflow import storage
@@ -29,6 +36,12 @@ from taskflow import test
 from taskflow.utils import misc
 from taskflow.utils import persistence_utils as p_utils
 
+try:
+    from taskflow.persistence.backends import impl_sqlalchemy
+    SQLALCHEMY_AVAILABLE = True
+except ImportError:
+    SQLALCHEMY_AVAILABLE = False
+
 
 class StorageTest(test.TestCase):
     def setUp(self):
@@ -494,3 +507,360 @@ class StorageTest(test.TestCase):
         self.assertEqual(mocked_warning.mock_calls, [])
         s.ensure_task('my other task', result_mapping={'result': 'key'})
         mocked_warning.assert_called_once_with(mock.ANY, 'result')
+
+    def _get_dir_storage(self, **kwargs):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path, ignore_errors=True)
+        backend = impl_dir.DirBackend({'path': path})
+        with contextlib.closing(backend.get_connection()) as conn:
+            conn.upgrade()
+        book, flow_detail = p_utils.temporary_flow_detail(backend)
+        s = storage.SingleThreadedStorage(flow_detail=flow_detail,
+                                          backend=backend, **kwargs)
+        s.ensure_task('my task')
+        return s, backend, book.uuid
+
+    @staticmethod
+    def _get_saved_task(backend, book_uuid, task_uuid):
+        """Reads the task detail as it was saved in the backend."""
+        with contextlib.closing(backend.get_connection()) as conn:
+            for flow_detail in conn.get_logbook(book_uuid):
+                td = flow_detail.find(task_uuid)
+                if td is not None:
+                    return td
+
+    def test_batch_saves_once(self):
+        s, backend, book_uuid = self._get_dir_storage()
+        s.ensure_task('my other task')
+        s.ensure_task('untouched task')
+        uuid = s.get_task_uuid('my task')
+        other_uuid = s.get_task_uuid('my other task')
+        with mock.patch.object(s, '_with_connection',
+                               wraps=s._with_connection) as mocked:
+            with s.batch():
+                s.set_task_state('my task', states.RUNNING)
+                s.set_task_progress('my task', 0.5)
+                with s.batch():
+                    s.save('my other task', 5)
+                self.assertEqual(mocked.mock_calls, [])
+                td = self._get_saved_task(backend, book_uuid, uuid)
+                self.assertEqual(td.state, states.PENDING)
+        mocked.assert_called_once_with(s._save_batch, mock.ANY)
+        saved_names = [td.name for td in mocked.call_args[0][1]]
+        self.assertEqual(sorted(saved_names), ['my other task', 'my task'])
+        td = self._get_saved_task(backend, book_uuid, uuid)
+        self.assertEqual(td.state, states.RUNNING)
+        self.assertEqual(td.meta, {'progress': 0.5})
+        td = self._get_saved_task(backend, book_uuid, other_uuid)
+        self.assertEqual(td.state, states.SUCCESS)
+        self.assertEqual(td.results, 5)
+
+    def test_batch_single_task_detail(self):
+        s, backend, book_uuid = self._get_dir_storage()
+        uuid = s.get_task_uuid('my task')
+        with mock.patch.object(s, '_with_connection',
+                               wraps=s._with_connection) as mocked:
+            with s.batch():
+                s.set_task_state('my task', states.RUNNING)
+                s.save('my task', 5)
+        mocked.assert_called_once_with(s._save_batch, mock.ANY)
+        td = self._get_saved_task(backend, book_uuid, uuid)
+        self.assertEqual(td.state, states.SUCCESS)
+        self.assertEqual(td.results, 5)
+
+    def test_batch_flow_state_saves_changed_tasks_only(self):
+        s, backend, book_uuid = self._get_dir_storage()
+        s.ensure_task('untouched task')
+        uuid = s.get_task_uuid('my task')
+        with mock.patch.object(s, '_save_batch',
+                               wraps=s._save_batch) as mocked:
+            with s.batch():
+                s.set_flow_state(states.RUNNING)
+                s.set_task_state('my task', states.RUNNING)
+        self.assertEqual(1, len(mocked.mock_calls))
+        self.assertEqual(['my task'],
+                         [td.name for td in mocked.call_args[0][1]])
+        with contextlib.closing(backend.get_connection()) as conn:
+            fd = conn.get_logbook(book_uuid).find(s.flow_uuid)
+        self.assertEqual(fd.state, states.RUNNING)
+        self.assertEqual(fd.find(uuid).state, states.RUNNING)
+        self.assertIsNotNone(fd.find(s.get_task_uuid('untouched task')))
+
+    @testtools.skipIf(not SQLALCHEMY_AVAILABLE, 'sqlalchemy is not available')
+    def test_batch_saves_in_one_transaction(self):
+        conf = {'connection': 'sqlite://'}
+        backend = impl_sqlalchemy.SQLAlchemyBackend(conf)
+        self.addCleanup(backend.close)
+        with contextlib.closing(backend.get_connection()) as conn:
+            conn.upgrade()
+        book, flow_detail = p_utils.temporary_flow_detail(backend)
+        s = storage.SingleThreadedStorage(flow_detail=flow_detail,
+                                          backend=backend)
+        names = ['task %s' % i for i in range(0, 3)]
+        with s.batch():
+            for name in names:
+                s.ensure_task(name)
+        run_in_session = impl_sqlalchemy.Connection._run_in_session
+        with mock.patch.object(impl_sqlalchemy.Connection, '_run_in_session',
+                               autospec=True,
+                               side_effect=run_in_session) as mocked:
+            with s.batch():
+                s.set_flow_state(states.RUNNING)
+                for name in names:
+                    s.save(name, 5)
+            self.assertEqual(1, len(mocked.mock_calls))
+            with s.batch():
+                for name in names:
+                    s.set_task_state(name, states.REVERTING)
+            self.assertEqual(2, len(mocked.mock_calls))
+        with contextlib.closing(backend.get_connection()) as conn:
+            fd = conn.get_logbook(book.uuid).find(s.flow_uuid)
+        self.assertEqual(states.RUNNING, fd.state)
+        self.assertEqual(3, len(fd))
+        for td in fd:
+            self.assertEqual(states.REVERTING, td.state)
+            self.assertEqual(5, td.results)
+
+    def _get_checkpoint_storage(self, checkpoint):
+        s, backend, book_uuid = self._get_dir_storage(checkpoint=checkpoint)
+        return s, functools.partial(self._get_saved_task, backend, book_uuid,
+                                    s.get_task_uuid('my task'))
+
+    def test_unknown_checkpoint_policy(self):
+        _lb, flow_detail = p_utils.temporary_flow_detail(self.backend)
+        self.assertRaises(ValueError, storage.SingleThreadedStorage,
+                          flow_detail=flow_detail, checkpoint='sometimes')
+
+    def test_checkpoint_terminal_only(self):
+        s, get_saved = self._get_checkpoint_storage(
+            storage.CHECKPOINT_TERMINAL_ONLY)
+        s.set_task_state('my task', states.RUNNING)
+        s.set_task_progress('my task', 0.5)
+        self.assertEqual(get_saved().state, states.PENDING)
+        self.assertIsNone(get_saved().meta)
+        s.save('my task', 5)
+        self.assertEqual(get_saved().state, states.SUCCESS)
+        self.assertEqual(get_saved().meta, {'progress': 0.5})
+
+    def test_checkpoint_flow_boundaries(self):
+        s, get_saved = self._get_checkpoint_storage(
+            storage.CHECKPOINT_FLOW_BOUNDARIES)
+        s.set_task_state('my task', states.RUNNING)
+        s.save('my task', 5)
+        self.assertEqual(get_saved().state, states.PENDING)
+        s.set_flow_state(states.SUCCESS)
+        self.assertEqual(get_saved().state, states.SUCCESS)
+        self.assertEqual(get_saved().results, 5)
+
+    def _get_blob_storage(self):
+        _lb, flow_detail = p_utils.temporary_flow_detail(self.backend)
+        s = storage.SingleThreadedStorage(
+            flow_detail=flow_detail, backend=self.backend,
+            blob_store=blob_store.MemoryBlobStore(), blob_threshold=10)
+        s.ensure_task('my task')
+        return s
+
+    def test_large_result_goes_to_blob_store(self):
+        s = self._get_blob_storage()
+        s.save('my task', {'data': 'x' * 100})
+        td = s._taskdetail_by_name('my task')
+        self.assertNotIn('data', td.results)
+        self.assertEqual({'data': 'x' * 100}, s.get('my task'))
+
+    def test_large_binary_result_goes_to_blob_store(self):
+        s = self._get_blob_storage()
+        s.ensure_task('my task', result_mapping={'result': None})
+        s.save('my task', b'x' * 100)
+        self.assertEqual(b'x' * 100, s.fetch('result'))
+
+    def test_large_result_read_once(self):
+        s = self._get_blob_storage()
+        with mock.patch.object(s._blob_store, 'get',
+                               wraps=s._blob_store.get) as mocked_get:
+            s.save('my task', {'data': 'x' * 100})
+            self.assertEqual({'data': 'x' * 100}, s.get('my task'))
+            self.assertEqual({'data': 'x' * 100}, s.get('my task'))
+            self.assertEqual(1, len(mocked_get.mock_calls))
+            s.save('my task', {'data': 'y' * 100})
+            self.assertEqual({'data': 'y' * 100}, s.get('my task'))
+            self.assertEqual({'data': 'y' * 100}, s.get('my task'))
+            self.assertEqual(2, len(mocked_get.mock_calls))
+            s.reset('my task')
+            s.save('my task', {'data': 'z' * 100})
+            self.assertEqual({'data': 'z' * 100}, s.get('my task'))
+
+    def test_large_result_decoded_from_memoryview(self):
+        s = self._get_blob_storage()
+        s.save('my task', {'data': 'x' * 100})
+        raw_data = s._blob_store.get(s.get_task_uuid('my task'))
+        s._blob_cache.clear()
+        with mock.patch.object(s._blob_store, 'get',
+                               return_value=memoryview(raw_data)):
+            self.assertEqual({'data': 'x' * 100}, s.get('my task'))
+
+    def test_small_result_kept_inline(self):
+        s = self._get_blob_storage()
+        s.save('my task', 5)
+        self.assertEqual(5, s._taskdetail_by_name('my task').results)
+        self.assertEqual(5, s.get('my task'))
+
+    def test_reset_deletes_blob(self):
+        s = self._get_blob_storage()
+        s.save('my task', b'x' * 100)
+        uuid = s.get_task_uuid('my task')
+        s.reset('my task')
+        self.assertRaises(exceptions.NotFound, s._blob_store.get, uuid)
+
+    def test_reset_tasks_deletes_blob(self):
+        s = self._get_blob_storage()
+        s.save('my task', b'x' * 100)
+        uuid = s.get_task_uuid('my task')
+        s.reset_tasks()
+        self.assertRaises(exceptions.NotFound, s._blob_store.get, uuid)
+
+    def test_failure_deletes_blob(self):
+        s = self._get_blob_storage()
+        s.save('my task', b'x' * 100)
+        uuid = s.get_task_uuid('my task')
+        s.save('my task', misc.Failure.from_exception(RuntimeError('Woot!')),
+               states.FAILURE)
+        self.assertRaises(exceptions.NotFound, s._blob_store.get, uuid)
+
+    def test_result_like_blob_reference(self):
+        result = {storage._BLOB_KEY: 'some', 'encoding': 'binary'}
+        for s in (self._get_storage(), self._get_blob_storage()):
+            s.ensure_task('my task')
+            s.save('my task', result)
+            self.assertEqual(result, s.get('my task'))
+            s.save('my task', dict(result, data='x' * 100))
+            self.assertEqual(dict(result, data='x' * 100), s.get('my task'))
+            s.inject(result)
+            self.assertEqual('some', s.fetch(storage._BLOB_KEY))
+            self.assertEqual('binary', s.fetch('encoding'))
+            s.inject({'other': 5})
+            self.assertEqual(dict(result, other=5), s.fetch_all())
+            resumed = storage.SingleThreadedStorage(
+                flow_detail=s._flowdetail, blob_store=s._blob_store)
+            self.assertEqual(dict(result, other=5), resumed.fetch_all())
+
+    @mock.patch.object(storage.jsonutils, 'dumps')
+    def test_small_results_not_encoded(self, mocked_dumps):
+        s = self._get_blob_storage()
+        for result in (None, True, 5, 5.5, b'x' * 100):
+            s.save('my task', result)
+            self.assertEqual(result, s.get('my task'))
+        self.assertEqual([], mocked_dumps.mock_calls)
+
+    def test_reads_do_not_wait_for_saving(self):
+        s = self._get_storage(threaded=True)
+        s.ensure_task('slow task')
+        s.ensure_task('my task')
+        s.save('my task', 5)
+        saving = threading.Event()
+        saved = threading.Event()
+        save_batch = s._save_batch
+
+        saves = []
+
+        def slow_save_batch(conn, fd):
+            names = [td.name for td in fd]
+            saves.extend(names)
+            if 'slow task' in names:
+                saving.set()
+                saved.wait(10)
+            save_batch(conn, fd)
+
+        s._save_batch = slow_save_batch
+        threads = [threading.Thread(target=s.save, args=('slow task', 1)),
+                   threading.Thread(target=s.set_task_state,
+                                    args=('my task', states.REVERTING))]
+        threads[0].start()
+        try:
+            self.assertTrue(saving.wait(10))
+            self.assertEqual(s.get_task_state('my task'), states.SUCCESS)
+            self.assertEqual(s.get('my task'), 5)
+            # Other tasks can be changed, but are only saved once the
+            # slow task has been saved.
+            threads[1].start()
+            while s.get_task_state('my task') != states.REVERTING:
+                time.sleep(0.01)
+            self.assertEqual(['slow task'], saves)
+        finally:
+            saved.set()
+            for t in threads:
+                t.join()
+        self.assertEqual(s.get('slow task'), 1)
+        self.assertEqual(['slow task', 'my task'], saves)
+
+    def test_reads_do_not_wait_for_batch_saving(self):
+        s = self._get_storage(threaded=True)
+        s.ensure_task('slow task')
+        s.ensure_task('my task')
+        saving = threading.Event()
+        saved = threading.Event()
+        save_batch = s._save_batch
+        saves = []
+
+        def slow_save_batch(conn, fd):
+            names = [td.name for td in fd]
+            saves.extend(names)
+            if 'slow task' in names:
+                saving.set()
+                saved.wait(10)
+            save_batch(conn, fd)
+
+        def run_batch():
+            with s.batch():
+                s.save('slow task', 1)
+
+        s._save_batch = slow_save_batch
+        thread = threading.Thread(target=run_batch)
+        thread.start()
+        try:
+            self.assertTrue(saving.wait(10))
+            # Tasks can be read and changed, values injected and the flow
+            # state changed while the batch is being saved.
+            with s.batch():
+                self.assertEqual(s.get('slow task'), 1)
+                s.set_task_progress('my task', 0.5)
+                s.inject({'foo': 'bar'})
+                s.set_flow_state(states.RUNNING)
+                self.assertEqual(s.get_task_progress('my task'), 0.5)
+                self.assertEqual(s.fetch('foo'), 'bar')
+                self.assertEqual(s.get_flow_state(), states.RUNNING)
+                self.assertEqual(['slow task'], saves)
+                saved.set()
+        finally:
+            saved.set()
+            thread.join()
+        self.assertEqual('slow task', saves[0])
+        self.assertEqual(sorted(['my task', s.injector_name]),
+                         sorted(saves[1:]))
+
+    def test_saves_are_serialized(self):
+        s = self._get_storage(threaded=True)
+        names = ['task %s' % i for i in range(0, 10)]
+        for name in names:
+            s.ensure_task(name)
+        lock = threading.Lock()
+        saving = []
+        overlapped = []
+        save_batch = s._save_batch
+
+        def check_save_batch(conn, fd):
+            with lock:
+                if saving:
+                    overlapped.append(fd.uuid)
+                saving.append(fd.uuid)
+            time.sleep(0.001)
+            with lock:
+                saving.remove(fd.uuid)
+            save_batch(conn, fd)
+
+        s._save_batch = check_save_batch
+        self._run_many_threads([threading.Thread(target=s.save,
+                                                 args=(name, 5))
+                                for name in names])
+        self.assertEqual([], overlapped)
+        for name in names:
+            self.assertEqual(s.get(name), 5)
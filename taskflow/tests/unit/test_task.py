@@ -18,6 +18,7 @@ import mock
 
 from taskflow import task
 from taskflow import test
+from taskflow.utils import misc
 from taskflow.utils import reflection
 
 
@@ -276,6 +277,37 @@ class TaskTest(test.TestCase):
         self.assertEqual(len(task._events_listeners), 1)
 
 
+class RetryPolicyTest(test.TestCase):
+
+    @staticmethod
+    def _make_failure(exc):
+        try:
+            raise exc
+        except Exception:
+            return misc.Failure()
+
+    def test_delays(self):
+        policy = task.RetryPolicy(4, delay=0.5, max_backoff=3)
+        failure = self._make_failure(RuntimeError('Woot!'))
+        self.assertEqual([0.5, 1, 2, 3, None],
+                         [policy.get_delay(failure, attempt)
+                          for attempt in range(0, 5)])
+
+    def test_no_retries(self):
+        policy = task.RetryPolicy(0)
+        failure = self._make_failure(RuntimeError('Woot!'))
+        self.assertIsNone(policy.get_delay(failure, 0))
+
+    def test_retry_on(self):
+        policy = task.RetryPolicy(1, retry_on=[IOError, KeyError])
+        self.assertEqual(1, policy.get_delay(
+            self._make_failure(IOError('Woot!')), 0))
+        self.assertEqual(1, policy.get_delay(
+            self._make_failure(KeyError('Woot!')), 0))
+        self.assertIsNone(policy.get_delay(
+            self._make_failure(RuntimeError('Woot!')), 0))
+
+
 class FunctorTaskTest(test.TestCase):
 
     def test_creation_with_version(self):
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+
+#    Copyright (C) 2014 Yahoo! Inc. All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import threading
+import time
+
+from concurrent import futures
+import testtools
+
+from taskflow.engines.action_engine import executor
+from taskflow import task
+from taskflow import test
+from taskflow.tests import utils
+from taskflow.utils import async_utils
+from taskflow.utils import eventlet_utils as eu
+
+_WAIT_TIMEOUT = 10
+
+
+def _make_blocking_task(name, event):
+
+    def block():
+        event.wait(_WAIT_TIMEOUT)
+
+    return task.FunctorTask(block, name=name)
+
+
+class _SleepingTask(task.Task):
+    def execute(self, delay):
+        time.sleep(delay)
+        return delay
+
+
+class ParallelTaskExecutorTest(test.TestCase):
+
+    def setUp(self):
+        super(ParallelTaskExecutorTest, self).setUp()
+        self.executor = executor.ParallelTaskExecutor()
+        self.executor.start()
+        self.addCleanup(self.executor.stop)
+
+    def _block_all_workers(self):
+        events = []
+        for i in range(self.executor._max_workers):
+            event = threading.Event()
+            events.append(event)
+            self.executor.execute_task(_make_blocking_task('b%s' % i, event),
+                                       'b%s' % i, {})
+        self.addCleanup(lambda: [event.set() for event in events])
+        return events
+
+    def test_results(self):
+        fut = self.executor.execute_task(utils.TaskOneReturn('a'), 'a', {})
+        self.assertEqual(fut.result(_WAIT_TIMEOUT)[1:], (executor.EXECUTED, 1))
+
+    def test_queued_tasks_submitted_by_priority(self):
+        events = self._block_all_workers()
+        ran = []
+        fs = []
+        for name, priority in [('low', 1), ('high', 5), ('middle', 3)]:
+            fs.append(self.executor.execute_task(
+                task.FunctorTask(lambda name=name: ran.append(name),
+                                 name=name),
+                name, {}, priority=priority))
+        self.assertFalse(any(fut.done() for fut in fs))
+
+        # Only one worker is freed, so queued tasks run one at a time.
+        events[0].set()
+        done, _not_done = futures.wait(fs, timeout=_WAIT_TIMEOUT)
+        self.assertEqual(len(done), 3)
+        self.assertEqual(ran, ['high', 'middle', 'low'])
+
+    def test_given_executor_is_not_limited(self):
+        pool = futures.ThreadPoolExecutor(1)
+        self.addCleanup(pool.shutdown)
+        ex = executor.ParallelTaskExecutor(pool)
+        ex.start()
+        self.addCleanup(ex.stop)
+        fut = ex.execute_task(utils.TaskOneReturn('a'), 'a', {}, priority=2)
+        self.assertEqual(fut.result(_WAIT_TIMEOUT)[1:], (executor.EXECUTED, 1))
+
+    def test_resource_limits(self):
+        pool = futures.ThreadPoolExecutor(3)
+        self.addCleanup(pool.shutdown)
+        ex = executor.ParallelTaskExecutor(pool, resource_limits={'db': 1})
+        ex.start()
+        self.addCleanup(ex.stop)
+        event = threading.Event()
+        self.addCleanup(event.set)
+        db_tasks = []
+        for name in ('db1', 'db2'):
+            db_task = _make_blocking_task(name, event)
+            db_task.resources = ('db',)
+            db_tasks.append(ex.execute_task(db_task, name, {}))
+        other = ex.execute_task(utils.TaskOneReturn('other'), 'other', {})
+
+        # The task which does not use the saturated resource is not held
+        # back by the queued one.
+        self.assertEqual(other.result(_WAIT_TIMEOUT)[1:],
+                         (executor.EXECUTED, 1))
+        self.assertTrue(db_tasks[0].running())
+        self.assertFalse(db_tasks[1].running())
+        event.set()
+        done, _not_done = futures.wait(db_tasks, timeout=_WAIT_TIMEOUT)
+        self.assertEqual(len(done), 2)
+
+
+class ParallelProcessTaskExecutorTest(test.TestCase):
+
+    def test_resource_limits(self):
+        ex = executor.ParallelProcessTaskExecutor(resource_limits={'db': 1})
+        ex.start()
+        self.addCleanup(ex.stop)
+        fs = []
+        for name in ('db1', 'db2'):
+            db_task = _SleepingTask(name)
+            db_task.resources = ('db',)
+            fs.append(ex.execute_task(db_task, name, {'delay': 0.5}))
+        # The second task is kept queued until the first one finishes.
+        self.assertEqual(1, len(ex._queued))
+        done, _not_done = futures.wait(fs, timeout=_WAIT_TIMEOUT)
+        self.assertEqual(len(done), 2)
+        for fut in fs:
+            self.assertEqual(fut.result()[1:], (executor.EXECUTED, 0.5))
+
+    def test_queued_tasks_submitted_by_priority(self):
+        ex = executor.ParallelProcessTaskExecutor()
+        ex.start()
+        self.addCleanup(ex.stop)
+        self.assertIsNotNone(ex._max_workers)
+        submitted = []
+        submit = ex._executor.submit
+
+        def record_submit(func, run_func, task, *args):
+            submitted.append(task.name)
+            return submit(func, run_func, task, *args)
+
+        ex._executor.submit = record_submit
+        fs = []
+        for i in range(ex._max_workers):
+            fs.append(ex.execute_task(_SleepingTask('s%s' % i), 's%s' % i,
+                                      {'delay': 0.5}))
+        for name, priority in [('low', 1), ('high', 5), ('middle', 3)]:
+            fs.append(ex.execute_task(_SleepingTask(name), name,
+                                      {'delay': 0}, priority=priority))
+        # The pool is full, so the prioritized tasks are kept queued.
+        self.assertEqual(3, len(ex._queued))
+        done, _not_done = futures.wait(fs, timeout=_WAIT_TIMEOUT)
+        self.assertEqual(len(done), len(fs))
+        self.assertEqual(submitted[-3:], ['high', 'middle', 'low'])
+
+
+@testtools.skipIf(not eu.EVENTLET_AVAILABLE, 'eventlet is not available')
+class GreenParallelTaskExecutorTest(test.TestCase):
+
+    def test_resource_limits(self):
+        pool = eu.GreenExecutor(3)
+        self.addCleanup(pool.shutdown)
+        ex = executor.ParallelTaskExecutor(pool, resource_limits={'db': 1})
+        ex.start()
+        self.addCleanup(ex.stop)
+        fs = []
+        for name in ('db1', 'db2'):
+            db_task = utils.TaskOneReturn(name)
+            db_task.resources = ('db',)
+            fs.append(ex.execute_task(db_task, name, {}))
+        for fut in fs:
+            self.assertIsInstance(fut, eu.GreenFuture)
+        not_done = fs
+        while not_done:
+            _done, not_done = async_utils.wait_for_any(not_done,
+                                                       _WAIT_TIMEOUT)
+        for fut in fs:
+            self.assertEqual(fut.result()[1:], (executor.EXECUTED, 1))
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+#    Copyright (C) 2014 Yahoo! Inc. All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import os
+import shutil
+import tempfile
+
+import taskflow.engines
+from taskflow import exceptions as exc
+from taskflow.listeners import timeline
+from taskflow.patterns import linear_flow as lf
+from taskflow.patterns import unordered_flow as uf
+from taskflow import states
+from taskflow import test
+from taskflow.tests import utils
+
+
+class TimelineListenerTest(test.TestCase):
+    def _run(self, flow, engine_conf='serial', **kwargs):
+        engine = taskflow.engines.load(flow, engine_conf=engine_conf)
+        listener = timeline.TimelineListener(engine, **kwargs)
+        with listener:
+            try:
+                engine.run()
+            except RuntimeError:
+                pass
+        return listener
+
+    @staticmethod
+    def _events(trace, ph):
+        return [e for e in trace['traceEvents'] if e['ph'] == ph]
+
+    def test_task_spans(self):
+        flow = lf.Flow('test').add(utils.ProgressingTask(name='a'),
+                                   utils.ProgressingTask(name='b'))
+        trace = self._run(flow).get_trace()
+        spans = self._events(trace, 'X')
+        self.assertEqual(['a', 'b'], [e['name'] for e in spans])
+        for e in spans:
+            self.assertEqual('execute', e['cat'])
+            self.assertEqual(states.SUCCESS, e['args']['state'])
+            self.assertGreaterEqual(0, e['dur'])
+        self.assertLessEqual(spans[0]['ts'] + spans[0]['dur'],
+                             spans[1]['ts'])
+        progress = [e for e in self._events(trace, 'i')
+                    if e['name'] == 'progress']
+        self.assertIn({'task': 'a', 'progress': 1.0},
+                      [e['args'] for e in progress])
+        flow_states = [e['name'] for e in self._events(trace, 'i')
+                       if e['cat'] == 'flow']
+        self.assertEqual(states.SUCCESS, flow_states[-1])
+        self.assertTrue(self._events(trace, 'M'))
+
+    def test_revert_spans(self):
+        flow = lf.Flow('test').add(utils.TaskNoRequiresNoReturns(name='a'),
+                                   utils.TaskWithFailure(name='b'))
+        trace = self._run(flow).get_trace()
+        spans = [(e['name'], e['cat'], e['args']['state'])
+                 for e in self._events(trace, 'X')]
+        self.assertIn(('b', 'execute', states.FAILURE), spans)
+        self.assertIn(('a', 'revert', states.REVERTED), spans)
+
+    def test_parallel_spans_on_worker_threads(self):
+        flow = uf.Flow('test').add(utils.ProgressingTask(name='a'),
+                                   utils.ProgressingTask(name='b'))
+        trace = self._run(flow, engine_conf='parallel').get_trace()
+        spans = self._events(trace, 'X')
+        self.assertEqual(['a', 'b'], sorted(e['name'] for e in spans))
+        flow_tids = set(e['tid'] for e in self._events(trace, 'i')
+                        if e['cat'] == 'flow')
+        for e in spans:
+            self.assertNotIn(e['tid'], flow_tids)
+
+    def test_bounded_events(self):
+        flow = lf.Flow('test').add(utils.ProgressingTask(name='a'),
+                                   utils.ProgressingTask(name='b'))
+        listener = self._run(flow, max_events=2)
+        trace = listener.get_trace()
+        self.assertEqual(2, len([e for e in trace['traceEvents']
+                                 if e['ph'] != 'M']))
+        self.assertTrue(trace['otherData']['dropped_events'])
+
+    def test_written_at_flow_end(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        path = os.path.join(tmp_dir, 'trace.json')
+        flow = lf.Flow('test').add(utils.ProgressingTask(name='a'))
+        self._run(flow, path=path)
+        with open(path) as fh:
+            trace = json.load(fh)
+        self.assertEqual(['a'], [e['name']
+                                 for e in self._events(trace, 'X')])
+
+    def test_register_does_not_compile(self):
+        flow = lf.Flow('test').add(
+            utils.ProgressingTask(name='a'),
+            uf.Flow('inner').add(utils.ProgressingTask(name='b')))
+        engine = taskflow.engines.load(flow, engine_conf='serial')
+        listener = timeline.TimelineListener(engine)
+        with listener:
+            self.assertFalse(engine._compiled)
+            self.assertEqual(states.PENDING, engine.storage.get_flow_state())
+            self.assertRaises(exc.NotFound,
+                              engine.storage.get_task_uuid, 'a')
+            engine.run()
+        spans = self._events(listener.get_trace(), 'X')
+        self.assertEqual(['a', 'b'], [e['name'] for e in spans])
@@ -17,6 +17,7 @@
 import collections
 import functools
 import sys
+import threading
 import time
 
 from taskflow import states
@@ -222,6 +223,146 @@ class NotifierTest(test.TestCase):
         self.assertEqual(1, len(call_counts[states.SUCCESS]))
         self.assertEqual(2, len(call_counts))
 
+    def test_register_after_notify(self):
+        call_collector = []
+
+        def call_me(state, details):
+            call_collector.append(state)
+
+        notifier = misc.TransitionNotifier()
+        notifier.notify(states.SUCCESS, {})
+        notifier.register(states.SUCCESS, call_me)
+        notifier.notify(states.SUCCESS, {})
+        notifier.deregister(states.SUCCESS, call_me)
+        notifier.notify(states.SUCCESS, {})
+        self.assertEqual([states.SUCCESS], call_collector)
+
+    def test_register_while_building_dispatch(self):
+        call_collector = []
+        building = threading.Event()
+        proceed = threading.Event()
+
+        class SlowListeners(collections.defaultdict):
+            def get(self, *args, **kwargs):
+                if not building.is_set():
+                    building.set()
+                    proceed.wait(5)
+                return super(SlowListeners, self).get(*args, **kwargs)
+
+        def call_me(state, details):
+            call_collector.append(state)
+
+        notifier = misc.TransitionNotifier()
+        notifier._listeners = SlowListeners(list)
+        notifying = threading.Thread(target=notifier.notify,
+                                     args=(states.SUCCESS, {}))
+        notifying.start()
+        self.assertTrue(building.wait(5))
+        registering = threading.Thread(target=notifier.register,
+                                       args=(states.SUCCESS, call_me))
+        registering.start()
+        # Give the registration a chance to finish while the table is
+        # still being built from the callbacks as they were before it.
+        registering.join(0.1)
+        proceed.set()
+        notifying.join()
+        registering.join()
+        notifier.notify(states.SUCCESS, {})
+        self.assertEqual([states.SUCCESS], call_collector)
+
+    def test_async_notify(self):
+        call_collector = []
+        poster = threading.current_thread()
+
+        def call_me(state, details):
+            call_collector.append((state, details,
+                                   threading.current_thread() is poster))
+
+        notifier = misc.TransitionNotifier(async_dispatch=True)
+        notifier.register(misc.TransitionNotifier.ANY, call_me)
+        for i in range(0, 10):
+            notifier.notify(states.SUCCESS, {'i': i})
+        notifier.flush()
+
+        self.assertEqual([(states.SUCCESS, {'i': i}, False)
+                          for i in range(0, 10)], call_collector)
+
+    def _overflow(self, overflow, sample_every=10):
+        call_collector = []
+        blocked = threading.Event()
+        release = threading.Event()
+
+        def call_me(state, details):
+            if not blocked.is_set():
+                blocked.set()
+                release.wait()
+            call_collector.append(details['i'])
+
+        notifier = misc.TransitionNotifier(async_dispatch=True,
+                                           queue_size=1, overflow=overflow,
+                                           sample_every=sample_every)
+        notifier.register(misc.TransitionNotifier.ANY, call_me)
+        notifier.notify(states.SUCCESS, {'i': 0})
+        blocked.wait()
+        # The dispatcher is now stuck delivering the first notification.
+        for i in range(1, 11):
+            notifier.notify(states.SUCCESS, {'i': i})
+            if i == 1:
+                release.set()
+        notifier.flush()
+        return notifier, call_collector
+
+    def test_async_notify_drop(self):
+        notifier, call_collector = self._overflow(
+            misc.TransitionNotifier.DROP)
+        self.assertEqual(11, len(call_collector) + notifier.dropped)
+        self.assertEqual([0, 1], call_collector[0:2])
+        self.assertEqual(sorted(call_collector), call_collector)
+
+    def test_async_notify_sample(self):
+        notifier, call_collector = self._overflow(
+            misc.TransitionNotifier.SAMPLE, sample_every=1)
+        self.assertEqual(list(range(0, 11)), call_collector)
+        self.assertEqual(0, notifier.dropped)
+
+    def test_async_notify_block(self):
+        notifier, call_collector = self._overflow(
+            misc.TransitionNotifier.BLOCK)
+        self.assertEqual(list(range(0, 11)), call_collector)
+        self.assertEqual(0, notifier.dropped)
+
+    def test_async_notify_block_from_callback(self):
+        call_collector = []
+
+        def call_me(state, details):
+            call_collector.append(details['i'])
+            if details['i'] == 0:
+                # The queue is full after the first of these, posting the
+                # others from the dispatcher thread must not wait for room.
+                for i in range(1, 4):
+                    notifier.notify(states.SUCCESS, {'i': i})
+
+        notifier = misc.TransitionNotifier(async_dispatch=True,
+                                           queue_size=1)
+        notifier.register(misc.TransitionNotifier.ANY, call_me)
+        notifier.notify(states.SUCCESS, {'i': 0})
+        done = threading.Event()
+
+        def flush():
+            notifier.flush()
+            done.set()
+
+        flusher = threading.Thread(target=flush)
+        flusher.daemon = True
+        flusher.start()
+        self.assertTrue(done.wait(10))
+        self.assertEqual([0, 1, 2, 3], sorted(call_collector))
+        self.assertEqual(0, notifier.dropped)
+
+    def test_bad_overflow(self):
+        self.assertRaises(ValueError, misc.TransitionNotifier,
+                          async_dispatch=True, overflow='explode')
+
 
 class GetCallableArgsTest(test.TestCase):
 
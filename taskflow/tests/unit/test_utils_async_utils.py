@@ -54,6 +54,43 @@ class WaitForAnyTestsMixin(object):
         self.assertIs(done.pop(), f2)
 
 
+class CompletionQueueTestsMixin(object):
+    timeout = 0.001
+
+    def test_gets_completed_futures(self):
+        def foo():
+            pass
+
+        queue = au.CompletionQueue()
+        with self.executor_cls(2) as e:
+            fs = [queue.watch(e.submit(foo)), queue.watch(e.submit(foo))]
+            done = []
+            while len(done) < len(fs):
+                # this test assumes that our foo will end within 10 seconds
+                done.extend(queue.get(10))
+        self.assertEqual(set(fs), set(done))
+        self.assertEqual([], queue.get(self.timeout))
+
+    def test_not_done_futures(self):
+        queue = au.CompletionQueue()
+        queue.watch(futures.Future())
+        self.assertEqual([], queue.get(self.timeout))
+
+    def test_already_done_futures(self):
+        queue = au.CompletionQueue()
+        f1 = queue.watch(futures.Future())
+        f2 = futures.Future()
+        f2.set_result(1)
+        queue.watch(f2)
+        self.assertEqual([f2], queue.get(self.timeout))
+        f1.set_result(2)
+        self.assertEqual([f1], queue.get(self.timeout))
+
+    def test_nothing_watched(self):
+        queue = au.CompletionQueue()
+        self.assertEqual([], queue.get(self.timeout))
+
+
 class WaiterTestsMixin(object):
 
     def test_add_result(self):
@@ -78,6 +115,7 @@ class WaiterTestsMixin(object):
 @testtools.skipIf(not eu.EVENTLET_AVAILABLE, 'eventlet is not available')
 class AsyncUtilsEventletTest(test.TestCase,
                              WaitForAnyTestsMixin,
+                             CompletionQueueTestsMixin,
                              WaiterTestsMixin):
     executor_cls = eu.GreenExecutor
     is_green = True
@@ -85,6 +123,7 @@ class AsyncUtilsEventletTest(test.TestCase,
 
 class AsyncUtilsThreadedTest(test.TestCase,
                              WaitForAnyTestsMixin,
+                             CompletionQueueTestsMixin,
                              WaiterTestsMixin):
     executor_cls = futures.ThreadPoolExecutor
     is_green = False
@@ -15,6 +15,7 @@
 #    under the License.
 
 import six
+from six.moves import cPickle as pickle
 
 from taskflow import exceptions
 from taskflow import test
@@ -98,6 +99,22 @@ class ReCreatedFailureTestCase(test.TestCase, GeneralFailureObjTestsMixin):
         self.assertIs(exc.check(RuntimeError), RuntimeError)
 
 
+class PickledFailureTestCase(test.TestCase, GeneralFailureObjTestsMixin):
+
+    def setUp(self):
+        super(PickledFailureTestCase, self).setUp()
+        self.captured = _captured_failure('Woot!')
+        self.fail_obj = pickle.loads(pickle.dumps(self.captured))
+
+    def test_no_exc_info(self):
+        self.assertIs(self.fail_obj.exc_info, None)
+
+    def test_matches_captured(self):
+        self.assertTrue(self.fail_obj.matches(self.captured))
+        self.assertEqual(self.fail_obj.traceback_str,
+                         self.captured.traceback_str)
+
+
 class FromExceptionTestCase(test.TestCase, GeneralFailureObjTestsMixin):
 
     def setUp(self):
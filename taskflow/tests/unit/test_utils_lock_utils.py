@@ -283,3 +283,52 @@ class ReadWriteLockTest(test.TestCase):
         self.assertEqual(0, len(reader_times))
         for (start, stop) in writer_times:
             self.assertEqual(1, _find_overlaps(writer_times, start, stop))
+
+    def test_double_reader_partial_release(self):
+        lock = lock_utils.ReaderWriterLock()
+        with lock.read_lock():
+            with lock.read_lock():
+                pass
+            self.assertTrue(lock.is_reader())
+            self.assertEqual(lock.READER, lock.owner)
+
+        self.assertFalse(lock.is_reader())
+        self.assertFalse(lock.owner)
+
+    def test_writer_waits_for_reentrant_reader(self):
+        lock = lock_utils.ReaderWriterLock()
+        activated = collections.deque()
+        active = threading.Event()
+
+        def double_reader():
+            with lock.read_lock():
+                active.set()
+                while lock.pending_writers == 0:
+                    time.sleep(0.001)
+                with lock.read_lock():
+                    time.sleep(0.01)
+                    activated.append(lock.owner)
+                activated.append(lock.owner)
+
+        def happy_writer():
+            with lock.write_lock():
+                activated.append(lock.owner)
+
+        reader = threading.Thread(target=double_reader)
+        reader.start()
+        active.wait()
+
+        writer = threading.Thread(target=happy_writer)
+        writer.start()
+
+        reader.join()
+        writer.join()
+        self.assertEqual(['r', 'r', 'w'], list(activated))
+
+    def test_contended_readers_writers(self):
+        writer_times, reader_times = _spawn_variation(48, 16)
+        self.assertEqual(16, len(writer_times))
+        self.assertEqual(48, len(reader_times))
+        for (start, stop) in writer_times:
+            self.assertEqual(0, _find_overlaps(reader_times, start, stop))
+            self.assertEqual(1, _find_overlaps(writer_times, start, stop))
@@ -56,8 +56,6 @@ class TestWorkerTaskExecutor(test.MockTestCase):
         # other mocking
         self.proxy_inst_mock.start.side_effect = self._fake_proxy_start
         self.proxy_inst_mock.stop.side_effect = self._fake_proxy_stop
-        self.wait_for_any_mock = self._patch(
-            'taskflow.engines.worker_based.executor.async_utils.wait_for_any')
         self.message_mock = mock.MagicMock(name='message')
         self.message_mock.properties = {'correlation_id': self.task_uuid}
         self.remote_task_mock = mock.MagicMock(uuid=self.task_uuid)
@@ -279,27 +277,6 @@ class TestWorkerTaskExecutor(test.MockTestCase):
         self.assertEqual(event, 'executed')
         self.assertIsInstance(res, misc.Failure)
 
-    def test_wait_for_any(self):
-        fs = [futures.Future(), futures.Future()]
-        ex = self.executor()
-        ex.wait_for_any(fs)
-
-        expected_calls = [
-            mock.call(fs, None)
-        ]
-        self.assertEqual(self.wait_for_any_mock.mock_calls, expected_calls)
-
-    def test_wait_for_any_with_timeout(self):
-        timeout = 30
-        fs = [futures.Future(), futures.Future()]
-        ex = self.executor()
-        ex.wait_for_any(fs, timeout)
-
-        master_mock_calls = [
-            mock.call(fs, timeout)
-        ]
-        self.assertEqual(self.wait_for_any_mock.mock_calls, master_mock_calls)
-
     def test_start_stop(self):
         ex = self.executor()
         ex.start()
@@ -14,6 +14,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 import threading
 
 from concurrent import futures
@@ -26,15 +27,19 @@ DONE_STATES = frozenset([
 ])
 
 
+def _make_event(is_green):
+    if is_green:
+        assert eu.EVENTLET_AVAILABLE, ('eventlet is needed to use this'
+                                       ' feature')
+        return eu.green_threading.Event()
+    else:
+        return threading.Event()
+
+
 class _Waiter(object):
     """Provides the event that wait_for_any() blocks on."""
     def __init__(self, is_green):
-        if is_green:
-            assert eu.EVENTLET_AVAILABLE, ('eventlet is needed to use this'
-                                           ' feature')
-            self.event = eu.green_threading.Event()
-        else:
-            self.event = threading.Event()
+        self.event = _make_event(is_green)
 
     def add_result(self, future):
         self.event.set()
@@ -81,6 +86,53 @@ def wait_for_any(fs, timeout=None):
         return _partition_futures(fs)
 
 
+class CompletionQueue(object):
+    """Collects futures as they complete.
+
+    Each watched future gets a single done callback that puts it onto this
+    queue, so that waiting for (possibly many) futures to complete does not
+    require attaching and detaching waiters to every pending future (as
+    wait_for_any() has to do).
+
+    Works correctly with both green and non-green futures (but they should
+    not be mixed in the same queue).
+    """
+
+    def __init__(self):
+        self._done = collections.deque()
+        self._event = None
+
+    def watch(self, future):
+        """Starts watching given future for completion."""
+        if self._event is None:
+            self._event = _make_event(isinstance(future, eu.GreenFuture))
+        future.add_done_callback(self._on_done)
+        return future
+
+    def _on_done(self, future):
+        self._done.append(future)
+        self._event.set()
+
+    def get(self, timeout=None):
+        """Wait for any of watched futures to complete.
+
+        Returns list of all futures that completed since the last call; the
+        list may be empty if timeout occurred before any of them completed.
+        """
+        if self._event is None:
+            return []
+        if not self._done:
+            self._event.wait(timeout)
+        # Clear the event before taking futures out of the queue, so that
+        # futures completing while we drain will set it again (instead of
+        # being lost until the next completion).
+        self._event.clear()
+        done = []
+        while self._done:
+            done.append(self._done.popleft())
+        return done
+
+
 def make_completed_future(result):
     """Make with completed with given result."""
     future = futures.Future()
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+#    Copyright (C) 2014 Yahoo! Inc. All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import threading
+
+try:
+    import asyncio
+    ASYNCIO_AVAILABLE = hasattr(asyncio, 'ensure_future')
+except ImportError:
+    ASYNCIO_AVAILABLE = False
+
+
+def is_awaitable(obj):
+    """Checks if the given object can be waited on by an asyncio loop."""
+    if not ASYNCIO_AVAILABLE:
+        return False
+    return (asyncio.iscoroutine(obj) or isinstance(obj, asyncio.Future)
+            or hasattr(obj, '__await__'))
+
+
+def ensure_future(awaitable, loop):
+    """Wraps the given awaitable in a future (scheduled on the given loop)."""
+    return asyncio.ensure_future(awaitable, loop=loop)
+
+
+class LoopThread(object):
+    """Runs an asyncio event loop in a dedicated (daemon) thread.
+
+    Other threads may schedule callbacks to be ran on the loop using
+    the call_soon_threadsafe() method.
+    """
+
+    def __init__(self):
+        assert ASYNCIO_AVAILABLE, 'asyncio is needed to run an event loop'
+        self._loop = None
+        self._thread = None
+
+    @property
+    def loop(self):
+        return self._loop
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_forever()
+        finally:
+            asyncio.set_event_loop(None)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._thread = None
+        self._loop.close()
+        self._loop = None
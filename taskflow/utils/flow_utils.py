@@ -14,6 +14,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+import itertools
 import logging
 import threading
 
@@ -39,6 +41,15 @@ FLATTEN_EDGE_DATA = {
 
 
 class Flattener(object):
+    """Flattens a item (a task or flow) into a single execution graph.
+
+    All tasks (and the edges between them) are added into one graph as the
+    item is traversed; flattening each (sub)item returns the nodes through
+    which its subgraph is entered (the ones without predecessors in that
+    subgraph) and exited (the ones without successors in it) so that it can
+    be connected to its siblings without scanning or copying any graphs.
+    """
+
     def __init__(self, root, freeze=True):
         self._root = root
         self._graph = None
@@ -64,15 +75,16 @@ class Flattener(object):
                     # if it's later modified that the same copy isn't modified.
                     graph.add_edge(u, v, attr_dict=edge_attrs.copy())
 
-    def _flatten(self, item):
+    def _flatten(self, graph, item):
+        """Adds a item into the graph, returning its (entries, exits)."""
         functor = self._find_flattener(item)
         if not functor:
             raise TypeError("Unknown type requested to flatten: %s (%s)"
                             % (item, type(item)))
         self._pre_item_flatten(item)
-        graph = functor(item)
-        self._post_item_flatten(item, graph)
-        return graph
+        entries, exits = functor(graph, item)
+        self._post_item_flatten(item, entries, exits)
+        return entries, exits
 
     def _find_flattener(self, item):
         """Locates the flattening function to use to flatten the given item."""
@@ -87,62 +99,79 @@ class Flattener(object):
         else:
             return None
 
-    def _flatten_linear(self, flow):
+    def _flatten_linear(self, graph, flow):
         """Flattens a linear flow."""
-        graph = nx.DiGraph(name=flow.name)
-        previous_nodes = []
+        entries = []
+        previous_exits = []
         for item in flow:
-            subgraph = self._flatten(item)
-            graph = gu.merge_graphs([graph, subgraph])
-            # Find nodes that have no predecessor, make them have a predecessor
-            # of the previous nodes so that the linearity ordering is
-            # maintained. Find the ones with no successors and use this list
-            # to connect the next subgraph (if any).
-            self._add_new_edges(graph,
-                                previous_nodes,
-                                list(gu.get_no_predecessors(subgraph)))
-            # There should always be someone without successors, otherwise we
-            # have a cycle A -> B -> A situation, which should not be possible.
-            previous_nodes = list(gu.get_no_successors(subgraph))
-        return graph
-
-    def _flatten_unordered(self, flow):
+            item_entries, item_exits = self._flatten(graph, item)
+            if not item_exits:
+                # An empty item, the items around it are connected instead.
+                continue
+            # Make the nodes of this item that have no predecessor have a
+            # predecessor of the previous nodes so that the linearity
+            # ordering is maintained (if there are no previous nodes they
+            # are entries of the whole flow).
+            if previous_exits:
+                self._add_new_edges(graph, previous_exits, item_entries)
+            else:
+                entries.extend(item_entries)
+            previous_exits = item_exits
+        return entries, previous_exits
+
+    def _flatten_unordered(self, graph, flow):
         """Flattens a unordered flow."""
-        graph = nx.DiGraph(name=flow.name)
+        entries = []
+        exits = []
         for item in flow:
-            # NOTE(harlowja): we do *not* connect the graphs together, this
+            # NOTE(harlowja): we do *not* connect the items together, this
             # retains that each item (translated to subgraph) is disconnected
             # from each other which will result in unordered execution while
             # running.
-            graph = gu.merge_graphs([graph, self._flatten(item)])
-        return graph
+            item_entries, item_exits = self._flatten(graph, item)
+            entries.extend(item_entries)
+            exits.extend(item_exits)
+        return entries, exits
 
-    def _flatten_task(self, task):
+    def _flatten_task(self, graph, task):
         """Flattens a individual task."""
-        graph = nx.DiGraph(name=task.name)
+        if task in graph:
+            raise ValueError("Can not add task %s into %s since it is"
+                             " already there" % (task, graph.name))
         graph.add_node(task)
-        return graph
+        return [task], [task]
 
-    def _flatten_graph(self, flow):
+    def _flatten_graph(self, graph, flow):
         """Flattens a graph flow."""
-        graph = nx.DiGraph(name=flow.name)
         # Flatten all nodes into a single subgraph per node.
         subgraph_map = {}
         for item in flow:
-            subgraph = self._flatten(item)
-            subgraph_map[item] = subgraph
-            graph = gu.merge_graphs([graph, subgraph])
+            subgraph_map[item] = self._flatten(graph, item)
         # Reconnect all node edges to there corresponding subgraphs.
+        connected_to = set()
+        connected_from = set()
         for (u, v) in flow.graph.edges_iter():
+            u_exits = subgraph_map[u][1]
+            v_entries = subgraph_map[v][0]
+            if not u_exits or not v_entries:
+                continue
             # Retain and update the original edge attributes.
             u_v_attrs = gu.get_edge_attrs(flow.graph, u, v)
             # Connect the ones with no predecessors in v to the ones with no
             # successors in u (thus maintaining the edge dependency).
-            self._add_new_edges(graph,
-                                list(gu.get_no_successors(subgraph_map[u])),
-                                list(gu.get_no_predecessors(subgraph_map[v])),
+            self._add_new_edges(graph, u_exits, v_entries,
                                 edge_attrs=u_v_attrs)
-        return graph
+            connected_from.add(u)
+            connected_to.add(v)
+        entries = []
+        exits = []
+        for item in flow:
+            item_entries, item_exits = subgraph_map[item]
+            if item not in connected_to:
+                entries.extend(item_entries)
+            if item not in connected_from:
+                exits.extend(item_exits)
+        return entries, exits
 
     def _pre_item_flatten(self, item):
         """Called before a item is flattened; any pre-flattening actions."""
@@ -152,17 +181,10 @@ class Flattener(object):
         LOG.debug("Starting to flatten '%s'", item)
         self._history.add(id(item))
 
-    def _post_item_flatten(self, item, graph):
-        """Called before a item is flattened; any post-flattening actions."""
-        LOG.debug("Finished flattening '%s'", item)
-        # NOTE(harlowja): this one can be expensive to calculate (especially
-        # the cycle detection), so only do it if we know debugging is enabled
-        # and not under all cases.
-        if LOG.isEnabledFor(logging.DEBUG):
-            LOG.debug("Translated '%s' into a graph:", item)
-            for line in gu.pformat(graph).splitlines():
-                # Indent it so that it's slightly offset from the above line.
-                LOG.debug(" %s", line)
+    def _post_item_flatten(self, item, entries, exits):
+        """Called after a item is flattened; any post-flattening actions."""
+        LOG.debug("Finished flattening '%s' (entered through %s, exited"
+                  " through %s)", item, entries, exits)
 
     def _pre_flatten(self):
         """Called before the flattening of the item starts."""
@@ -176,6 +198,14 @@ class Flattener(object):
             dup_names = ', '.join(sorted(dup_names))
             raise exceptions.InvariantViolation("Tasks with duplicate names "
                                                 "found: %s" % (dup_names))
+        # NOTE(harlowja): this one can be expensive to calculate (especially
+        # the cycle detection), so only do it if we know debugging is enabled
+        # and not under all cases.
+        if LOG.isEnabledFor(logging.DEBUG):
+            LOG.debug("Translated '%s' into a graph:", self._root)
+            for line in gu.pformat(graph).splitlines():
+                # Indent it so that it's slightly offset from the above line.
+                LOG.debug(" %s", line)
         self._history.clear()
 
     @lu.locked
@@ -184,7 +214,9 @@ class Flattener(object):
         if self._graph is not None:
             return self._graph
         self._pre_flatten()
-        graph = self._flatten(self._root)
+        # NOTE: the root may not be a task or flow (which _flatten rejects).
+        graph = nx.DiGraph(name=getattr(self._root, 'name', None))
+        self._flatten(graph, self._root)
         self._post_flatten(graph)
         if self._freeze:
             self._graph = nx.freeze(graph)
@@ -193,6 +225,194 @@ class Flattener(object):
         return self._graph
 
 
-def flatten(item, freeze=True):
-    """Flattens a item (a task or flow) into a single execution graph."""
-    return Flattener(item, freeze=freeze).flatten()
+class FlattenCache(object):
+    """Caches the shape of flattened execution graphs.
+
+    Items (tasks or flows) that have the same structure (the same kinds of
+    flows nesting the same named tasks, and graph flows with the same links
+    between them) flatten into the same graph, differing only in which task
+    objects are its nodes. This cache keeps the compact form (see
+    `graph_utils.CompactGraph`) of the graphs that were flattened, keyed by
+    that structure. Finding the structure of a item still walks it (without
+    building any graph), but for a item of a cached structure the flattening,
+    its validation and the building of the graph are skipped: the cached
+    compact graph is reused with the tasks of the item as its nodes. When
+    more than `max_size` shapes are cached the least recently used one is
+    evicted.
+    """
+
+    def __init__(self, max_size=64):
+        self.max_size = max_size
+        # Structure => (shape, number of its last use), and (structure, use
+        # number) tuples of all uses in the order they happened; tuples of
+        # uses that were not the last use of their structure are skipped
+        # (and dropped) when looking for the least recently used structure.
+        self._shapes = {}
+        self._uses = collections.deque()
+        self._use_counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._shapes)
+
+    def clear(self):
+        with self._lock:
+            self._shapes.clear()
+            self._uses.clear()
+
+    def _use(self, structure, shape):
+        use = next(self._use_counter)
+        self._shapes[structure] = (shape, use)
+        self._uses.append((structure, use))
+        if len(self._uses) > 2 * len(self._shapes) + 16:
+            # Drop the tuples of uses that are no longer needed.
+            self._uses = collections.deque(
+                u for u in self._uses if not self._is_stale(u))
+
+    def _is_stale(self, use):
+        structure, number = use
+        shape = self._shapes.get(structure)
+        return shape is None or shape[1] != number
+
+    def get(self, structure):
+        with self._lock:
+            try:
+                shape, _last_use = self._shapes[structure]
+            except KeyError:
+                return None
+            self._use(structure, shape)
+            return shape
+
+    def put(self, structure, shape):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._use(structure, shape)
+            while len(self._shapes) > self.max_size:
+                use = self._uses.popleft()
+                if not self._is_stale(use):
+                    del self._shapes[use[0]]
+
+
+def _get_structure(item, tasks, seen):
+    """Returns a hashable description of how a item would be flattened.
+
+    Tasks are appended to the given list in the order they are found (which
+    is the order their indexes in the description refer to). None is returned
+    for items that can not be described (for example items that are nested
+    multiple times, or of an unknown type).
+    """
+    if id(item) in seen:
+        return None
+    seen.add(id(item))
+    if isinstance(item, task.BaseTask):
+        tasks.append(item)
+        return ('task', item.name)
+    if isinstance(item, lf.Flow):
+        kind = 'linear'
+    elif isinstance(item, uf.Flow):
+        kind = 'unordered'
+    elif isinstance(item, gf.Flow):
+        kind = 'graph'
+    else:
+        return None
+    children = []
+    for child in item:
+        child_tasks = []
+        child_structure = _get_structure(child, child_tasks, seen)
+        if child_structure is None:
+            return None
+        children.append((child_structure, child, child_tasks))
+    if kind == 'graph':
+        # NOTE: graph flows iterate their children in no particular order,
+        # so they are sorted for same structured flows to be described the
+        # same way.
+        children.sort(key=lambda c: c[0])
+    for (_child_structure, _child, child_tasks) in children:
+        tasks.extend(child_tasks)
+    links = ()
+    if kind == 'graph':
+        indexes = dict((c[1], i) for i, c in enumerate(children))
+        links = []
+        for (u, v) in item.graph.edges_iter():
+            attrs = gu.get_edge_attrs(item.graph, u, v) or {}
+            links.append((indexes[u], indexes[v],
+                          bool(attrs.get('manual')),
+                          frozenset(attrs.get('reasons', ()))))
+        links = tuple(sorted(links))
+    return (kind, item.name, tuple(c[0] for c in children), links)
+
+
+def _get_shape(graph, tasks):
+    compact = gu.CompactGraph(graph, default_edge_attrs=FLATTEN_EDGE_DATA)
+    positions = dict((t, i) for i, t in enumerate(tasks))
+    # The position (in the tasks list) of the task at each graph index.
+    order = tuple(positions[t] for t in compact)
+    return (compact, order)
+
+
+def _from_shape(shape, tasks):
+    compact, order = shape
+    return compact.with_nodes(tasks[i] for i in order)
+
+
+def iter_tasks(item):
+    """Iterates over the tasks of a item (a task or flow) without flattening.
+
+    Each task is only produced once (even if it is nested multiple times).
+    """
+    seen = set()
+    stack = [item]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        if isinstance(item, task.BaseTask):
+            yield item
+        else:
+            stack.extend(reversed(list(item)))
+
+
+def flatten(item, freeze=True, cache=None):
+    """Flattens a item (a task or flow) into a single execution graph.
+
+    If a cache (see FlattenCache) is provided the graph is rebuilt from
+    it for items that have the same structure as some previously flattened
+    item.
+    """
+    if cache is None:
+        return Flattener(item, freeze=freeze).flatten()
+    tasks = []
+    structure = _get_structure(item, tasks, set())
+    if structure is None:
+        return Flattener(item, freeze=freeze).flatten()
+    shape = cache.get(structure)
+    if shape is not None:
+        return _from_shape(shape, tasks).to_digraph(freeze=freeze)
+    graph = Flattener(item, freeze=freeze).flatten()
+    cache.put(structure, _get_shape(graph, tasks))
+    return graph
+
+
+def flatten_compact(item, cache=None):
+    """Flattens a item (a task or flow) into a compact execution graph.
+
+    If a cache (see FlattenCache) is provided and some previously flattened
+    item had the same structure its compact graph is reused (no networkx
+    graph is built).
+    """
+    tasks = []
+    structure = None
+    if cache is not None:
+        structure = _get_structure(item, tasks, set())
+    if structure is not None:
+        shape = cache.get(structure)
+        if shape is not None:
+            return _from_shape(shape, tasks)
+    graph = Flattener(item).flatten()
+    if structure is None:
+        return gu.CompactGraph(graph, default_edge_attrs=FLATTEN_EDGE_DATA)
+    shape = _get_shape(graph, tasks)
+    cache.put(structure, shape)
+    return shape[0]
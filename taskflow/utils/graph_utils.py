@@ -14,6 +14,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import array
+import copy
+
 import networkx as nx
 import six
 
@@ -96,3 +99,162 @@ def pformat(graph):
 def export_graph_to_dot(graph):
     """Exports the graph to a dot format (requires pydot library)."""
     return nx.to_pydot(graph).to_string()
+
+
+def _pack_adjacency(nodes, index, get_adjacent):
+    """Packs the adjacency lists of the nodes into (offsets, targets) arrays.
+
+    The adjacent nodes of the node at index i are the node indexes found in
+    targets[offsets[i]:offsets[i + 1]].
+    """
+    offsets = array.array('l', [0])
+    targets = array.array('l')
+    for n in nodes:
+        targets.extend(index[m] for m in get_adjacent(n))
+        offsets.append(len(targets))
+    return offsets, targets
+
+
+def _make_view(targets):
+    """Makes a view of the targets array that can be sliced without copying.
+
+    Returns None if arrays can not be viewed (they do not support the new
+    buffer protocol on python 2.x).
+    """
+    try:
+        return memoryview(targets)
+    except (NameError, TypeError):
+        return None
+
+
+def _adjacent(offsets, targets, view, i):
+    """Iterates over the adjacent node indexes of the node at index i."""
+    start, end = offsets[i], offsets[i + 1]
+    if view is not None:
+        return view[start:end]
+    return (targets[k] for k in six.moves.range(start, end))
+
+
+class CompactGraph(object):
+    """An immutable directed graph that stores its edges in flat arrays.
+
+    Each node is given an integer index (its position in the nodes tuple)
+    and the successors and predecessors of all nodes are stored as indexes
+    in two compressed (offsets + targets) arrays, which takes much less
+    memory than a networkx graph and makes looking up the neighbours of a
+    node (by index) cheap, as they are read from the arrays without being
+    copied.
+
+    Only the attributes of the edges that differ from the given default
+    edge attributes (which most edges share) are kept, by edge position in
+    the successors array, so that the graph can be converted back into a
+    networkx graph.
+    """
+
+    def __init__(self, graph, default_edge_attrs=None):
+        self.name = graph.name
+        self._nodes = tuple(graph.nodes_iter())
+        self._index = dict((n, i) for i, n in enumerate(self._nodes))
+        self._succ_offsets, self._succ = _pack_adjacency(
+            self._nodes, self._index, graph.successors_iter)
+        self._pred_offsets, self._pred = _pack_adjacency(
+            self._nodes, self._index, graph.predecessors_iter)
+        self._succ_view = _make_view(self._succ)
+        self._pred_view = _make_view(self._pred)
+        self._default_edge_attrs = dict(default_edge_attrs or {})
+        self._edge_attrs = {}
+        k = 0
+        for u in self._nodes:
+            for v in graph.successors_iter(u):
+                attrs = graph.adj[u][v]
+                if attrs != self._default_edge_attrs:
+                    self._edge_attrs[k] = attrs
+                k += 1
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __contains__(self, node):
+        return node in self._index
+
+    def __iter__(self):
+        return iter(self._nodes)
+
+    def nodes_iter(self):
+        return iter(self._nodes)
+
+    def number_of_nodes(self):
+        return len(self._nodes)
+
+    def number_of_edges(self):
+        return len(self._succ)
+
+    def node_at(self, i):
+        """Returns the node with the given index."""
+        return self._nodes[i]
+
+    def index_of(self, node):
+        """Returns the index of the given node."""
+        return self._index[node]
+
+    def successor_indexes(self, i):
+        """Returns an iterable of the indexes of the node successors."""
+        return _adjacent(self._succ_offsets, self._succ, self._succ_view, i)
+
+    def predecessor_indexes(self, i):
+        """Returns an iterable of the indexes of the node predecessors."""
+        return _adjacent(self._pred_offsets, self._pred, self._pred_view, i)
+
+    def successor_arrays(self):
+        """Returns the (offsets, targets) arrays of the nodes successors."""
+        return self._succ_offsets, self._succ
+
+    def predecessor_arrays(self):
+        """Returns the (offsets, targets) arrays of the nodes predecessors."""
+        return self._pred_offsets, self._pred
+
+    def successors(self, node):
+        return [self._nodes[j]
+                for j in self.successor_indexes(self._index[node])]
+
+    def predecessors(self, node):
+        return [self._nodes[j]
+                for j in self.predecessor_indexes(self._index[node])]
+
+    def with_nodes(self, nodes):
+        """Returns a graph of the same shape whose nodes are the given ones.
+
+        The node at index i of the new graph is nodes[i]; the edge arrays
+        (and attributes) are shared with this graph and are not copied.
+        """
+        graph = copy.copy(self)
+        graph._nodes = tuple(nodes)
+        graph._index = dict((n, i) for i, n in enumerate(graph._nodes))
+        return graph
+
+    def topological_indexes(self):
+        """Returns the node indexes in a topological order."""
+        waiting = [self._pred_offsets[i + 1] - self._pred_offsets[i]
+                   for i in range(0, len(self._nodes))]
+        order = [i for i, count in enumerate(waiting) if not count]
+        for i in order:
+            for j in self.successor_indexes(i):
+                waiting[j] -= 1
+                if not waiting[j]:
+                    order.append(j)
+        return order
+
+    def to_digraph(self, freeze=True):
+        """Converts this graph into a (frozen) networkx graph, giving each
+        edge a copy of the attributes it had.
+        """
+        graph = nx.DiGraph(name=self.name)
+        graph.add_nodes_from(self._nodes)
+        for i, u in enumerate(self._nodes):
+            for k in range(self._succ_offsets[i], self._succ_offsets[i + 1]):
+                attrs = self._edge_attrs.get(k, self._default_edge_attrs)
+                graph.add_edge(u, self._nodes[self._succ[k]],
+                               attr_dict=copy.deepcopy(attrs))
+        if freeze:
+            graph = nx.freeze(graph)
+        return graph
@@ -74,97 +74,110 @@ class ReaderWriterLock(object):
     the write lock.
 
     In the future these restrictions may be relaxed.
+
+    Readers are tracked by a per-thread count of the read locks they hold
+    (so checking and releasing ownership does not depend on the number of
+    readers) and readers and writers wait on separate conditions, so that
+    releasing the lock only wakes up the threads that can make progress
+    (waiting readers when the writer releases, and only the next pending
+    writer when the last reader or the writer releases).
     """
     WRITER = 'w'
     READER = 'r'
 
     def __init__(self):
+        self._lock = threading.Lock()
         self._writer = None
+        # Pending writers (in turn order) and the conditions they wait on.
         self._pending_writers = collections.deque()
-        self._readers = collections.deque()
-        self._cond = threading.Condition()
+        self._writer_conds = {}
+        # Reader => number of read locks it holds.
+        self._readers = {}
+        self._readers_cond = threading.Condition(self._lock)
+        self._waiting_readers = 0
 
     @property
     def pending_writers(self):
-        self._cond.acquire()
-        try:
+        with self._lock:
             return len(self._pending_writers)
-        finally:
-            self._cond.release()
 
     def is_writer(self, check_pending=True):
         """Returns if the caller is the active writer or a pending writer."""
-        self._cond.acquire()
-        try:
-            me = tu.get_ident()
+        me = tu.get_ident()
+        with self._lock:
             if self._writer is not None and self._writer == me:
                 return True
             if check_pending:
-                return me in self._pending_writers
+                return me in self._writer_conds
             else:
                 return False
-        finally:
-            self._cond.release()
 
     @property
     def owner(self):
         """Returns whether the lock is locked by a writer or reader."""
-        self._cond.acquire()
-        try:
+        with self._lock:
             if self._writer is not None:
                 return self.WRITER
             if self._readers:
                 return self.READER
             return None
-        finally:
-            self._cond.release()
 
     def is_reader(self):
         """Returns if the caller is one of the readers."""
-        self._cond.acquire()
-        try:
-            return tu.get_ident() in self._readers
-        finally:
-            self._cond.release()
+        me = tu.get_ident()
+        with self._lock:
+            return me in self._readers
+
+    def _notify_next_writer(self):
+        """Wakes up the next pending writer (if any); must be called with
+        the lock held.
+        """
+        if self._pending_writers:
+            self._writer_conds[self._pending_writers[0]].notify()
 
     @contextlib.contextmanager
     def read_lock(self):
         """Grants a read lock.
 
-        Will wait until no active or pending writers.
+        Will wait until no active writer.
 
         Raises a RuntimeError if an active or pending writer tries to acquire
         a read lock.
         """
         me = tu.get_ident()
-        if self.is_writer():
-            raise RuntimeError("Writer %s can not acquire a read lock"
-                               " while holding/waiting for the write lock"
-                               % me)
-        self._cond.acquire()
-        try:
-            while True:
-                # No active writer; we are good to become a reader.
-                if self._writer is None:
-                    self._readers.append(me)
-                    break
+        with self._lock:
+            if self._writer == me or me in self._writer_conds:
+                raise RuntimeError("Writer %s can not acquire a read lock"
+                                   " while holding/waiting for the write lock"
+                                   % me)
+            if me in self._readers:
+                # Already a reader (so there can be no active writer); this
+                # allows for basic reentrancy.
+                self._readers[me] += 1
+            else:
                 # An active writer; guess we have to wait.
-                self._cond.wait()
-        finally:
-            self._cond.release()
+                while self._writer is not None:
+                    self._waiting_readers += 1
+                    try:
+                        self._readers_cond.wait()
+                    finally:
+                        self._waiting_readers -= 1
+                self._readers[me] = 1
         try:
             yield self
         finally:
-            # I am no longer a reader, remove *one* occurrence of myself.
-            # If the current thread acquired two read locks, then it will
-            # still have to remove that other read lock; this allows for
-            # basic reentrancy to be possible.
-            self._cond.acquire()
-            try:
-                self._readers.remove(me)
-                self._cond.notify_all()
-            finally:
-                self._cond.release()
+            # I am no longer a reader, release *one* of my read locks. If
+            # the current thread acquired two read locks, then it will still
+            # have to release that other read lock; this allows for basic
+            # reentrancy to be possible.
+            with self._lock:
+                count = self._readers[me] - 1
+                if count:
+                    self._readers[me] = count
+                else:
+                    del self._readers[me]
+                    if not self._readers:
+                        self._notify_next_writer()
 
     @contextlib.contextmanager
     def write_lock(self):
@@ -175,34 +188,42 @@ class ReaderWriterLock(object):
         Raises a RuntimeError if an active reader attempts to acquire a lock.
         """
         me = tu.get_ident()
-        if self.is_reader():
-            raise RuntimeError("Reader %s to writer privilege"
-                               " escalation not allowed" % me)
-        if self.is_writer(check_pending=False):
+        with self._lock:
+            if me in self._readers:
+                raise RuntimeError("Reader %s to writer privilege"
+                                   " escalation not allowed" % me)
+            reentrant = self._writer == me
+            if not reentrant:
+                cond = threading.Condition(self._lock)
+                self._writer_conds[me] = cond
+                self._pending_writers.append(me)
+                try:
+                    # No readers, and no active writer, am I next??
+                    while (self._readers or self._writer is not None or
+                           self._pending_writers[0] != me):
+                        cond.wait()
+                except BaseException:
+                    # Give up my turn (and pass it on if it was mine).
+                    del self._writer_conds[me]
+                    self._pending_writers.remove(me)
+                    if self._writer is None and not self._readers:
+                        self._notify_next_writer()
+                    raise
+                del self._writer_conds[me]
+                self._pending_writers.popleft()
+                self._writer = me
+        if reentrant:
             # Already the writer; this allows for basic reentrancy.
             yield self
         else:
-            self._cond.acquire()
-            try:
-                self._pending_writers.append(me)
-                while True:
-                    # No readers, and no active writer, am I next??
-                    if len(self._readers) == 0 and self._writer is None:
-                        if self._pending_writers[0] == me:
-                            self._writer = self._pending_writers.popleft()
-                            break
-                    self._cond.wait()
-            finally:
-                self._cond.release()
             try:
                 yield self
             finally:
-                self._cond.acquire()
-                try:
+                with self._lock:
                     self._writer = None
-                    self._cond.notify_all()
-                finally:
-                    self._cond.release()
+                    if self._waiting_readers:
+                        self._readers_cond.notify_all()
+                    self._notify_next_writer()
 
 
 class DummyReaderWriterLock(object):
@@ -228,6 +249,24 @@ class DummyReaderWriterLock(object):
         return False
 
 
+class DummyLock(object):
+    """A dummy lock that doesn't lock anything but can be used as a context
+    manager like a normal lock.
+    """
+
+    def acquire(self, blocking=True):
+        return True
+
+    def release(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        pass
+
+
 class MultiLock(object):
     """A class which can attempt to obtain many locks at once and release
     said locks when exiting.
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+
+#    Copyright (C) 2014 Yahoo! Inc. All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import bisect
+import threading
+
+import six
+
+COUNTER = 'counter'
+HISTOGRAM = 'histogram'
+
+# Upper bounds (in seconds) of the default latency histogram buckets.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+class Histogram(object):
+    """A histogram of observed values counted into fixed buckets.
+
+    Not thread-safe (the registry that owns it serializes access to it).
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    @property
+    def mean(self):
+        if not self.count:
+            return None
+        return self.sum / self.count
+
+    def cumulative_counts(self):
+        """Returns a list of (upper bound, number of values <= that bound)
+        tuples (the last upper bound is infinity).
+        """
+        total = 0
+        cumulative = []
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            cumulative.append((bound, total))
+        return cumulative
+
+    def copy(self):
+        histogram = Histogram(self.buckets)
+        histogram.counts = list(self.counts)
+        histogram.count = self.count
+        histogram.sum = self.sum
+        histogram.max = self.max
+        return histogram
+
+
+def _to_labels(labels):
+    if not labels:
+        return ()
+    return tuple(sorted(six.iteritems(labels)))
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+def _format_labels(labels, extra=()):
+    labels = tuple(labels) + tuple(extra)
+    if not labels:
+        return ''
+    escaped = []
+    for (k, v) in labels:
+        v = six.text_type(v)
+        v = v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        escaped.append('%s="%s"' % (k, v))
+    return '{%s}' % ','.join(escaped)
+
+
+class MetricsRegistry(object):
+    """An in-process registry of (labeled) counters and histograms.
+
+    Metrics are identified by their name and a dictionary of labels (for
+    example the name of the task they are about); they are created when
+    they are first incremented (or observed) and can be read back with
+    :py:meth:`get` or dumped in the prometheus text exposition format with
+    :py:meth:`to_prometheus`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Metric name => (kind, help text, labels => value or histogram).
+        self._metrics = {}
+
+    def _get_values(self, name, kind, help):
+        try:
+            metric_kind, _help, values = self._metrics[name]
+        except KeyError:
+            values = {}
+            self._metrics[name] = (kind, help or name, values)
+        else:
+            if metric_kind != kind:
+                raise TypeError("Metric '%s' is a %s, not a %s"
+                                % (name, metric_kind, kind))
+        return values
+
+    def inc(self, name, labels=None, amount=1, help=None):
+        """Increments the counter with the given name and labels."""
+        labels = _to_labels(labels)
+        with self._lock:
+            values = self._get_values(name, COUNTER, help)
+            values[labels] = values.get(labels, 0) + amount
+
+    def observe(self, name, value, labels=None, help=None,
+                buckets=DEFAULT_BUCKETS):
+        """Adds a value to the histogram with the given name and labels."""
+        labels = _to_labels(labels)
+        with self._lock:
+            values = self._get_values(name, HISTOGRAM, help)
+            try:
+                histogram = values[labels]
+            except KeyError:
+                histogram = values[labels] = Histogram(buckets)
+            histogram.observe(value)
+
+    def get(self, name, labels=None):
+        """Gets the value of a counter (or a copy of a histogram) with the
+        given name and labels (or None if there is no such metric).
+        """
+        labels = _to_labels(labels)
+        with self._lock:
+            try:
+                kind, _help, values = self._metrics[name]
+                value = values[labels]
+            except KeyError:
+                return None
+            if kind == HISTOGRAM:
+                value = value.copy()
+            return value
+
+    def collect(self):
+        """Returns a list of (name, kind, help, [(labels, value)]) tuples of
+        all metrics (histograms are copied).
+        """
+        collected = []
+        with self._lock:
+            for name in sorted(self._metrics):
+                kind, help, values = self._metrics[name]
+                samples = []
+                for labels in sorted(values):
+                    value = values[labels]
+                    if kind == HISTOGRAM:
+                        value = value.copy()
+                    samples.append((dict(labels), value))
+                collected.append((name, kind, help, samples))
+        return collected
+
+    def reset(self):
+        with self._lock:
+            self._metrics.clear()
+
+    def to_prometheus(self):
+        """Dumps all metrics in the prometheus text exposition format."""
+        lines = []
+        for name, kind, help, samples in self.collect():
+            lines.append('# HELP %s %s' % (name, help.replace('\n', ' ')))
+            lines.append('# TYPE %s %s' % (name, kind))
+            for labels, value in samples:
+                labels = _to_labels(labels)
+                if kind == COUNTER:
+                    lines.append('%s%s %s' % (name, _format_labels(labels),
+                                              _format_value(value)))
+                    continue
+                for bound, count in value.cumulative_counts():
+                    extra = (('le', _format_value(bound)),)
+                    lines.append('%s_bucket%s %d'
+                                 % (name, _format_labels(labels, extra),
+                                    count))
+                lines.append('%s_sum%s %s' % (name, _format_labels(labels),
+                                              _format_value(value.sum)))
+                lines.append('%s_count%s %d' % (name, _format_labels(labels),
+                                                value.count))
+        return '\n'.join(lines) + '\n'
+
+
+# Registry used by listeners that are not given one.
+DEFAULT_REGISTRY = MetricsRegistry()
@@ -24,6 +24,7 @@ import logging
 import os
 import string
 import sys
+import threading
 import time
 import traceback
 
@@ -352,13 +353,65 @@ class TransitionNotifier(object):
     """A utility helper class that can be used to subscribe to
     notifications of events occurring as well as allow a entity to post said
     notifications to subscribers.
+
+    The callbacks to call for each state are computed once (when the first
+    notification about that state is posted after the callbacks changed) and
+    are then reused until a callback is registered or deregistered.
+
+    By default callbacks are called by the thread posting the notification.
+    When created with ``async_dispatch`` they are instead called by a
+    dispatcher thread that drains a queue of (at most ``queue_size``) posted
+    notifications, so that slow callbacks do not delay the poster. What
+    happens when that queue is full is selected by the ``overflow`` policy:
+
+    * ``BLOCK`` -- the poster waits until there is room in the queue
+      (notifications posted by callbacks, on the dispatcher thread, are
+      delivered right away instead, as only that thread makes room in it).
+    * ``DROP`` -- the notification is dropped.
+    * ``SAMPLE`` -- only one of every ``sample_every`` notifications that
+      overflow the queue is kept (and the poster waits until there is room
+      for it), the others are dropped.
+
+    Asynchronously dispatched callbacks may be called after the poster has
+    moved on (and even after they were deregistered, for notifications that
+    were posted before that), use :py:meth:`flush` to wait until all posted
+    notifications have been delivered.
     """
 
     RESERVED_KEYS = ('details',)
     ANY = '*'
 
-    def __init__(self):
+    # Policies for when the queue of a asynchronous notifier is full.
+    BLOCK = 'block'
+    DROP = 'drop'
+    SAMPLE = 'sample'
+
+    DEFAULT_QUEUE_SIZE = 1024
+
+    # How long (in seconds) the dispatcher thread waits for new
+    # notifications before exiting (it is restarted when needed).
+    _IDLE_TIMEOUT = 1.0
+
+    def __init__(self, async_dispatch=False, queue_size=DEFAULT_QUEUE_SIZE,
+                 overflow=BLOCK, sample_every=10):
+        if overflow not in (self.BLOCK, self.DROP, self.SAMPLE):
+            raise ValueError("Unknown overflow policy '%s'" % overflow)
         self._listeners = collections.defaultdict(list)
+        # State => tuple of the callbacks to call for it.
+        self._dispatch_table = {}
+        self._async = async_dispatch
+        self._queue_size = max(1, int(queue_size))
+        self._overflow = overflow
+        self._sample_every = max(1, int(sample_every))
+        self._queue = collections.deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._idle = threading.Condition(self._lock)
+        self._dispatcher = None
+        self._in_flight = 0
+        self._overflowed = 0
+        self.dropped = 0
 
     def __len__(self):
         """Returns how many callbacks are registered."""
@@ -376,20 +429,39 @@ class TransitionNotifier(object):
         return False
 
     def reset(self):
-        self._listeners.clear()
+        with self._lock:
+            self._listeners.clear()
+            self._dispatch_table = {}
 
-    def notify(self, state, details):
-        listeners = list(self._listeners.get(self.ANY, []))
-        for i in self._listeners[state]:
-            if i not in listeners:
-                listeners.append(i)
-        if not listeners:
-            return
+    def _get_dispatch(self, state):
+        try:
+            return self._dispatch_table[state]
+        except KeyError:
+            # NOTE: the table is built under the same lock the callbacks are
+            # changed under, otherwise a table built from the callbacks as
+            # they were before a (concurrent) change could be stored after
+            # that change and be used until the next one.
+            with self._lock:
+                try:
+                    return self._dispatch_table[state]
+                except KeyError:
+                    listeners = list(self._listeners.get(self.ANY, []))
+                    for i in self._listeners.get(state, []):
+                        if i not in listeners:
+                            listeners.append(i)
+                    listeners = tuple(listeners)
+                    self._dispatch_table[state] = listeners
+                    return listeners
+
+    @staticmethod
+    def _dispatch(state, details, listeners):
         for (callback, args, kwargs) in listeners:
             if args is None:
                 args = []
             if kwargs is None:
                 kwargs = {}
+            else:
+                kwargs = dict(kwargs)
             kwargs['details'] = details
             try:
                 callback(state, *args, **kwargs)
@@ -397,6 +469,71 @@ class TransitionNotifier(object):
                 LOG.exception(("Failure calling callback %s to notify about"
                                " state transition %s"), callback, state)
 
+    def notify(self, state, details):
+        listeners = self._get_dispatch(state)
+        if not listeners:
+            return
+        if not self._async:
+            self._dispatch(state, details, listeners)
+            return
+        with self._lock:
+            if len(self._queue) >= self._queue_size:
+                if self._overflow == self.SAMPLE:
+                    drop = self._overflowed % self._sample_every != 0
+                    self._overflowed += 1
+                else:
+                    drop = self._overflow == self.DROP
+                if drop:
+                    self.dropped += 1
+                    return
+                inline = self._dispatcher is threading.current_thread()
+                while not inline and len(self._queue) >= self._queue_size:
+                    self._not_full.wait()
+            else:
+                inline = False
+            if not inline:
+                self._queue.append((state, details, listeners))
+                if self._dispatcher is None:
+                    self._dispatcher = threading.Thread(target=self._drain)
+                    self._dispatcher.daemon = True
+                    self._dispatcher.start()
+                else:
+                    self._not_empty.notify()
+        if inline:
+            # NOTE: posted by a callback while the queue is full; waiting
+            # for room in the queue would never end, as this (dispatcher)
+            # thread is the one that makes room in it.
+            self._dispatch(state, details, listeners)
+
+    def _drain(self):
+        while True:
+            with self._lock:
+                if not self._queue:
+                    self._not_empty.wait(self._IDLE_TIMEOUT)
+                if not self._queue:
+                    self._dispatcher = None
+                    self._idle.notify_all()
+                    return
+                item = self._queue.popleft()
+                self._in_flight += 1
+                self._not_full.notify()
+            try:
+                self._dispatch(*item)
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+                    if not self._queue and not self._in_flight:
+                        self._idle.notify_all()
+
+    def flush(self):
+        """Waits until all posted notifications have been delivered."""
+        with self._lock:
+            if self._dispatcher is threading.current_thread():
+                # Called from a callback, waiting would never end.
+                return
+            while self._queue or self._in_flight:
+                self._idle.wait()
+
     def register(self, state, callback, args=None, kwargs=None):
         assert six.callable(callback), "Callback must be callable"
         if self.is_registered(state, callback):
@@ -409,15 +546,19 @@ class TransitionNotifier(object):
             kwargs = copy.copy(kwargs)
         if args:
             args = copy.copy(args)
-        self._listeners[state].append((callback, args, kwargs))
+        with self._lock:
+            self._listeners[state].append((callback, args, kwargs))
+            self._dispatch_table = {}
 
     def deregister(self, state, callback):
-        if state not in self._listeners:
-            return
-        for i, (cb, args, kwargs) in enumerate(self._listeners[state]):
-            if reflection.is_same_callback(cb, callback):
-                self._listeners[state].pop(i)
-                break
+        with self._lock:
+            if state not in self._listeners:
+                return
+            for i, (cb, args, kwargs) in enumerate(self._listeners[state]):
+                if reflection.is_same_callback(cb, callback):
+                    self._listeners[state].pop(i)
+                    self._dispatch_table = {}
+                    break
 
 
 def copy_exc_info(exc_info):
@@ -485,6 +626,23 @@ class Failure(object):
     def from_exception(cls, exception):
         return cls((type(exception), exception, None))
 
+    def __getstate__(self):
+        # Exception info (and the traceback object especially) can not be
+        # reliably pickled, so just like when a failure is serialized (see
+        # persistence_utils.failure_to_dict) only its string representations
+        # are kept.
+        return {
+            'exception_str': self._exception_str,
+            'traceback_str': self._traceback_str,
+            'exc_type_names': self._exc_type_names,
+        }
+
+    def __setstate__(self, state):
+        self._exc_info = None
+        self._exception_str = state['exception_str']
+        self._traceback_str = state['traceback_str']
+        self._exc_type_names = state['exc_type_names']
+
     def _matches(self, other):
         if self is other:
             return True
@@ -99,13 +99,16 @@ def _copy_function(deep_copy):
         return lambda x: x
 
 
-def task_details_merge(td_e, td_new, deep_copy=False):
+def task_details_merge(td_e, td_new, deep_copy=False, share_results=False):
     """Merges an existing task details with a new task details object.
 
     The new task details fields, if they differ will replace the existing
     objects fields (except name, version, uuid which can not be replaced).
 
     If 'deep_copy' is True, fields are copied deeply (by value) if possible.
+    If 'share_results' is True the results are never copied (both task
+    details will refer to the same results, which then must not be modified
+    in place).
     """
     if td_e is td_new:
         return td_e
@@ -114,12 +117,16 @@ def task_details_merge(td_e, td_new, deep_copy=False):
     if td_e.state != td_new.state:
         # NOTE(imelnikov): states are just strings, no need to copy.
         td_e.state = td_new.state
-    if td_e.results != td_new.results:
-        td_e.results = copy_fn(td_new.results)
+    if (td_e.results is not td_new.results and
+            td_e.results != td_new.results):
+        if share_results:
+            td_e.results = td_new.results
+        else:
+            td_e.results = copy_fn(td_new.results)
     if td_e.failure != td_new.failure:
         # NOTE(imelnikov): we can't just deep copy Failures, as they
         # contain tracebacks, which are not copyable.
-        if deep_copy:
+        if deep_copy and td_new.failure is not None:
             td_e.failure = td_new.failure.copy()
         else:
             td_e.failure = td_new.failure
@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+
+#    Copyright (C) 2014 Yahoo! Inc. All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import abc
+import collections
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+
+import six
+
+from taskflow.utils import threading_utils as tu
+
+
+@six.add_metaclass(abc.ABCMeta)
+class TaskProfiler(object):
+    """Profiles the executions (and reversions) of tasks, aggregating the
+    collected data per task name (across all the runs that use the same
+    profiler).
+    """
+
+    @abc.abstractmethod
+    def profile(self, name, func, *args, **kwargs):
+        """Calls the function (of the named task) while profiling it and
+        returns what it returned.
+        """
+
+    @abc.abstractmethod
+    def task_names(self):
+        """Returns the names of the tasks that were profiled."""
+
+    @abc.abstractmethod
+    def reset(self):
+        """Discards all collected data."""
+
+
+class _CollectedStats(object):
+    """Allows creating `pstats.Stats` from other (already collected) stats,
+    which not all python versions can do directly.
+    """
+
+    def __init__(self, stats):
+        self.stats = dict(stats.stats)
+
+    def create_stats(self):
+        pass
+
+
+class CProfileTaskProfiler(TaskProfiler):
+    """Profiles tasks with the (deterministic) cProfile profiler.
+
+    The collected stats can be fetched per task (as `pstats.Stats`) or
+    dumped (in the pstats file format) for a single or for all tasks.
+
+    NOTE: some python versions only allow one cProfile profiler to be active
+    at once (in the whole process); on those tasks that start while another
+    one is being profiled are ran without being profiled (and counted in
+    `skipped`).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Task name => aggregated stats.
+        self._stats = {}
+        self.skipped = 0
+
+    def profile(self, name, func, *args, **kwargs):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            with self._lock:
+                self.skipped += 1
+            return func(*args, **kwargs)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.disable()
+            with self._lock:
+                try:
+                    self._stats[name].add(profiler)
+                except KeyError:
+                    self._stats[name] = pstats.Stats(profiler)
+
+    def task_names(self):
+        with self._lock:
+            return sorted(self._stats)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self.skipped = 0
+
+    def get_stats(self, name=None):
+        """Returns the stats of the named task (or of all tasks combined), or
+        None if there are none.
+        """
+        with self._lock:
+            if name is not None:
+                names = [name] if name in self._stats else []
+            else:
+                names = sorted(self._stats)
+            if not names:
+                return None
+            stats = pstats.Stats(_CollectedStats(self._stats[names[0]]))
+            for other in names[1:]:
+                stats.add(self._stats[other])
+            return stats
+
+    def dump_stats(self, path, name=None):
+        """Writes the stats of the named task (or of all tasks combined) to
+        the given path (the file can be loaded with `pstats.Stats`).
+        """
+        stats = self.get_stats(name)
+        if stats is None:
+            raise ValueError("No stats collected for %s"
+                             % (name or "any task"))
+        stats.dump_stats(path)
+
+
+def _format_frame(frame):
+    code = frame.f_code
+    return "%s (%s:%s)" % (code.co_name, os.path.basename(code.co_filename),
+                           code.co_firstlineno)
+
+
+class SamplingTaskProfiler(TaskProfiler):
+    """Profiles tasks by periodically sampling the stacks of the threads that
+    run them.
+
+    A sampler thread (started when tasks are being profiled, and exiting
+    once no task has been profiled for a while) looks at the stacks of the
+    threads running tasks every `interval` seconds and counts how often each
+    stack was seen (per task), so tasks run at close to their normal speed.
+    The counts can be dumped in the collapsed stack format that flamegraph
+    tools take as input.
+    """
+
+    # How long (in seconds) the sampler thread waits for tasks to profile
+    # before exiting (it is restarted when needed).
+    _IDLE_TIMEOUT = 1.0
+
+    def __init__(self, interval=0.005, max_depth=64):
+        self._interval = interval
+        self._max_depth = max_depth
+        self._lock = threading.Lock()
+        # Thread ident => name of the task it runs.
+        self._active = {}
+        # Task name => stack (tuple of frames, outermost first) => samples.
+        self._samples = collections.defaultdict(
+            lambda: collections.defaultdict(int))
+        self._sampler = None
+
+    def profile(self, name, func, *args, **kwargs):
+        me = tu.get_ident()
+        with self._lock:
+            self._active[me] = name
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample)
+                self._sampler.daemon = True
+                self._sampler.start()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._active.pop(me, None)
+
+    def _get_stack(self, frame):
+        """Returns the stack of frames called (by the profiler) to run the
+        task, or None if the frame is not running a task (anymore).
+        """
+        frames = []
+        while frame is not None:
+            if frame.f_code is _PROFILE_CODE:
+                frames.reverse()
+                return tuple(_format_frame(f)
+                             for f in frames[0:self._max_depth])
+            frames.append(frame)
+            frame = frame.f_back
+        return None
+
+    def _sample(self):
+        idle = 0.0
+        while True:
+            time.sleep(self._interval)
+            with self._lock:
+                active = dict(self._active)
+                if not active:
+                    idle += self._interval
+                    if idle >= self._IDLE_TIMEOUT:
+                        self._sampler = None
+                        return
+                    continue
+            idle = 0.0
+            frames = sys._current_frames()
+            stacks = []
+            for ident, name in six.iteritems(active):
+                frame = frames.get(ident)
+                if frame is not None:
+                    stack = self._get_stack(frame)
+                    if stack:
+                        stacks.append((name, stack))
+            del frames
+            with self._lock:
+                for name, stack in stacks:
+                    self._samples[name][stack] += 1
+
+    def task_names(self):
+        with self._lock:
+            return sorted(self._samples)
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+
+    def get_samples(self, name):
+        """Returns a dictionary of stack => number of times it was seen
+        while running the named task.
+        """
+        with self._lock:
+            return dict(self._samples.get(name, {}))
+
+    def collapsed_stacks(self, name=None):
+        """Returns the samples of the named task (or of all tasks, with the
+        task name as the outermost frame) in the collapsed stack format.
+        """
+        lines = []
+        with self._lock:
+            if name is not None:
+                names = [name] if name in self._samples else []
+            else:
+                names = sorted(self._samples)
+            for task_name in names:
+                for stack, count in sorted(
+                        six.iteritems(self._samples[task_name])):
+                    if name is None:
+                        stack = (task_name,) + stack
+                    lines.append("%s %d" % (";".join(stack), count))
+        return lines
+
+    def dump_collapsed(self, path, name=None):
+        """Writes the samples of the named task (or of all tasks) to the
+        given path in the collapsed stack format.
+        """
+        with open(path, 'w') as fh:
+            for line in self.collapsed_stacks(name):
+                fh.write(line + "\n")
+
+
+_PROFILE_CODE = six.get_function_code(SamplingTaskProfiler.profile)
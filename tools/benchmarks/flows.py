@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+#    Copyright (C) 2014 Yahoo! Inc. All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Generators of synthetic flows (of no-op tasks) used by the benchmarks."""
+
+import random
+
+from taskflow.patterns import graph_flow as gf
+from taskflow.patterns import linear_flow as lf
+from taskflow.patterns import unordered_flow as uf
+from taskflow import task
+
+
+class NoopTask(task.Task):
+    def execute(self, **kwargs):
+        return None
+
+
+def _make_task(name, provides=None, requires=None):
+    return NoopTask(name, provides=provides, requires=requires)
+
+
+def wide(size):
+    """Unordered flow of size independent tasks."""
+    return uf.Flow('wide').add(*[_make_task('t-%s' % i)
+                                 for i in range(0, size)])
+
+
+def deep(size):
+    """Linear flow of size tasks."""
+    return lf.Flow('deep').add(*[_make_task('t-%s' % i)
+                                 for i in range(0, size)])
+
+
+def random_dag(size, edges_per_task=2, seed=0):
+    """Graph flow of size tasks, each requiring (on average) the results of
+    edges_per_task randomly picked earlier tasks.
+    """
+    rnd = random.Random(seed)
+    flow = gf.Flow('dag')
+    for i in range(0, size):
+        requires = set()
+        if i:
+            for _j in range(0, edges_per_task):
+                requires.add('v-%s' % rnd.randint(0, i - 1))
+        flow.add(_make_task('t-%s' % i, provides='v-%s' % i,
+                            requires=sorted(requires)))
+    return flow
+
+
+def nested(size, fanout=4):
+    """Linear flow of unordered subflows of linear subflows (of fanout
+    items each) holding size tasks in total.
+    """
+    counter = [0]
+
+    def make_level(depth, remaining):
+        if depth == 0 or remaining <= fanout:
+            tasks = []
+            for _i in range(0, remaining):
+                tasks.append(_make_task('t-%s' % counter[0]))
+                counter[0] += 1
+            return lf.Flow('leaf-%s' % counter[0]).add(*tasks)
+        if depth % 2:
+            flow = uf.Flow('u-%s-%s' % (depth, counter[0]))
+        else:
+            flow = lf.Flow('l-%s-%s' % (depth, counter[0]))
+        share = max(1, remaining // fanout)
+        while remaining > 0:
+            amount = min(share, remaining)
+            flow.add(make_level(depth - 1, amount))
+            remaining -= amount
+        return flow
+
+    depth = 1
+    while fanout ** depth < size:
+        depth += 1
+    return lf.Flow('nested').add(make_level(depth, size))
+
+
+SHAPES = {
+    'wide': wide,
+    'deep': deep,
+    'dag': random_dag,
+    'nested': nested,
+}
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+
+import os
+import sys
+
+top_dir = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                       os.pardir, os.pardir))
+sys.path.insert(0, top_dir)
+
+import optparse
+import threading
+import time
+
+from taskflow.utils import lock_utils
+
+
+class _PlainLock(object):
+    """Exclusive lock with the reader/writer lock interface (a baseline)."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+
+    def read_lock(self):
+        return self._lock
+
+    def write_lock(self):
+        return self._lock
+
+
+LOCKS = {
+    'rw': lock_utils.ReaderWriterLock,
+    'plain': _PlainLock,
+}
+
+
+def run(lock, threads, ops, write_ratio, reentrant):
+    """Runs the given amount of threads that each acquire the lock the
+    given amount of times, returning the seconds it took them.
+    """
+    barrier = threading.Event()
+    every = int(1 / write_ratio) if write_ratio > 0 else 0
+
+    def read():
+        with lock.read_lock():
+            if reentrant:
+                with lock.read_lock():
+                    pass
+
+    def write():
+        with lock.write_lock():
+            pass
+
+    def work():
+        barrier.wait()
+        for i in range(0, ops):
+            if every and i % every == 0:
+                write()
+            else:
+                read()
+
+    workers = [threading.Thread(target=work) for _i in range(0, threads)]
+    for t in workers:
+        t.start()
+    start = time.time()
+    barrier.set()
+    for t in workers:
+        t.join()
+    return time.time() - start
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option("-t", "--threads", dest="threads", type="int",
+                      action="append",
+                      help="number of threads (may be given many times)")
+    parser.add_option("-n", "--ops", dest="ops", type="int",
+                      help="lock acquisitions per thread", default=2000)
+    parser.add_option("-w", "--write-ratio", dest="write_ratio",
+                      type="float", help="fraction of acquisitions that"
+                      " are writes", default=0.1)
+    parser.add_option("-l", "--lock", dest="locks", action="append",
+                      choices=sorted(LOCKS),
+                      help="lock to benchmark (may be given many times)")
+    parser.add_option("-r", "--reentrant", dest="reentrant",
+                      action="store_true", default=False,
+                      help="acquire each read lock twice")
+
+    (options, args) = parser.parse_args()
+    threads = options.threads or [1, 4, 16, 64]
+    locks = options.locks or sorted(LOCKS)
+    print("%-6s %8s %10s %12s" % ('lock', 'threads', 'seconds', 'ops/sec'))
+    for name in locks:
+        for count in threads:
+            elapsed = run(LOCKS[name](), count, options.ops,
+                          options.write_ratio, options.reentrant)
+            total = count * options.ops
+            print("%-6s %8d %10.3f %12.1f"
+                  % (name, count, elapsed, total / max(elapsed, 1e-9)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,340 @@
+#!/usr/bin/env python
+
+import os
+import sys
+
+top_dir = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                       os.pardir, os.pardir))
+sys.path.insert(0, top_dir)
+
+import contextlib
+import json
+import optparse
+import platform
+import shutil
+import tempfile
+import time
+
+try:
+    import tracemalloc
+    TRACEMALLOC_AVAILABLE = True
+except ImportError:
+    TRACEMALLOC_AVAILABLE = False
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import flows
+
+import taskflow.engines
+from taskflow.persistence.backends import impl_dir
+from taskflow.persistence.backends import impl_memory
+from taskflow import states
+from taskflow import storage as t_storage
+from taskflow.utils import eventlet_utils
+from taskflow.utils import flow_utils
+from taskflow.utils import persistence_utils as p_utils
+
+try:
+    from taskflow.persistence.backends import impl_sqlalchemy
+    SQLALCHEMY_AVAILABLE = True
+except ImportError:
+    SQLALCHEMY_AVAILABLE = False
+
+
+def _make_memory_backend(tmp_dir):
+    return impl_memory.MemoryBackend({})
+
+
+def _make_dir_backend(tmp_dir):
+    return impl_dir.DirBackend({'path': os.path.join(tmp_dir, 'dir')})
+
+
+def _make_sqlite_backend(tmp_dir):
+    path = os.path.join(tmp_dir, 'taskflow.db')
+    return impl_sqlalchemy.SQLAlchemyBackend({
+        'connection': 'sqlite:///%s' % path,
+    })
+
+
+BACKENDS = {
+    'memory': _make_memory_backend,
+    'dir': _make_dir_backend,
+}
+if SQLALCHEMY_AVAILABLE:
+    BACKENDS['sqlite'] = _make_sqlite_backend
+
+
+def _make_engine_conf(name):
+    if name == 'green':
+        return {
+            'engine': 'parallel',
+            'executor': eventlet_utils.GreenExecutor(),
+        }
+    return {'engine': name}
+
+
+ENGINES = ['serial', 'parallel']
+if eventlet_utils.EVENTLET_AVAILABLE:
+    ENGINES.append('green')
+
+
+@contextlib.contextmanager
+def make_backend(name):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        backend = BACKENDS[name](tmp_dir)
+        with contextlib.closing(backend.get_connection()) as conn:
+            conn.upgrade()
+        try:
+            yield backend
+        finally:
+            backend.close()
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def bench_flatten(flow, options):
+    def func():
+        flow_utils.flatten(flow, cache=None)
+    return func
+
+
+def bench_compile(flow, options):
+    def func():
+        engine = taskflow.engines.load(flow, engine_conf='serial')
+        engine.compile()
+    return func
+
+
+def bench_storage(flow, options):
+    task_names = [t.name for t in
+                  flow_utils.flatten(flow, cache=None).nodes_iter()]
+
+    def func():
+        with make_backend(options.backend) as backend:
+            _lb, flow_detail = p_utils.temporary_flow_detail(backend)
+            storage = t_storage.SingleThreadedStorage(flow_detail, backend)
+            for name in task_names:
+                storage.ensure_task(name)
+            for name in task_names:
+                storage.save(name, name)
+    return func
+
+
+def bench_run(flow, options):
+    def func():
+        with make_backend(options.backend) as backend:
+            engine = taskflow.engines.load(
+                flow, engine_conf=_make_engine_conf(options.engine),
+                backend=backend)
+            engine.run()
+    return func
+
+
+def bench_resume(flow, options):
+    # NOTE: only the resumed half of the flow is timed (the half that was
+    # ran before the engine was suspended is setup).
+    size = options.size
+
+    def func():
+        with make_backend(options.backend) as backend:
+            _lb, flow_detail = p_utils.temporary_flow_detail(backend)
+            engine = taskflow.engines.load(
+                flow, engine_conf=_make_engine_conf(options.engine),
+                flow_detail=flow_detail, backend=backend)
+            done = []
+
+            def suspend_at_half(state, details):
+                done.append(details['task_name'])
+                if len(done) >= size // 2:
+                    engine.suspend()
+
+            engine.task_notifier.register(states.SUCCESS, suspend_at_half)
+            engine.run()
+            engine = taskflow.engines.load(
+                flow, engine_conf=_make_engine_conf(options.engine),
+                flow_detail=flow_detail, backend=backend)
+            start = time.time()
+            engine.run()
+            return time.time() - start
+    return func
+
+
+BENCHMARKS = {
+    'flatten': bench_flatten,
+    'compile': bench_compile,
+    'storage': bench_storage,
+    'run': bench_run,
+    'resume': bench_resume,
+}
+
+# Benchmarks whose results depend on the backend (and engine) used.
+BACKEND_BENCHMARKS = ('storage', 'run', 'resume')
+ENGINE_BENCHMARKS = ('run', 'resume')
+
+
+def measure(func, repeat):
+    """Returns the best time (in seconds) of repeat calls of the function
+    and the peak memory (in KiB) allocated during a extra call.
+
+    If the function returns a number, that number is used as the time the
+    call took (so that functions can leave their setup out of it).
+    """
+    best = None
+    for _i in range(0, repeat):
+        start = time.time()
+        elapsed = func()
+        if elapsed is None:
+            elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    if TRACEMALLOC_AVAILABLE:
+        tracemalloc.start()
+        try:
+            func()
+            peak = tracemalloc.get_traced_memory()[1] / 1024.0
+        finally:
+            tracemalloc.stop()
+    elif resource is not None:
+        # NOTE: this is the peak of the whole process (so far).
+        func()
+        peak = float(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+    else:
+        peak = None
+    return best, peak
+
+
+class _Options(object):
+    def __init__(self, size, engine=None, backend=None):
+        self.size = size
+        self.engine = engine
+        self.backend = backend
+
+
+def run_all(options):
+    results = {}
+    for name in options.benchmarks:
+        engines = options.engines if name in ENGINE_BENCHMARKS else [None]
+        backends = (options.backends if name in BACKEND_BENCHMARKS
+                    else [None])
+        for shape in options.shapes:
+            for size in options.sizes:
+                flow = flows.SHAPES[shape](size)
+                for engine in engines:
+                    for backend in backends:
+                        key = '/'.join(str(part) for part in
+                                       (name, shape, size, engine, backend)
+                                       if part is not None)
+                        func = BENCHMARKS[name](
+                            flow, _Options(size, engine, backend))
+                        elapsed, peak = measure(func, options.repeat)
+                        result = {
+                            'seconds': elapsed,
+                            'ops_per_sec': size / max(elapsed, 1e-9),
+                            'peak_kb': peak,
+                        }
+                        results[key] = result
+                        print("%-40s %10.4f %12.1f %12s"
+                              % (key, elapsed, result['ops_per_sec'],
+                                 '%.1f' % peak if peak is not None else '-'))
+                        sys.stdout.flush()
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Prints the change of each result against the baseline, returning the
+    keys of the results that are slower by more than threshold percent.
+    """
+    regressions = []
+    print("")
+    print("%-40s %12s %12s %8s" % ('benchmark', 'baseline', 'current',
+                                   'change'))
+    for key in sorted(results):
+        if key not in baseline:
+            continue
+        before = baseline[key]['ops_per_sec']
+        after = results[key]['ops_per_sec']
+        change = (after - before) / before * 100.0
+        marker = ''
+        if change < -threshold:
+            regressions.append(key)
+            marker = ' !'
+        print("%-40s %12.1f %12.1f %+7.1f%%%s"
+              % (key, before, after, change, marker))
+    return regressions
+
+
+def _split(value):
+    return [item for item in value.split(',') if item]
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option("-b", "--benchmarks", dest="benchmarks",
+                      default=','.join(sorted(BENCHMARKS)),
+                      help="comma separated benchmarks to run"
+                      " [default: %default]")
+    parser.add_option("-s", "--shapes", dest="shapes",
+                      default=','.join(sorted(flows.SHAPES)),
+                      help="comma separated flow shapes [default: %default]")
+    parser.add_option("-n", "--sizes", dest="sizes", default="10,100",
+                      help="comma separated flow sizes (number of tasks)"
+                      " [default: %default]")
+    parser.add_option("-e", "--engines", dest="engines",
+                      default=','.join(ENGINES),
+                      help="comma separated engines [default: %default]")
+    parser.add_option("-p", "--backends", dest="backends",
+                      default=','.join(sorted(BACKENDS)),
+                      help="comma separated persistence backends"
+                      " [default: %default]")
+    parser.add_option("-r", "--repeat", dest="repeat", type="int", default=3,
+                      help="times to repeat each benchmark (the best time"
+                      " is kept) [default: %default]")
+    parser.add_option("-o", "--output", dest="output", metavar="FILE",
+                      help="save results as a json baseline to FILE")
+    parser.add_option("-c", "--compare", dest="compare", metavar="FILE",
+                      help="compare results against the baseline in FILE")
+    parser.add_option("-t", "--threshold", dest="threshold", type="float",
+                      default=10.0,
+                      help="percent of ops/sec lost (compared to the"
+                      " baseline) that is reported as a regression"
+                      " [default: %default]")
+
+    (options, args) = parser.parse_args()
+    options.benchmarks = _split(options.benchmarks)
+    options.shapes = _split(options.shapes)
+    options.sizes = [int(size) for size in _split(options.sizes)]
+    options.engines = _split(options.engines)
+    options.backends = _split(options.backends)
+    for (kind, names, known) in [('benchmark', options.benchmarks,
+                                  BENCHMARKS),
+                                 ('shape', options.shapes, flows.SHAPES),
+                                 ('engine', options.engines, ENGINES),
+                                 ('backend', options.backends, BACKENDS)]:
+        for name in names:
+            if name not in known:
+                parser.error("Unknown (or unavailable) %s '%s'"
+                             % (kind, name))
+
+    print("%-40s %10s %12s %12s" % ('benchmark', 'seconds', 'ops/sec',
+                                    'peak KiB'))
+    results = run_all(options)
+    if options.output:
+        with open(options.output, 'w') as fh:
+            json.dump({
+                'python': platform.python_version(),
+                'results': results,
+            }, fh, indent=4, sort_keys=True)
+        print("Saved results to '%s'" % options.output)
+    if options.compare:
+        with open(options.compare) as fh:
+            baseline = json.load(fh)['results']
+        if compare(results, baseline, options.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()